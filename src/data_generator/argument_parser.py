@@ -13,5 +13,16 @@ def parse_arguments():
     parser.add_argument('-c', '--config', 
                        default='data_generator/config.json',
                        help='Configuration file (default: config.json)')
+    parser.add_argument('-r', '--rendition', action='append', default=[], metavar='WIDTHxHEIGHT',
+                       help='Also write a downscaled copy of the video at this size, '
+                            'rendered in the same pass (can be repeated)')
+    parser.add_argument('--single-pass', action='store_true',
+                       help='Draw the background and the shape with one anti-aliased full-screen shader')
+    parser.add_argument('--tile-size', type=int, default=0, metavar='PIXELS',
+                       help='Render frames as tiles of at most this size and stream them to the encoder '
+                            '(default: only when the frame is larger than the GPU allows)')
+    parser.add_argument('--batch-frames', type=int, default=0, metavar='N',
+                       help='Render N consecutive frames per draw call into a frame atlas and read them back '
+                            'at once, which saves per-frame driver overhead at small sizes')
     
     return parser.parse_args()
\ No newline at end of file
@@ -12,6 +12,16 @@ def short_time_fourrier_transform(audio_file: str, config: VisualConfig) -> np.n
     :return: STFT of the audio file, shape [freq_bins, frames].
     """
     y, sr = librosa.load(audio_file, sr=None, mono=True)
+    return stft_from_samples(y, sr, config)
+
+def stft_from_samples(y: np.ndarray, sr: float, config: VisualConfig) -> np.ndarray:
+    """
+    Compute the normalized STFT of already decoded mono samples.
+    :param y: Mono audio samples.
+    :param sr: Sample rate of `y`.
+    :param config: VisualConfig object with settings.
+    :return: STFT of the samples, shape [freq_bins, frames].
+    """
     hop_length = int(sr / config.fps)  # frames per second
     bands = config.num_frequency_bands
     frames = config.duration * config.fps
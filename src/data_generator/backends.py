@@ -0,0 +1,82 @@
+import argparse
+import time
+import numpy as np
+from data_generator.config import VisualConfig, load_config
+
+
+RENDER_BACKENDS = ('gl', 'gl-single-pass', 'gl-batched', 'cpu')
+
+def create_frame_renderer(backend: str, config: VisualConfig, width: int, height: int,
+                          supersample: int = 1, ctx=None, tile_size: int = 0, batch_size: int = 32):
+    """
+    Create a headless frame renderer. All backends have the same `render(state)`,
+    `render_batch(states)` and `release()` methods and return the same frames within rounding.
+    :param backend: 'gl' for OpenGL through moderngl, 'gl-single-pass' for OpenGL with the
+        composite shader, 'gl-batched' for OpenGL drawing `batch_size` frames at once into
+        an atlas, 'cpu' for the NumPy rasterizer.
+    :param config: VisualConfig object with settings.
+    :param width: Width of the returned frames.
+    :param height: Height of the returned frames.
+    :param supersample: Rendered pixels per output pixel along each axis.
+    :param ctx: ModernGL context for the 'gl' backend, a headless one is created if None.
+    :param tile_size: OpenGL backends render frames larger than this in tiles, 0 for the GPU limit.
+        The cpu backend always renders in bounded row tiles.
+    :param batch_size: Frames per draw call of the 'gl-batched' backend.
+    :return: FrameRenderer or CpuFrameRenderer.
+    """
+    # Imported here so the cpu backend works on machines where moderngl is not usable.
+    if backend in ('gl', 'gl-single-pass'):
+        from data_generator.renderer import FrameRenderer
+        return FrameRenderer(config, width, height, ctx=ctx, supersample=supersample,
+                             single_pass=backend == 'gl-single-pass', tile_size=tile_size)
+    if backend == 'gl-batched':
+        from data_generator.batch_renderer import BatchFrameRenderer
+        return BatchFrameRenderer(config, width, height, batch_size, ctx=ctx, supersample=supersample)
+    if backend == 'cpu':
+        from data_generator.cpu_renderer import CpuFrameRenderer
+        return CpuFrameRenderer(config, width, height, supersample=supersample)
+    raise ValueError(f"Unknown render backend '{backend}', expected one of {', '.join(RENDER_BACKENDS)}")
+
+
+def main():
+    """
+    Compare speed and output of the render backends on frames of a track.
+    """
+    from data_generator.timeline import load_timeline
+
+    parser = argparse.ArgumentParser(description='Benchmark the render backends against each other')
+    parser.add_argument('input_audio', help='Input audio file, its frames are rendered')
+    parser.add_argument('-c', '--config', default='data_generator/config.json',
+                        help='Configuration file (default: config.json)')
+    parser.add_argument('-n', '--frames', type=int, default=20, help='Number of frames to render')
+    parser.add_argument('--width', type=int, default=None, help='Frame width (default: from the config)')
+    parser.add_argument('--height', type=int, default=None, help='Frame height (default: from the config)')
+    parser.add_argument('--supersample', type=int, default=1)
+    args = parser.parse_args()
+
+    config = load_config(config_file=args.config)
+    width = args.width or config.width
+    height = args.height or config.height
+    timeline = load_timeline(args.input_audio, config)
+    states = [timeline.state(frame) for frame in np.linspace(0, len(timeline) - 1, args.frames).astype(int)]
+
+    frames = {}
+    for backend in RENDER_BACKENDS:
+        renderer = create_frame_renderer(backend, config, width, height, args.supersample)
+        try:
+            renderer.render(states[0])  # warm up
+            start = time.perf_counter()
+            frames[backend] = renderer.render_batch(states)
+            seconds = time.perf_counter() - start
+        finally:
+            renderer.release()
+        print(f"{backend:>14}: {1000 * seconds / len(states):8.2f} ms/frame at {width}x{height}")
+
+    reference = np.stack(frames['gl']).astype(np.int16)
+    for backend in RENDER_BACKENDS[1:]:
+        diff = np.abs(reference - np.stack(frames[backend]))
+        print(f"{backend} vs gl: max difference {diff.max()}, mean {diff.mean():.4f}, "
+              f"pixels off by more than 2: {100 * np.mean(diff.max(axis=-1) > 2):.4f}%")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+import argparse
+import math
+import time
+import moderngl
+import numpy as np
+from data_generator.vao.create_circle import create_circle_vao
+from data_generator.vao.create_quad import create_quad_vao
+from data_generator.shaders.utils.load_shader import load_shader_program
+from data_generator.renderer import FrameRenderer, create_headless_context, set_shape_prog_uniforms
+from data_generator.simulation import FrameState
+from data_generator.config import VisualConfig, load_config
+
+
+class BatchFrameRenderer:
+    """
+    Renders many frames per draw call. The states of up to `batch_size`
+    consecutive frames are uploaded together as one float texture, and the
+    waves and the shape of all of them are drawn with instancing, every
+    instance into its own cell of a frame atlas. The whole atlas is read back
+    in one transfer. Per frame this saves the uniform uploads, the two draw
+    calls, the clear and the synchronous readback of `FrameRenderer`, which
+    dominate at small sizes. The frames are the same as those of
+    `FrameRenderer`.
+    """
+    def __init__(self, config: VisualConfig, width: int, height: int, batch_size: int = 16,
+                 ctx: moderngl.Context = None, supersample: int = 1):
+        """
+        :param config: VisualConfig object with settings.
+        :param width: Width of the returned frames.
+        :param height: Height of the returned frames.
+        :param batch_size: Most frames drawn at once, limited by the size of the atlas.
+        :param ctx: ModernGL context, a headless one is created if None.
+        :param supersample: Rendered pixels per output pixel along each axis.
+        """
+        self.config = config
+        self.width = width
+        self.height = height
+        self.supersample = max(1, supersample)
+        self.owns_ctx = ctx is None
+        self.ctx = ctx if ctx is not None else create_headless_context()
+
+        cell_width, cell_height = width * self.supersample, height * self.supersample
+        max_size = min(self.ctx.info['GL_MAX_RENDERBUFFER_SIZE'], self.ctx.info['GL_MAX_TEXTURE_SIZE'])
+        if cell_width > max_size or cell_height > max_size:
+            raise ValueError(f"Frames of {cell_width}x{cell_height} do not fit a framebuffer of at most {max_size}")
+        self.columns = max(1, min(batch_size, max_size // cell_width))
+        self.rows = max(1, min(math.ceil(batch_size / self.columns), max_size // cell_height))
+        self.batch_size = min(batch_size, self.columns * self.rows)
+        self.fbo = self.ctx.simple_framebuffer((self.columns * cell_width, self.rows * cell_height))
+
+        # Row per frame: (r, g, b, radius) of every wave, then (num_waves, radius_scale, avg_freq, rotation).
+        self.state_column = config.max_waves
+        self.frame_data = self.ctx.texture((config.max_waves + 1, self.batch_size), 4, dtype='f4')
+        self.frame_data.filter = (moderngl.NEAREST, moderngl.NEAREST)
+        self.packed = np.zeros((self.batch_size, config.max_waves + 1, 4), dtype=np.float32)
+
+        self.wave_prog = load_shader_program(self.ctx, 'shaders/wave_batch.vert', 'shaders/wave_batch.frag')
+        self.wave_prog['wave_thickness'].value = config.wave_thickness
+        self.wave_prog['brightness'].value = config.brightness
+        self.shape_prog = load_shader_program(self.ctx, 'shaders/shape_batch.vert', 'shaders/shape_batch.frag')
+        set_shape_prog_uniforms(self.shape_prog, config)
+        for prog in (self.wave_prog, self.shape_prog):
+            prog['frame_data'].value = 0
+            prog['state_column'].value = self.state_column
+            prog['atlas_columns'].value = self.columns
+            prog['atlas_rows'].value = self.rows
+        self.quad_vao = create_quad_vao(self.ctx, self.wave_prog)
+        self.shape_vao = create_circle_vao(self.ctx, self.shape_prog, config)
+
+    def render(self, state: FrameState) -> np.ndarray:
+        """
+        Render one frame.
+        :param state: FrameState to draw.
+        :return: RGB frame as uint8 array of shape (height, width, 3), top row first.
+        """
+        return self.render_batch([state])[0]
+
+    def render_batch(self, states: list) -> np.ndarray:
+        """
+        Render several frames, `batch_size` per draw call.
+        :param states: FrameStates to draw.
+        :return: RGB frames as uint8 array of shape (frames, height, width, 3), top row first.
+        """
+        frames = np.empty((len(states), self.height, self.width, 3), dtype=np.uint8)
+        for first in range(0, len(states), self.batch_size):
+            chunk = states[first:first + self.batch_size]
+            frames[first:first + len(chunk)] = self._render_chunk(chunk)
+        return frames
+
+    def _render_chunk(self, states: list) -> np.ndarray:
+        self._pack(states)
+        self.frame_data.write(self.packed)
+        self.frame_data.use(location=0)
+
+        self.fbo.use()
+        self.fbo.clear(0.0, 0.0, 0.0, 1.0)
+        self.quad_vao.render(moderngl.TRIANGLE_FAN, instances=len(states))
+        self.shape_vao.render(moderngl.TRIANGLE_FAN, instances=len(states))
+
+        # Only the rows of cells that were drawn, the first row is at the top of the atlas.
+        size = self.supersample
+        cell_width, cell_height = self.width * size, self.height * size
+        rows = math.ceil(len(states) / self.columns)
+        viewport = (0, (self.rows - rows) * cell_height, self.columns * cell_width, rows * cell_height)
+        pixels = self.fbo.read(viewport=viewport, components=3, alignment=1)
+        atlas = np.flip(np.frombuffer(pixels, dtype=np.uint8).reshape((rows * cell_height, self.columns * cell_width, 3)), axis=0)
+        cells = atlas.reshape(rows, cell_height, self.columns, cell_width, 3).swapaxes(1, 2)
+        frames = cells.reshape(rows * self.columns, cell_height, cell_width, 3)[:len(states)]
+        if size > 1:
+            frames = frames.reshape(len(states), self.height, size, self.width, size, 3).mean(axis=(2, 4))
+            frames = np.rint(frames).astype(np.uint8)
+        return frames
+
+    def _pack(self, states: list) -> None:
+        max_waves = self.config.max_waves
+        packed = self.packed
+        packed[:len(states)] = 0.0
+        for row, state in enumerate(states):
+            waves = state.waves[:max_waves]
+            if waves:
+                packed[row, :len(waves), :3] = [wave['color'] for wave in waves]
+                packed[row, :len(waves), 3] = [wave['radius'] for wave in waves]
+            packed[row, self.state_column] = (len(waves), state.radius_scale, state.avg_freq, state.rotation)
+
+    def release(self) -> None:
+        """
+        Release the OpenGL objects of this renderer, and its context if it created it.
+        """
+        for resource in (self.fbo, self.frame_data, self.quad_vao, self.shape_vao, self.wave_prog, self.shape_prog):
+            resource.release()
+        if self.owns_ctx:
+            self.ctx.release()
+
+
+def main():
+    """
+    Measure frames per second of the batched renderer for growing batch sizes,
+    next to the frame by frame FrameRenderer.
+    """
+    from data_generator.timeline import load_timeline
+
+    parser = argparse.ArgumentParser(description='Benchmark batched frame rendering')
+    parser.add_argument('input_audio', help='Input audio file, its frames are rendered')
+    parser.add_argument('-c', '--config', default='data_generator/config.json',
+                        help='Configuration file (default: config.json)')
+    parser.add_argument('-n', '--frames', type=int, default=256, help='Number of frames to render')
+    parser.add_argument('--width', type=int, default=128)
+    parser.add_argument('--height', type=int, default=128)
+    parser.add_argument('--supersample', type=int, default=1)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32, 64])
+    args = parser.parse_args()
+
+    config = load_config(config_file=args.config)
+    timeline = load_timeline(args.input_audio, config)
+    states = [timeline.state(frame % len(timeline)) for frame in range(args.frames)]
+    ctx = create_headless_context()
+
+    renderer = FrameRenderer(config, args.width, args.height, ctx=ctx, supersample=args.supersample)
+    renderer.render(states[0])  # warm up
+    start = time.perf_counter()
+    reference = np.stack([renderer.render(state) for state in states])
+    seconds = time.perf_counter() - start
+    renderer.release()
+    print(f"{'frame by frame':>16}: {args.frames / seconds:8.1f} frames/s at {args.width}x{args.height}")
+
+    for batch_size in args.batch_sizes:
+        renderer = BatchFrameRenderer(config, args.width, args.height, batch_size, ctx=ctx, supersample=args.supersample)
+        renderer.render_batch(states[:renderer.batch_size])  # warm up
+        start = time.perf_counter()
+        frames = renderer.render_batch(states)
+        seconds = time.perf_counter() - start
+        renderer.release()
+        diff = np.abs(frames.astype(np.int16) - reference).max(axis=-1)
+        print(f"{'batch ' + str(renderer.batch_size):>16}: {args.frames / seconds:8.1f} frames/s, "
+              f"pixels off by more than 2: {100 * np.mean(diff > 2):.4f}%")
+    ctx.release()
+
+if __name__ == "__main__":
+    main()
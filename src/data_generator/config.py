@@ -1,6 +1,7 @@
 import json
+import random
 from pathlib import Path
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, asdict, replace
 from rich.console import Console
 
 
@@ -80,6 +81,37 @@ class VisualConfig:
         self.alpha_down_bg_speed *= scaling_factor
 
 
+# Settings that randomize_config varies, with the relative range they are scaled by.
+_RANDOMIZED_SETTINGS = {
+    'circle_base_size': 0.3,
+    'circle_loudness_scale_factor': 0.3,
+    'rotation_speed': 0.5,
+    'protrusion_scale': 0.4,
+    'protrusion_variability': 0.3,
+    'protrusion_thickening_factor': 0.3,
+    'base_wave_speed': 0.4,
+    'wave_speed_loudness_scale_factor': 0.4,
+    'wave_thickness': 0.3,
+    'brightness': 0.15,
+}
+
+def randomize_config(config: VisualConfig, rng: random.Random, strength: float = 1.0) -> VisualConfig:
+    """
+    Create a variation of a config for more diverse training data. Every
+    setting in _RANDOMIZED_SETTINGS is scaled by a random factor around 1, and
+    the number of protrusions is redrawn.
+    :param config: VisualConfig object to start from, it is not modified.
+    :param rng: Random number generator.
+    :param strength: Multiplier for the size of the random changes.
+    :return: New VisualConfig object.
+    """
+    changes = {
+        name: getattr(config, name) * (1.0 + rng.uniform(-spread, spread) * strength)
+        for name, spread in _RANDOMIZED_SETTINGS.items()
+    }
+    changes['num_protrusions'] = max(1, config.num_protrusions + round(rng.uniform(-3, 3) * strength))
+    return replace(config, **changes)
+
 def load_config(config_file: str = 'config.json', console: Console = None) -> VisualConfig:
     """
     Load configuration from JSON file, create default if not exists.
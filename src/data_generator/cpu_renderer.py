@@ -0,0 +1,160 @@
+import os
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from data_generator.simulation import FrameState
+from data_generator.config import VisualConfig
+
+
+class CpuFrameRenderer:
+    """
+    Renders the same frames as FrameRenderer with vectorized NumPy instead of
+    OpenGL, for machines without a (fast) GL driver. The wave background of
+    wave.frag only depends on the distance to the center, so it is computed
+    for one quadrant and mirrored; the shape of shape.vert is tested per pixel
+    against the edges of the same polygon the GL path draws, inside its
+    bounding box only. Rows are split into tiles that run on a thread pool
+    (NumPy releases the GIL). Pixels only differ from the GL output by float
+    rounding and on exact polygon edges.
+    """
+    def __init__(self, config: VisualConfig, width: int, height: int,
+                 supersample: int = 1, workers: int = None, tile_rows: int = 64):
+        """
+        :param config: VisualConfig object with settings.
+        :param width: Width of the returned frames.
+        :param height: Height of the returned frames.
+        :param supersample: Rendered pixels per output pixel along each axis.
+        :param workers: Number of render threads, defaults to the number of CPUs.
+        :param tile_rows: Rows of the quadrant per wave tile.
+        """
+        self.config = config
+        self.width = width
+        self.height = height
+        self.supersample = max(1, supersample)
+        self.tile_rows = tile_rows
+        self.pool = ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1)
+
+        render_width = width * self.supersample
+        render_height = height * self.supersample
+        # Pixel centers in normalized device coordinates, top row first.
+        self.x = ((np.arange(render_width, dtype=np.float32) + 0.5) * 2 / render_width - 1)
+        self.y = (1 - (np.arange(render_height, dtype=np.float32) + 0.5) * 2 / render_height)
+
+        # Distance grid of the top left quadrant for the waves.
+        quadrant_x = self.x[:(render_width + 1) // 2]
+        quadrant_y = self.y[:(render_height + 1) // 2]
+        self.quadrant_dist = np.sqrt(quadrant_x[None, :] ** 2 + quadrant_y[:, None] ** 2)
+
+        # Radius and angle grids for the shape, undoing its aspect correction.
+        shape_x = self.x[None, :] / np.float32(config.height / config.width)
+        shape_y = np.broadcast_to(self.y[:, None], (render_height, render_width))
+        self.shape_radius = np.sqrt(shape_x ** 2 + shape_y ** 2)
+        self.shape_angle = np.mod(np.arctan2(shape_y, shape_x), np.float32(2 * np.pi))
+
+        self.vertex_angles = (2 * np.pi * np.arange(config.shape_vertices + 1) / config.shape_vertices).astype(np.float32)
+
+    def render(self, state: FrameState) -> np.ndarray:
+        """
+        Render one frame.
+        :param state: FrameState to draw.
+        :return: RGB frame as uint8 array of shape (height, width, 3), top row first.
+        """
+        image = self._render_waves(state.waves)
+        self._render_shape(image, state)
+
+        image = np.rint(np.clip(image, 0.0, 1.0) * 255)
+        size = self.supersample
+        if size > 1:
+            image = np.rint(image.reshape(self.height, size, self.width, size, 3).mean(axis=(1, 3)))
+        return image.astype(np.uint8)
+
+    def render_batch(self, states: list) -> np.ndarray:
+        """
+        Render several frames.
+        :param states: FrameStates to draw.
+        :return: RGB frames as uint8 array of shape (frames, height, width, 3), top row first.
+        """
+        return np.stack([self.render(state) for state in states])
+
+    def release(self) -> None:
+        """
+        Stop the render threads.
+        """
+        self.pool.shutdown()
+
+    def _render_waves(self, waves: list) -> np.ndarray:
+        """
+        Blend the waves like wave.frag on the top left quadrant and mirror it.
+        :param waves: Active waves, dicts with a 'color' and a 'radius'.
+        :return: Float RGB image of the full frame, top row first.
+        """
+        colors = np.array([wave['color'] for wave in waves], dtype=np.float32).reshape(-1, 3)
+        radii = np.array([wave['radius'] for wave in waves], dtype=np.float32)
+        rows = len(self.quadrant_dist)
+        tiles = [(start, min(start + self.tile_rows, rows)) for start in range(0, rows, self.tile_rows)]
+        quadrant = np.concatenate(list(self.pool.map(
+            lambda tile: self._wave_tile(self.quadrant_dist[tile[0]:tile[1]], colors, radii), tiles
+        )))
+
+        top = np.concatenate([quadrant, quadrant[:, :len(self.x) // 2][:, ::-1]], axis=1)
+        return np.concatenate([top, top[:len(self.y) // 2][::-1]], axis=0)
+
+    def _wave_tile(self, dist: np.ndarray, colors: np.ndarray, radii: np.ndarray) -> np.ndarray:
+        """
+        :param dist: Distances to the center of the pixels of the tile.
+        :param colors: Colors of the active waves, shape [waves, 3].
+        :param radii: Radii of the active waves, shape [waves].
+        :return: Float RGB image of the tile.
+        """
+        config = self.config
+        blend_thickness = np.float32(config.wave_thickness * 2.0)
+        if len(radii) == 0:
+            return np.zeros(dist.shape + (3,), dtype=np.float32)
+
+        # Waves whose band does not reach the tile add nothing.
+        reach = (radii + blend_thickness > dist.min()) & (radii - blend_thickness < dist.max())
+        t = np.clip(np.abs(dist[..., None] - radii[reach]) / blend_thickness, 0.0, 1.0)
+        weights = 1.0 - t * t * (3.0 - 2.0 * t)
+        color = weights @ colors[reach]
+        total_weight = weights.sum(axis=-1)
+
+        # Fallback of wave.frag: the newest wave covers pixels no wave reaches.
+        uncovered = total_weight <= 0.001
+        color[uncovered] = colors[np.argmin(radii)] * np.float32(0.9)
+        total_weight[uncovered] = 1.0
+        return color / total_weight[..., None] * np.float32(config.brightness)
+
+    def _render_shape(self, image: np.ndarray, state: FrameState) -> None:
+        """
+        Draw the black shape into the image, as the triangle fan of shape.vert.
+        :param image: Float RGB image, modified in place.
+        :param state: FrameState with the shape parameters.
+        """
+        config = self.config
+        base_radius = config.circle_base_size * (1.0 + state.radius_scale)
+        protr_size = 0.0
+        vertex_radii = np.full(len(self.vertex_angles), base_radius, dtype=np.float32)
+        if config.num_protrusions > 0:
+            protr_size = config.protrusion_scale * state.avg_freq ** config.protrusion_variability
+            power = config.protrusion_base_thickness + config.protrusion_thickening_factor * state.avg_freq
+            wave = (np.sin(config.num_protrusions * self.vertex_angles + state.rotation) + 1.0) / 2.0
+            vertex_radii += np.float32(protr_size) * wave ** np.float32(power)
+
+        # Only pixels inside the bounding circle of the shape need the edge test.
+        max_radius = base_radius + protr_size
+        height_width_ratio = config.height / config.width
+        columns = np.flatnonzero(np.abs(self.x) <= max_radius * height_width_ratio)
+        rows = np.flatnonzero(np.abs(self.y) <= max_radius)
+        if len(columns) == 0 or len(rows) == 0:
+            return
+        window = (slice(rows[0], rows[-1] + 1), slice(columns[0], columns[-1] + 1))
+        radius = self.shape_radius[window]
+        angle = self.shape_angle[window]
+
+        # Distance from the center to the polygon edge in the direction of each pixel.
+        step = np.float32(2 * np.pi / config.shape_vertices)
+        index = np.minimum((angle / step).astype(np.int64), config.shape_vertices - 1)
+        r0 = vertex_radii[index]
+        r1 = vertex_radii[index + 1]
+        offset = angle - self.vertex_angles[index]
+        edge_radius = r0 * r1 * np.sin(step) / (r0 * np.sin(offset) + r1 * np.sin(step - offset))
+        image[window][radius < edge_radius] = 0.0
@@ -0,0 +1,81 @@
+import subprocess
+import tempfile
+import numpy as np
+from pathlib import Path
+
+
+class FFmpegPipeWriter:
+    """
+    Streams raw RGB frames into an ffmpeg process that encodes them with H.264
+    and, optionally, muxes an audio file in the same pass. Frames can be passed
+    straight from an OpenGL framebuffer read: with `flip_vertically` ffmpeg
+    turns the bottom-up rows around, so no copy is made in Python. The ffmpeg
+    log goes to a temporary file, which cannot fill up and block the writer.
+    """
+    def __init__(self, output_path: str, width: int, height: int, fps: float,
+                 audio_path: str = None, flip_vertically: bool = False):
+        """
+        :param output_path: Path of the encoded video.
+        :param width: Width of the frames.
+        :param height: Height of the frames.
+        :param fps: Frame rate of the video.
+        :param audio_path: Audio file to mux into the video, or None for no audio.
+        :param flip_vertically: Whether the frames are stored bottom row first.
+        """
+        Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+        self.output_path = output_path
+        self.frame_size = width * height * 3
+        command = [
+            'ffmpeg', '-y', '-loglevel', 'error',
+            '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-s', f'{width}x{height}', '-r', str(fps),
+            '-i', '-',
+        ]
+        if audio_path is not None:
+            command += ['-i', audio_path, '-map', '0:v:0', '-map', '1:a:0', '-c:a', 'aac', '-shortest']
+        if flip_vertically:
+            command += ['-vf', 'vflip']
+        command += ['-c:v', 'libx264', '-pix_fmt', 'yuv420p', output_path]
+        self.log = tempfile.TemporaryFile()
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stderr=self.log)
+
+    def append_data(self, frame) -> None:
+        """
+        Write one frame.
+        :param frame: RGB frame as bytes or a uint8 array of shape (height, width, 3).
+        """
+        data = frame if isinstance(frame, (bytes, bytearray, memoryview)) else frame.tobytes()
+        if len(data) != self.frame_size:
+            raise ValueError(f"Expected a frame of {self.frame_size} bytes, got {len(data)}")
+        self.write(data)
+
+    def write(self, data) -> None:
+        """
+        Write raw pixels that do not have to form a whole frame, e.g. a strip of
+        rows of a frame that is rendered in parts. The rows of all calls together
+        must add up to whole frames.
+        :param data: RGB rows as bytes or a uint8 array of shape (rows, width, 3).
+        """
+        if not isinstance(data, (bytes, bytearray, memoryview)):
+            data = memoryview(np.ascontiguousarray(data)).cast('B')
+        try:
+            self.process.stdin.write(data)
+        except BrokenPipeError:
+            self.close()
+            raise
+
+    def close(self) -> None:
+        """
+        Finish the video. Raises a RuntimeError if ffmpeg failed.
+        """
+        if self.process.returncode is not None:
+            return
+        try:
+            self.process.stdin.close()
+        except BrokenPipeError:
+            pass
+        self.process.wait()
+        self.log.seek(0)
+        stderr = self.log.read()
+        self.log.close()
+        if self.process.returncode != 0:
+            raise RuntimeError(f"ffmpeg failed while encoding {self.output_path}: {stderr.decode(errors='replace').strip()}")
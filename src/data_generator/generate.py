@@ -17,6 +17,11 @@ from data_generator.timing_summary import print_timing_summary
 from data_generator.config import VisualConfig, load_config
 from data_generator.argument_parser import parse_arguments
 from data_generator.render_loop import render_loop
+from data_generator.renderer import (TiledFramebuffer, set_composite_prog_uniforms, set_shape_prog_uniforms,
+                                     set_tile_uniforms)
+from data_generator.renditions import RenditionSet, parse_rendition
+from data_generator.encoder import FFmpegPipeWriter
+from data_generator.batch_renderer import BatchFrameRenderer
 
 
 def main():
@@ -30,22 +35,53 @@ def main():
     console = Console()
     console.log("Starting program")
     config: VisualConfig = load_config(config_file=args.config, console=console)
+    rendition_sizes = [parse_rendition(size) for size in args.rendition]
 
     _initialize_pygame(config)
     ctx = moderngl.create_context()
+    tile_size = _tile_size(ctx, config, args.tile_size)
+    if tile_size and rendition_sizes:
+        raise ValueError("Renditions need the full frame on the GPU and cannot be combined with tiled rendering")
+    if args.batch_frames > 0 and (tile_size or rendition_sizes or args.single_pass):
+        raise ValueError("Batched rendering cannot be combined with tiles, renditions or --single-pass")
     Path(config.temp_file).parent.mkdir(parents=True, exist_ok=True)
-    writer = imageio.get_writer(config.temp_file, fps=config.fps)
+    if tile_size:
+        # Tiles are streamed to ffmpeg in strips, the full frame is never held in memory.
+        console.log(f"Rendering {config.width}x{config.height} frames in tiles of {tile_size} pixels")
+        writer = FFmpegPipeWriter(config.temp_file, config.width, config.height, config.fps)
+    else:
+        writer = imageio.get_writer(config.temp_file, fps=config.fps)
 
-    shape_prog = load_shader_program(ctx, 'shaders/shape.vert', 'shaders/shape.frag')
-    _set_shape_prog_uniforms(shape_prog, config)
-    wave_prog = load_shader_program(ctx, 'shaders/wave.vert', 'shaders/wave.frag')
+    if args.single_pass:
+        # The composite shader draws the waves and the shape in one full-screen pass.
+        wave_prog = load_shader_program(ctx, 'shaders/wave.vert', 'shaders/composite.frag')
+        set_composite_prog_uniforms(wave_prog, config)
+        shape_prog = wave_prog
+        shape_vao = None
+    else:
+        shape_prog = load_shader_program(ctx, 'shaders/shape.vert', 'shaders/shape.frag')
+        set_shape_prog_uniforms(shape_prog, config)
+        wave_prog = load_shader_program(ctx, 'shaders/wave.vert', 'shaders/wave.frag')
+        shape_vao = create_circle_vao(ctx, shape_prog, config)
+    set_tile_uniforms(wave_prog)
+    set_tile_uniforms(shape_prog)
     quad_vao = create_quad_vao(ctx, wave_prog)
-    shape_vao = create_circle_vao(ctx, shape_prog, config)
 
     console.log(f"Processing audio file [bold]{args.input_audio}[/bold]")
     audio_info, audio_duration = _process_audio(args.input_audio, config)
 
-    timings = render_loop(ctx, writer, audio_info, config, wave_prog, shape_prog, quad_vao, shape_vao, console)
+    renditions = None
+    if rendition_sizes:
+        renditions = RenditionSet(ctx, config, rendition_sizes, _output_file(args), args.input_audio)
+        console.log(f"Writing renditions {', '.join(renditions.paths)}")
+
+    tiles = TiledFramebuffer(ctx, config.width, config.height, tile_size) if tile_size else None
+    batch = None
+    if args.batch_frames > 0:
+        batch = BatchFrameRenderer(config, config.width, config.height, args.batch_frames, ctx=ctx)
+        console.log(f"Rendering {batch.batch_size} frames per draw call")
+    timings = render_loop(ctx, writer, audio_info, config, wave_prog, shape_prog, quad_vao, shape_vao, console,
+                          renditions, tiles, batch)
     (render_loop_duration, total_rendering_time, total_writing_time) = timings
 
     console.log("\n", "Combining video with audio using FFmpeg")
@@ -60,31 +96,45 @@ def main():
         total_writing_time,
         len(audio_info),
         config,
-        args.output if args.output else 'output.mp4'
+        _output_file(args)
     )
 
+def _output_file(args) -> str:
+    """
+    Path of the final video.
+    :param args: Command line arguments containing input audio and output file.
+    :return: The output file, or the input audio path with a .mp4 extension.
+    """
+    return args.output if args.output else args.input_audio.replace('.mp3', '.mp4')
+
+def _tile_size(ctx: moderngl.Context, config: VisualConfig, requested: int) -> int:
+    """
+    Size of the tiles the frames are rendered in.
+    :param ctx: ModernGL context.
+    :param config: VisualConfig object with settings.
+    :param requested: Tile size from the command line, 0 to decide automatically.
+    :return: The tile size, or 0 to render whole frames.
+    """
+    max_size = ctx.info['GL_MAX_RENDERBUFFER_SIZE']
+    if requested > 0:
+        tile_size = min(requested, max_size)
+    elif max(config.width, config.height) > max_size:
+        tile_size = max_size
+    else:
+        return 0
+    return tile_size if tile_size < max(config.width, config.height) else 0
+
 def _initialize_pygame(config: VisualConfig) -> None:
     """
-    Initialize Pygame with the specified configuration.
+    Initialize Pygame with the specified configuration. The preview window
+    is scaled down to fit 3840x2160 for frames larger than that.
     :param config: VisualConfig object containing settings.
     """
     pygame.init()
-    pygame.display.set_mode((config.width, config.height), DOUBLEBUF | OPENGL)
+    scale = min(1.0, 3840 / config.width, 2160 / config.height)
+    pygame.display.set_mode((round(config.width * scale), round(config.height * scale)), DOUBLEBUF | OPENGL)
     pygame.display.set_caption("Audio Visualizer - Live Preview")
 
-def _set_shape_prog_uniforms(shape_prog: moderngl.Program, config: VisualConfig) -> None:
-    """
-    Set the uniforms for the shape shader program based on the config.
-    :param shape_prog: The shader program for shapes.
-    :param config: The VisualConfig object containing settings.
-    """
-    shape_prog['protr_base_thickness'].value = config.protrusion_base_thickness 
-    shape_prog['protr_thickness_factor'].value = config.protrusion_thickening_factor  
-    shape_prog['height_width_ratio'].value = config.height / config.width
-    shape_prog['protr_amount'].value = config.num_protrusions
-    shape_prog['protr_scale'].value = config.protrusion_scale
-    shape_prog['protr_variability'].value = config.protrusion_variability
-
 def _process_audio(audio_file: str, config: VisualConfig) -> tuple:
     """
     Process the audio file to extract the short-time Fourier transform (STFT)
@@ -107,7 +157,6 @@ def _combine_audio_with_video(config: VisualConfig, args) -> float:
     :return: Duration of the FFmpeg processing.
     """
     ffmpeg_start = time.time()
-    default_output_file = args.input_audio.replace('.mp3', '.mp4')
     process = subprocess.Popen([
         'ffmpeg',
         '-y',
@@ -117,7 +166,7 @@ def _combine_audio_with_video(config: VisualConfig, args) -> float:
         '-map', '0:v:0',
         '-map', '1:a:0',
         '-shortest',
-        args.output if args.output else default_output_file, 
+        _output_file(args),
     ], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
     process.communicate()
     ffmpeg_duration = time.time() - ffmpeg_start
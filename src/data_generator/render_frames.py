@@ -0,0 +1,94 @@
+import argparse
+import imageio
+from pathlib import Path
+from data_generator.config import VisualConfig, load_config
+from data_generator.backends import RENDER_BACKENDS, create_frame_renderer
+from data_generator.timeline import load_timeline
+
+
+def render_frames(audio_file: str, config: VisualConfig, timestamps: list, width: int = None,
+                  height: int = None, supersample: int = 1, cache_dir: str = None, backend: str = 'gl',
+                  tile_size: int = 0) -> list:
+    """
+    Render the frames of a track at arbitrary timestamps, e.g. for poster
+    frames or storyboards. The states come from the cached timeline of the
+    track, so only the requested frames are drawn, headless.
+    :param audio_file: Path to the audio file.
+    :param config: VisualConfig object with settings.
+    :param timestamps: Times in seconds, each is rounded to the nearest frame.
+    :param width: Width of the frames, defaults to the width of the config.
+    :param height: Height of the frames, defaults to the height of the config.
+    :param supersample: Rendered pixels per output pixel along each axis.
+    :param cache_dir: Directory of the cached timelines, None for the default.
+    :param backend: Render backend, one of RENDER_BACKENDS.
+    :param tile_size: Render frames larger than this in tiles (OpenGL backends), 0 for the GPU limit.
+    :return: List of RGB frames as uint8 arrays of shape (height, width, 3).
+    """
+    timeline = load_timeline(audio_file, config, cache_dir)
+    frames = []
+    for timestamp in timestamps:
+        frame = int(round(timestamp * config.fps))
+        if not 0 <= frame < len(timeline):
+            raise ValueError(f"Timestamp {timestamp}s is outside of the rendered track "
+                             f"(0 to {len(timeline) / config.fps:.2f}s)")
+        frames.append(frame)
+
+    renderer = create_frame_renderer(backend, config, width or config.width, height or config.height, supersample,
+                                     tile_size=tile_size)
+    try:
+        return list(renderer.render_batch([timeline.state(frame) for frame in frames]))
+    finally:
+        renderer.release()
+
+def evenly_spaced_timestamps(audio_file: str, config: VisualConfig, count: int, cache_dir: str = None) -> list:
+    """
+    Timestamps of `count` frames spread evenly over a track, e.g. for a storyboard.
+    :param audio_file: Path to the audio file.
+    :param config: VisualConfig object with settings.
+    :param count: Number of timestamps.
+    :param cache_dir: Directory of the cached timelines, None for the default.
+    :return: List of times in seconds.
+    """
+    duration = len(load_timeline(audio_file, config, cache_dir)) / config.fps
+    return [(i + 0.5) * duration / count for i in range(count)]
+
+
+def main():
+    """
+    Render single frames of a track to PNG files.
+    """
+    parser = argparse.ArgumentParser(description='Render frames of the audio visualizer at given timestamps')
+    parser.add_argument('input_audio', help='Input audio file')
+    parser.add_argument('-t', '--timestamps', type=float, nargs='+', default=[],
+                        help='Times in seconds of the frames to render')
+    parser.add_argument('-n', '--count', type=int, default=0,
+                        help='Render this many frames spread evenly over the track instead')
+    parser.add_argument('-o', '--output-dir', default='.', help='Directory for the PNG files')
+    parser.add_argument('-c', '--config', default='data_generator/config.json',
+                        help='Configuration file (default: config.json)')
+    parser.add_argument('--width', type=int, default=None, help='Frame width (default: from the config)')
+    parser.add_argument('--height', type=int, default=None, help='Frame height (default: from the config)')
+    parser.add_argument('--supersample', type=int, default=1)
+    parser.add_argument('--backend', choices=RENDER_BACKENDS, default='gl',
+                        help='Render with OpenGL or with the NumPy rasterizer (no GL driver needed)')
+    parser.add_argument('--tile-size', type=int, default=0,
+                        help='Render frames larger than this in tiles (default: only beyond the GPU limit)')
+    args = parser.parse_args()
+    if not args.timestamps and args.count <= 0:
+        parser.error('give --timestamps or --count')
+
+    config = load_config(config_file=args.config)
+    timestamps = args.timestamps or evenly_spaced_timestamps(args.input_audio, config, args.count)
+    images = render_frames(args.input_audio, config, timestamps, args.width, args.height, args.supersample,
+                           backend=args.backend, tile_size=args.tile_size)
+
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    stem = Path(args.input_audio).stem
+    for timestamp, image in zip(timestamps, images):
+        path = output_dir / f"{stem}_{timestamp:09.3f}s.png"
+        imageio.imwrite(path, image)
+        print(path)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+import moderngl
+import numpy as np
+from data_generator.vao.create_circle import create_circle_vao
+from data_generator.vao.create_quad import create_quad_vao
+from data_generator.shaders.utils.load_shader import load_shader_program
+from data_generator.simulation import FrameState
+from data_generator.config import VisualConfig
+
+
+def create_headless_context() -> moderngl.Context:
+    """
+    Create an OpenGL context without a window. Falls back to EGL when the
+    default standalone backend is not available (e.g. no X server).
+    :return: ModernGL context.
+    """
+    try:
+        return moderngl.create_standalone_context()
+    except Exception:
+        return moderngl.create_standalone_context(backend='egl')
+
+def set_shape_prog_uniforms(shape_prog: moderngl.Program, config: VisualConfig, height_width_ratio: float = None) -> None:
+    """
+    Set the uniforms for the shape shader program based on the config.
+    :param shape_prog: The shader program for shapes.
+    :param config: The VisualConfig object containing settings.
+    :param height_width_ratio: Aspect correction of the shape, defaults to height / width of the config.
+    """
+    if height_width_ratio is None:
+        height_width_ratio = config.height / config.width
+    shape_prog['protr_base_thickness'].value = config.protrusion_base_thickness
+    shape_prog['protr_thickness_factor'].value = config.protrusion_thickening_factor
+    shape_prog['height_width_ratio'].value = height_width_ratio
+    shape_prog['protr_amount'].value = config.num_protrusions
+    shape_prog['protr_scale'].value = config.protrusion_scale
+    shape_prog['protr_variability'].value = config.protrusion_variability
+
+def set_composite_prog_uniforms(composite_prog: moderngl.Program, config: VisualConfig,
+                                height_width_ratio: float = None) -> None:
+    """
+    Set the uniforms for the single pass composite shader program based on the config.
+    :param composite_prog: The shader program drawing the waves and the shape in one pass.
+    :param config: The VisualConfig object containing settings.
+    :param height_width_ratio: Aspect correction of the shape, defaults to height / width of the config.
+    """
+    set_shape_prog_uniforms(composite_prog, config, height_width_ratio)
+    # The fan of the two pass renderer has this radius built into its vertices.
+    composite_prog['circle_base_size'].value = config.circle_base_size
+
+def set_tile_uniforms(prog: moderngl.Program, tile: tuple = None, width: int = 1, height: int = 1) -> None:
+    """
+    Set the transform that maps the full frame onto the framebuffer. Every
+    program using wave.vert or shape.vert needs it, without a tile it draws
+    the full frame.
+    :param prog: Wave, shape or composite shader program.
+    :param tile: (x, y, width, height) in pixels of the frame, y from the bottom, or None for the full frame.
+    :param width: Width of the full frame in pixels.
+    :param height: Height of the full frame in pixels.
+    """
+    scale, offset = (1.0, 1.0), (0.0, 0.0)
+    if tile is not None:
+        x, y, tile_width, tile_height = tile
+        scale = (width / tile_width, height / tile_height)
+        # Moves the center of the tile, in full-frame NDC, to the center of the framebuffer.
+        offset = (-(2.0 * x + tile_width) / tile_width + scale[0], -(2.0 * y + tile_height) / tile_height + scale[1])
+    prog['tile_scale'].value = scale
+    prog['tile_offset'].value = offset
+
+def set_wave_uniforms(wave_prog: moderngl.Program, active_waves: list, config: VisualConfig) -> None:
+    """
+    Set the uniforms for the wave shader program.
+    :param wave_prog: Wave shader program.
+    :param active_waves: List of currently active waves.
+    :param config: VisualConfig object with settings.
+    """
+    wave_colors = []
+    wave_radii = []
+
+    for wave in active_waves:
+        wave_colors.append(wave['color'])
+        wave_radii.append(wave['radius'])
+
+    while len(wave_colors) < config.max_waves:
+        wave_colors.append([0.0, 0.0, 0.0])
+    while len(wave_radii) < config.max_waves:
+        wave_radii.append(0.0)
+
+    wave_prog['wave_colors'].value = wave_colors
+    wave_prog['wave_radii'].value = wave_radii
+    wave_prog['num_waves'].value = len(active_waves)
+    wave_prog['wave_thickness'].value = config.wave_thickness
+    wave_prog['brightness'].value = config.brightness
+
+def set_shape_uniforms(shape_prog: moderngl.Program, radius_scale: float, avg_freq: float, rotation: float) -> None:
+    """
+    Set the uniforms for the shape shader program.
+    :param shape_prog: Shape shader program.
+    :param radius_scale: Radius scale value.
+    :param avg_freq: Average frequency value.
+    :param rotation: Current rotation value.
+    """
+    shape_prog['rotation'].value = rotation
+    shape_prog['radius_scale'].value = radius_scale
+    shape_prog['avg_freq'].value = avg_freq
+
+
+class TiledFramebuffer:
+    """
+    Renders frames that are larger than a framebuffer may be (or than is
+    sensible to read back at once) as a grid of tiles. Each tile is drawn into
+    the same small framebuffer with the tile transform of the shaders and read
+    back into a reusable strip buffer. Strips span the full width and are
+    produced top to bottom, so they can be streamed straight to an encoder.
+    """
+    def __init__(self, ctx: moderngl.Context, width: int, height: int, tile_size: int):
+        """
+        :param ctx: ModernGL context.
+        :param width: Width of the full frame.
+        :param height: Height of the full frame.
+        :param tile_size: Maximum width and height of a tile.
+        """
+        self.width = width
+        self.height = height
+        self.tile_width = min(tile_size, width)
+        self.tile_height = min(tile_size, height)
+        self.fbo = ctx.simple_framebuffer((self.tile_width, self.tile_height))
+        self.strip = np.empty((self.tile_height, width, 3), dtype=np.uint8)
+
+    def strips(self, programs: list, draw):
+        """
+        Render the current frame tile by tile.
+        :param programs: Shader programs whose tile transform is updated for every tile.
+        :param draw: Function issuing the draw calls of a frame.
+        :return: Iterator over RGB strips of shape (rows, width, 3), top strip and top row first.
+            The strip buffer is reused, copy a strip to keep it.
+        """
+        try:
+            for top in range(self.height, 0, -self.tile_height):
+                y = max(0, top - self.tile_height)
+                rows = top - y
+                for x in range(0, self.width, self.tile_width):
+                    columns = min(self.tile_width, self.width - x)
+                    for prog in programs:
+                        set_tile_uniforms(prog, (x, y, columns, rows), self.width, self.height)
+                    self.fbo.viewport = (0, 0, columns, rows)
+                    self.fbo.use()
+                    self.fbo.clear(0.0, 0.0, 0.0, 1.0)
+                    draw()
+                    pixels = self.fbo.read(viewport=(0, 0, columns, rows), components=3, alignment=1)
+                    tile = np.frombuffer(pixels, dtype=np.uint8).reshape((rows, columns, 3))
+                    self.strip[:rows, x:x + columns] = tile[::-1]
+                yield self.strip[:rows]
+        finally:
+            for prog in programs:
+                set_tile_uniforms(prog)
+
+    def release(self) -> None:
+        """
+        Release the tile framebuffer.
+        """
+        self.fbo.release()
+
+
+class FrameRenderer:
+    """
+    Renders single frames off-screen with the visualizer shaders, at any
+    resolution and without a window. The picture is the same as the one of the
+    generator at `config.width` x `config.height`, stretched to the requested
+    size, so rendering at a small size matches a downscaled video of the
+    generator. With `supersample` > 1 every output pixel is the average of
+    `supersample` x `supersample` rendered pixels, which approximates the
+    filtering of a downscale. With `single_pass` the waves and the shape are
+    drawn by one full-screen shader that evaluates the shape edge analytically
+    and anti-aliases it, instead of a wave quad followed by a vertex fan.
+    With `tile_size`, or beyond the GPU framebuffer limit, frames are rendered in tiles.
+    """
+    def __init__(self, config: VisualConfig, width: int, height: int,
+                 ctx: moderngl.Context = None, supersample: int = 1, single_pass: bool = False,
+                 tile_size: int = 0):
+        """
+        :param config: VisualConfig object with settings.
+        :param width: Width of the returned frames.
+        :param height: Height of the returned frames.
+        :param ctx: ModernGL context, a headless one is created if None.
+        :param supersample: Rendered pixels per output pixel along each axis.
+        :param single_pass: Draw everything with the composite shader in one draw call.
+        :param tile_size: Maximum rendered width and height drawn at once, 0 for the GPU limit.
+        """
+        self.config = config
+        self.width = width
+        self.height = height
+        self.supersample = max(1, supersample)
+        self.owns_ctx = ctx is None
+        self.ctx = ctx if ctx is not None else create_headless_context()
+
+        if single_pass:
+            # One program has both the wave and the shape uniforms.
+            self.wave_prog = load_shader_program(self.ctx, 'shaders/wave.vert', 'shaders/composite.frag')
+            set_composite_prog_uniforms(self.wave_prog, config)
+            self.shape_prog = self.wave_prog
+            self.shape_vao = None
+        else:
+            self.shape_prog = load_shader_program(self.ctx, 'shaders/shape.vert', 'shaders/shape.frag')
+            set_shape_prog_uniforms(self.shape_prog, config)
+            self.wave_prog = load_shader_program(self.ctx, 'shaders/wave.vert', 'shaders/wave.frag')
+            self.shape_vao = create_circle_vao(self.ctx, self.shape_prog, config)
+        self.quad_vao = create_quad_vao(self.ctx, self.wave_prog)
+        set_tile_uniforms(self.wave_prog)
+        set_tile_uniforms(self.shape_prog)
+
+        render_width, render_height = width * self.supersample, height * self.supersample
+        self.fbo = None
+        self.tiles = None
+        max_size = self.ctx.info['GL_MAX_RENDERBUFFER_SIZE']
+        tile_size = min(tile_size, max_size) if tile_size > 0 else max_size
+        if tile_size < max(render_width, render_height):
+            self.tiles = TiledFramebuffer(self.ctx, render_width, render_height, tile_size)
+        else:
+            self.fbo = self.ctx.simple_framebuffer((render_width, render_height))
+
+    def render(self, state: FrameState) -> np.ndarray:
+        """
+        Render one frame.
+        :param state: FrameState to draw.
+        :return: RGB frame as uint8 array of shape (height, width, 3), top row first.
+        """
+        set_wave_uniforms(self.wave_prog, state.waves, self.config)
+        set_shape_uniforms(self.shape_prog, state.radius_scale, state.avg_freq, state.rotation)
+
+        size = self.supersample
+        if self.tiles is not None:
+            image = np.empty((self.height * size, self.width * size, 3), dtype=np.uint8)
+            row = 0
+            for strip in self.tiles.strips([self.wave_prog, self.shape_prog], self._draw):
+                image[row:row + len(strip)] = strip
+                row += len(strip)
+        else:
+            self.fbo.use()
+            self.fbo.clear(0.0, 0.0, 0.0, 1.0)
+            self._draw()
+            pixels = self.fbo.read(components=3, alignment=1)
+            image = np.flip(np.frombuffer(pixels, dtype=np.uint8).reshape((self.height * size, self.width * size, 3)), axis=0)
+        if size > 1:
+            image = image.reshape(self.height, size, self.width, size, 3).mean(axis=(1, 3))
+            image = np.rint(image).astype(np.uint8)
+        return np.ascontiguousarray(image)
+
+    def render_batch(self, states: list) -> np.ndarray:
+        """
+        Render several frames.
+        :param states: FrameStates to draw.
+        :return: RGB frames as uint8 array of shape (frames, height, width, 3), top row first.
+        """
+        return np.stack([self.render(state) for state in states])
+
+    def _draw(self) -> None:
+        self.quad_vao.render(moderngl.TRIANGLE_FAN)
+        if self.shape_vao is not None:
+            self.shape_vao.render(moderngl.TRIANGLE_FAN)
+
+    def release(self) -> None:
+        """
+        Release the OpenGL objects of this renderer, and its context if it created it.
+        """
+        for resource in (self.fbo, self.tiles, self.quad_vao, self.shape_vao, self.wave_prog, self.shape_prog):
+            if resource is not None:
+                resource.release()
+        if self.owns_ctx:
+            self.ctx.release()
@@ -0,0 +1,97 @@
+import moderngl
+from pathlib import Path
+from data_generator.encoder import FFmpegPipeWriter
+from data_generator.vao.create_quad import create_quad_vao
+from data_generator.shaders.utils.load_shader import load_shader_program
+from data_generator.config import VisualConfig
+
+
+def parse_rendition(value: str) -> tuple:
+    """
+    Parse a rendition size given as 'WIDTHxHEIGHT'. Renditions are encoded as
+    yuv420p, which needs even dimensions.
+    :param value: Size string, e.g. '1280x720'.
+    :return: Tuple (width, height).
+    """
+    try:
+        width, height = (int(part) for part in value.lower().split('x'))
+    except ValueError:
+        raise ValueError(f"Invalid rendition size '{value}', expected WIDTHxHEIGHT")
+    if width <= 0 or height <= 0:
+        raise ValueError(f"Invalid rendition size '{value}', width and height must be positive")
+    if width % 2 or height % 2:
+        raise ValueError(f"Invalid rendition size '{value}', width and height must be even "
+                         f"(e.g. {width + width % 2}x{height + height % 2})")
+    return width, height
+
+def rendition_path(output_path: str, width: int, height: int) -> str:
+    """
+    Path of a rendition next to the main output, e.g. song_1280x720.mp4 for song.mp4.
+    :param output_path: Path of the full resolution video.
+    :param width: Width of the rendition.
+    :param height: Height of the rendition.
+    :return: Path of the rendition video.
+    """
+    path = Path(output_path)
+    return str(path.with_name(f"{path.stem}_{width}x{height}{path.suffix or '.mp4'}"))
+
+
+class RenditionSet:
+    """
+    Produces smaller versions of the rendered video in the same pass as the
+    full resolution one. Frames are drawn once into `source_fbo`, which is
+    backed by a mipmapped texture. For every rendition the texture is then
+    downsampled on the GPU into a framebuffer of the rendition size, and the
+    result is piped into its own ffmpeg encoder together with the audio. The
+    simulation, the draws and the audio analysis are shared by all outputs.
+    """
+    def __init__(self, ctx: moderngl.Context, config: VisualConfig, sizes: list,
+                 output_path: str, audio_path: str = None):
+        """
+        :param ctx: ModernGL context.
+        :param config: VisualConfig object with settings, the source has its width and height.
+        :param sizes: List of (width, height) pairs of the renditions.
+        :param output_path: Path of the full resolution video, renditions are saved next to it.
+        :param audio_path: Audio file muxed into the renditions, or None for silent videos.
+        """
+        self.ctx = ctx
+        self.source_texture = ctx.texture((config.width, config.height), 4)
+        self.source_texture.filter = (moderngl.LINEAR_MIPMAP_LINEAR, moderngl.LINEAR)
+        self.source_fbo = ctx.framebuffer(color_attachments=[self.source_texture])
+
+        self.downsample_prog = load_shader_program(ctx, 'shaders/downsample.vert', 'shaders/downsample.frag')
+        self.downsample_prog['source'].value = 0
+        self.quad_vao = create_quad_vao(ctx, self.downsample_prog)
+
+        self.fbos = []
+        self.writers = []
+        self.paths = []
+        for width, height in sizes:
+            path = rendition_path(output_path, width, height)
+            self.fbos.append(ctx.simple_framebuffer((width, height)))
+            # Framebuffer rows are read bottom-up, ffmpeg flips them while encoding.
+            self.writers.append(FFmpegPipeWriter(path, width, height, config.fps, audio_path, flip_vertically=True))
+            self.paths.append(path)
+
+    def write(self) -> None:
+        """
+        Downsample the frame that is currently in `source_fbo` into every
+        rendition and hand it to the encoders.
+        """
+        self.source_texture.build_mipmaps()
+        self.source_texture.use(location=0)
+        for fbo, writer in zip(self.fbos, self.writers):
+            fbo.use()
+            self.quad_vao.render(moderngl.TRIANGLE_FAN)
+            writer.append_data(fbo.read(components=3, alignment=1))
+
+    def close(self) -> None:
+        """
+        Finish all rendition videos and release the OpenGL objects.
+        """
+        for writer in self.writers:
+            writer.close()
+        for resource in (*self.fbos, self.quad_vao, self.downsample_prog, self.source_fbo, self.source_texture):
+            resource.release()
+        self.fbos = []
+        self.writers = []
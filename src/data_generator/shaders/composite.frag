@@ -0,0 +1,88 @@
+#version 330
+in vec2 frag_pos;
+// Wave uniforms, as in wave.frag
+uniform vec3 wave_colors[32];
+uniform float wave_radii[32];
+uniform int num_waves;
+uniform float wave_thickness;
+uniform float brightness;
+// Shape uniforms, as in shape.vert
+uniform float circle_base_size; // Radius of the shape without protrusions
+uniform float avg_freq;
+uniform float protr_amount;
+uniform float protr_scale;
+uniform float protr_base_thickness;
+uniform float protr_thickness_factor;
+uniform float height_width_ratio;
+uniform float rotation;
+uniform float radius_scale;
+uniform float protr_variability;
+out vec4 fragColor;
+
+vec3 wave_color(float dist) {
+    vec3 final_color = vec3(0.0, 0.0, 0.0);
+    float total_weight = 0.0;
+
+    for (int i = 0; i < num_waves && i < 32; i++) {
+        float distance_from_wave = abs(dist - wave_radii[i]);
+        float blend_thickness = wave_thickness * 2.0;
+        if (distance_from_wave < blend_thickness) {
+            float weight = 1.0 - smoothstep(0.0, blend_thickness, distance_from_wave);
+            final_color += wave_colors[i] * weight;
+            total_weight += weight;
+        }
+    }
+
+    if (total_weight <= 0.001 && num_waves > 0) {
+        float smallest_radius = 999.0;
+        int newest_wave_idx = 0;
+        for (int i = 0; i < num_waves && i < 32; i++) {
+            if (wave_radii[i] < smallest_radius) {
+                smallest_radius = wave_radii[i];
+                newest_wave_idx = i;
+            }
+        }
+        final_color = wave_colors[newest_wave_idx] * 0.9;
+        total_weight = 1.0;
+    }
+
+    if (total_weight > 0.0) {
+        final_color = (final_color / total_weight) * brightness;
+    }
+    return final_color;
+}
+
+// Signed radial distance to the edge of the shape, negative inside. Pixels
+// well outside the longest protrusion skip the polar evaluation, `far` is set
+// for them.
+float shape_distance(vec2 pos, out bool far) {
+    // Undo the aspect correction that shape.vert applies to its vertices.
+    vec2 p = vec2(pos.x / height_width_ratio, pos.y);
+    float radius = length(p);
+    float edge = circle_base_size * (1.0 + radius_scale);
+    far = false;
+    if (protr_amount > 0.0) {
+        float protr_size = protr_scale * pow(avg_freq, protr_variability);
+        float outside = radius - (edge + protr_size);
+        if (outside > 2.0 * length(fwidth(p))) {
+            far = true;
+            return outside;
+        }
+        float theta = atan(p.y, p.x);
+        float power = protr_base_thickness + protr_thickness_factor * avg_freq;
+        edge += protr_size * pow((sin(protr_amount * theta + rotation) + 1.0) / 2.0, power);
+    }
+    return radius - edge;
+}
+
+void main() {
+    // Clamped first, like the framebuffer does with the wave pass before the shape is drawn.
+    vec3 background = clamp(wave_color(length(frag_pos)), 0.0, 1.0);
+    bool far;
+    float dist = shape_distance(frag_pos, far);
+    // Coverage of the pixel by the black shape, anti-aliased over one pixel. The
+    // derivative is taken for every pixel, but is meaningless next to `far` ones.
+    float width = max(fwidth(dist), 1e-6);
+    float coverage = far ? 0.0 : clamp(0.5 - dist / width, 0.0, 1.0);
+    fragColor = vec4(background * (1.0 - coverage), 1.0);
+}
@@ -0,0 +1,10 @@
+#version 330
+in vec2 uv;
+uniform sampler2D source;
+out vec4 fragColor;
+
+void main() {
+    // The source is mipmapped, so the trilinear lookup averages every source
+    // pixel that falls into this output pixel.
+    fragColor = vec4(texture(source, uv).rgb, 1.0);
+}
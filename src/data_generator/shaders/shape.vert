@@ -9,12 +9,14 @@ uniform float height_width_ratio; // Height to width ratio
 uniform float rotation; // Angle of rotation
 uniform float radius_scale; // Scale factor for the radius 
 uniform float protr_variability; // Variability factor for protrusion lengths
+uniform vec2 tile_scale; // Maps the full frame to the tile being rendered
+uniform vec2 tile_offset;
 
 void main() {
     float x = in_pos.x * (1.0 + radius_scale);
     float y = in_pos.y * (1.0 + radius_scale);
     if (in_pos.x == 0.0 && in_pos.y == 0.0) {
-        gl_Position = vec4(x * height_width_ratio, y, 0.0, 1.0); // Central point is excluded
+        gl_Position = vec4(vec2(x * height_width_ratio, y) * tile_scale + tile_offset, 0.0, 1.0); // Central point is excluded
         return;
     }
     float theta = atan(y, x);
@@ -28,5 +30,5 @@ void main() {
     }
     x = (radius + total_protr) * cos(theta);
     y = (radius + total_protr) * sin(theta);
-    gl_Position = vec4(x * height_width_ratio, y, 0.0, 1.0);
+    gl_Position = vec4(vec2(x * height_width_ratio, y) * tile_scale + tile_offset, 0.0, 1.0);
 }
\ No newline at end of file
@@ -0,0 +1,10 @@
+#version 330
+in vec2 frame_pos;
+out vec4 fragColor;
+void main() {
+    // Parts of the shape outside its frame would land in the neighbouring cell of the atlas.
+    if (any(greaterThan(abs(frame_pos), vec2(1.0)))) {
+        discard;
+    }
+    fragColor = vec4(0.0, 0.0, 0.0, 1.0);  // Black circle
+}
@@ -0,0 +1,38 @@
+#version 330
+in vec2 in_pos;
+out vec2 frame_pos;
+uniform sampler2D frame_data; // Row per frame, see wave_batch.frag
+uniform int state_column; // Texel with (num_waves, radius_scale, avg_freq, rotation)
+uniform float protr_amount; // Amount of protrusions
+uniform float protr_scale; // Scaler for protrusions
+uniform float protr_base_thickness; // Base thickness of protrusions
+uniform float protr_thickness_factor; // Factor to scale protrusion thickness
+uniform float height_width_ratio; // Height to width ratio
+uniform float protr_variability; // Variability factor for protrusion lengths
+uniform int atlas_columns; // Frames are laid out row by row, the first row at the top
+uniform int atlas_rows;
+
+void main() {
+    vec4 state = texelFetch(frame_data, ivec2(state_column, gl_InstanceID), 0);
+    float radius_scale = state.y;
+    float avg_freq = state.z;
+    float rotation = state.w;
+    float x = in_pos.x * (1.0 + radius_scale);
+    float y = in_pos.y * (1.0 + radius_scale);
+    if (!(in_pos.x == 0.0 && in_pos.y == 0.0)) { // Central point is excluded
+        float theta = atan(y, x);
+        float radius = length(vec2(x, y));
+        float total_protr = 0.0;
+        if (protr_amount > 0.0) {
+            float protr_size = protr_scale * pow(avg_freq, protr_variability);
+            float power = protr_base_thickness + protr_thickness_factor * avg_freq;
+            float protr = protr_size * pow((sin(protr_amount * theta + rotation) + 1.0) / 2.0, power);
+            total_protr += protr;
+        }
+        x = (radius + total_protr) * cos(theta);
+        y = (radius + total_protr) * sin(theta);
+    }
+    frame_pos = vec2(x * height_width_ratio, y);
+    vec2 cell = vec2(gl_InstanceID % atlas_columns, atlas_rows - 1 - gl_InstanceID / atlas_columns);
+    gl_Position = vec4((frame_pos + 1.0 + 2.0 * cell) / vec2(atlas_columns, atlas_rows) - 1.0, 0.0, 1.0);
+}
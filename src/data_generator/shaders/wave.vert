@@ -1,7 +1,9 @@
 #version 330
 in vec2 in_pos;
 out vec2 frag_pos;
+uniform vec2 tile_scale; // Maps the full frame to the tile being rendered
+uniform vec2 tile_offset;
 void main() {
     frag_pos = in_pos;
-    gl_Position = vec4(in_pos.x, in_pos.y, 0.0, 1.0);
+    gl_Position = vec4(in_pos * tile_scale + tile_offset, 0.0, 1.0);
 }
\ No newline at end of file
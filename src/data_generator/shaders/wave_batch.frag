@@ -0,0 +1,46 @@
+#version 330
+in vec2 frag_pos;
+flat in int frame_index;
+flat in int num_waves;
+uniform sampler2D frame_data; // Row per frame: one texel (r, g, b, radius) per wave, then the shape state
+uniform float wave_thickness;
+uniform float brightness;
+out vec4 fragColor;
+
+void main() {
+    float dist = length(frag_pos);
+    vec3 final_color = vec3(0.0, 0.0, 0.0);
+    float total_weight = 0.0;
+    
+    for (int i = 0; i < num_waves && i < 32; i++) {
+        vec4 wave = texelFetch(frame_data, ivec2(i, frame_index), 0);
+        float distance_from_wave = abs(dist - wave.w);
+        float blend_thickness = wave_thickness * 2.0;
+        if (distance_from_wave < blend_thickness) {
+            float weight = 1.0 - smoothstep(0.0, blend_thickness, distance_from_wave);
+            final_color += wave.rgb * weight;
+            total_weight += weight;
+        }
+    }
+    
+    // Same center fallback as wave.frag
+    if (total_weight <= 0.001 && num_waves > 0) {
+        float smallest_radius = 999.0;
+        vec3 newest_color = vec3(0.0);
+        for (int i = 0; i < num_waves && i < 32; i++) {
+            vec4 wave = texelFetch(frame_data, ivec2(i, frame_index), 0);
+            if (wave.w < smallest_radius) {
+                smallest_radius = wave.w;
+                newest_color = wave.rgb;
+            }
+        }
+        final_color = newest_color * 0.9;
+        total_weight = 1.0;
+    }
+    
+    if (total_weight > 0.0) {
+        final_color = (final_color / total_weight) * brightness;
+    }
+    
+    fragColor = vec4(final_color, 1.0);
+}
@@ -0,0 +1,16 @@
+#version 330
+in vec2 in_pos;
+out vec2 frag_pos;
+flat out int frame_index;
+flat out int num_waves;
+uniform sampler2D frame_data; // Row per frame, see wave_batch.frag
+uniform int state_column; // Texel with (num_waves, radius_scale, avg_freq, rotation)
+uniform int atlas_columns; // Frames are laid out row by row, the first row at the top
+uniform int atlas_rows;
+void main() {
+    frag_pos = in_pos;
+    frame_index = gl_InstanceID;
+    num_waves = int(texelFetch(frame_data, ivec2(state_column, gl_InstanceID), 0).x);
+    vec2 cell = vec2(gl_InstanceID % atlas_columns, atlas_rows - 1 - gl_InstanceID / atlas_columns);
+    gl_Position = vec4((in_pos + 1.0 + 2.0 * cell) / vec2(atlas_columns, atlas_rows) - 1.0, 0.0, 1.0);
+}
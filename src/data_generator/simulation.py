@@ -0,0 +1,144 @@
+import numpy as np
+from dataclasses import dataclass
+from data_generator.audio.audio_processing import AudioInfo
+from data_generator.functions.ema import apply_asymmetric_ema
+from data_generator.config import VisualConfig
+
+
+@dataclass
+class FrameState:
+    """
+    Everything the shaders need to draw one frame.
+    :param radius_scale: Smoothed loudness based scale of the shape.
+    :param avg_freq: Smoothed average frequency, drives the protrusions.
+    :param rotation: Rotation of the protrusions in radians.
+    :param waves: Active background waves, dicts with a 'color' and a 'radius'.
+    """
+    radius_scale: float
+    avg_freq: float
+    rotation: float
+    waves: list
+
+
+class Simulation:
+    """
+    The part of the visualizer that evolves from frame to frame: the smoothed
+    shape parameters, the rotation and the background waves. It does not touch
+    OpenGL, so the timeline of a track can be computed without rendering it.
+    """
+    def __init__(self, config: VisualConfig):
+        """
+        :param config: VisualConfig object with settings.
+        """
+        self.config = config
+        self.frame = 0
+        self.rotation = 0.0
+        self.prev_color = np.array([0.0, 0.0, 0.0])
+        self.frame_since_last_wave = 0
+        self.active_waves = []
+        self.ema_vars = {
+            "prev_radius_scale": 0.0,
+            "prev_avg_freq": 0.0,
+        }
+
+    def step(self, curr_info: AudioInfo) -> FrameState:
+        """
+        Advance the simulation by one frame.
+        :param curr_info: AudioInfo object of the new frame.
+        :return: FrameState of the new frame.
+        """
+        radius_scale, avg_freq = _apply_emas(curr_info, self.ema_vars, self.config)
+        self.rotation = _update_rotation(self.rotation, curr_info.loudness, self.config)
+        wave_info = _process_waves(self.config, self.frame, curr_info, self.active_waves,
+                                   self.prev_color, self.frame_since_last_wave)
+        self.active_waves, self.prev_color, self.frame_since_last_wave = wave_info
+        self.frame += 1
+        waves = [{'color': wave['color'], 'radius': wave['radius']} for wave in self.active_waves]
+        return FrameState(radius_scale, avg_freq, self.rotation, waves)
+
+
+def simulate(audio_info: list, config: VisualConfig, keep_frames=None) -> dict:
+    """
+    Run the simulation over a whole track.
+    :param audio_info: List of AudioInfo objects, one per frame.
+    :param config: VisualConfig object with settings.
+    :param keep_frames: Frame indices whose state should be returned, all frames if None.
+    :return: Dictionary mapping frame index to FrameState.
+    """
+    simulation = Simulation(config)
+    keep = None if keep_frames is None else set(keep_frames)
+    states = {}
+    for frame, curr_info in enumerate(audio_info):
+        state = simulation.step(curr_info)
+        if keep is None or frame in keep:
+            states[frame] = state
+    return states
+
+
+# Private helper functions from here to the end
+
+def _apply_emas(curr_info: AudioInfo, ema_vars, config: VisualConfig) -> tuple:
+    """
+    Apply exponential moving averages to the current audio information.
+    :param curr_info: Current AudioInfo object containing audio data.
+    :param ema_vars: Dictionary containing previous EMA values.
+    :param config: VisualConfig object with settings.
+    :return: Tuple containing updated radius scale and average frequency.
+    """
+    new_radius_scale = curr_info.loudness * config.circle_loudness_scale_factor
+    radius_scale = apply_asymmetric_ema(ema_vars['prev_radius_scale'], new_radius_scale, config.alpha_up_radius, config.alpha_down_radius)
+    ema_vars['prev_radius_scale'] = radius_scale
+
+    new_avg_freq = curr_info.avg_freq
+    avg_freq = apply_asymmetric_ema(ema_vars['prev_avg_freq'], new_avg_freq, config.alpha_up_avg_freq, config.alpha_down_avg_freq)
+    ema_vars['prev_avg_freq'] = avg_freq
+
+    return radius_scale, avg_freq
+
+def _update_rotation(curr_rotation: float, loudness: float, config: VisualConfig) -> float:
+    """
+    Update the current rotation based on the loudness and configuration settings.
+    :param curr_rotation: Current rotation value.
+    :param loudness: Loudness value from the current audio information.
+    :param config: VisualConfig object with settings.
+    :return: Updated rotation value.
+    """
+    rotations_per_frame = loudness * config.rotation_speed / (60 * config.fps)
+    return curr_rotation + rotations_per_frame * 2 * np.pi
+
+def _process_waves(config: VisualConfig, frame: int, curr_info: AudioInfo,
+                  active_waves: list, prev_color: np.ndarray,
+                  frame_since_last_wave: int) -> tuple:
+
+    """ Process the wave spawning logic based on the current audio information.
+    :param config: VisualConfig object
+    :param frame: Current frame number.
+    :param curr_info: Current AudioInfo object.
+    :param active_waves: List of currently active waves.
+    :param prev_color: Previous color used for wave spawning.
+    :param frame_since_last_wave: Number of frames since the last wave was spawned.
+    :return: Updated active_waves, prev_color, and frame_since_last_wave.
+    """
+    frame_since_last_wave += 1
+    current_color = np.array(curr_info.color)
+    color_diff = np.linalg.norm(current_color - prev_color)
+
+    # Check if a new wave should be spawned
+    if (frame == 0 or color_diff > config.color_change_threshold or
+        frame_since_last_wave > config.max_frames_between_waves or len(active_waves) == 0):
+        active_waves.append({'color': curr_info.color, 'radius': 0.0})
+        prev_color = current_color.copy()
+        frame_since_last_wave = 0
+
+    # Update waves
+    for wave in active_waves.copy():
+        dynamic_speed = config.base_wave_speed + curr_info.loudness * config.wave_speed_loudness_scale_factor
+        wave['radius'] += dynamic_speed
+        if wave['radius'] > config.wave_removal_radius and len(active_waves) > 1:
+            active_waves.remove(wave)
+
+    # Limit the number of active waves
+    if len(active_waves) > config.max_waves:
+        active_waves = active_waves[-config.max_waves:]
+
+    return active_waves, prev_color, frame_since_last_wave
@@ -0,0 +1,136 @@
+import hashlib
+import json
+import os
+import numpy as np
+from dataclasses import asdict
+from pathlib import Path
+from data_generator.audio.audio_processing import short_time_fourrier_transform, get_audio_info
+from data_generator.simulation import FrameState, Simulation
+from data_generator.config import VisualConfig
+
+
+# Bump when the simulation or the cached arrays change, so old caches are rebuilt.
+_TIMELINE_VERSION = 1
+_CACHE_ROOT = Path(__file__).resolve().parent / 'cache' / 'timelines'
+
+
+class Timeline:
+    """
+    The simulation state of every frame of a track, stored as arrays so any
+    frame can be looked up without running the simulation up to it.
+    """
+    def __init__(self, radius_scale: np.ndarray, avg_freq: np.ndarray, rotation: np.ndarray,
+                 wave_colors: np.ndarray, wave_radii: np.ndarray, num_waves: np.ndarray):
+        """
+        :param radius_scale: Radius scale per frame, shape [frames].
+        :param avg_freq: Smoothed average frequency per frame, shape [frames].
+        :param rotation: Rotation per frame, shape [frames].
+        :param wave_colors: Colors of the active waves, shape [frames, max_waves, 3].
+        :param wave_radii: Radii of the active waves, shape [frames, max_waves].
+        :param num_waves: Number of active waves per frame, shape [frames].
+        """
+        self.radius_scale = radius_scale
+        self.avg_freq = avg_freq
+        self.rotation = rotation
+        self.wave_colors = wave_colors
+        self.wave_radii = wave_radii
+        self.num_waves = num_waves
+
+    def __len__(self) -> int:
+        return len(self.rotation)
+
+    def state(self, frame: int) -> FrameState:
+        """
+        :param frame: Frame index.
+        :return: FrameState of the frame, equal to the one the simulation produced.
+        """
+        waves = [
+            {'color': tuple(self.wave_colors[frame, i].tolist()), 'radius': float(self.wave_radii[frame, i])}
+            for i in range(int(self.num_waves[frame]))
+        ]
+        return FrameState(float(self.radius_scale[frame]), float(self.avg_freq[frame]),
+                          float(self.rotation[frame]), waves)
+
+    def save(self, path: Path) -> None:
+        """
+        Save the timeline as an .npz file. The file is written atomically.
+        :param path: Destination path.
+        """
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = path.with_name(path.name + '.tmp')
+        with open(temp_path, 'wb') as f:
+            np.savez(f, radius_scale=self.radius_scale, avg_freq=self.avg_freq, rotation=self.rotation,
+                     wave_colors=self.wave_colors, wave_radii=self.wave_radii, num_waves=self.num_waves)
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path: Path) -> 'Timeline':
+        """
+        :param path: Path of a file written by `save`.
+        :return: Timeline object.
+        """
+        with np.load(path) as data:
+            return cls(data['radius_scale'], data['avg_freq'], data['rotation'],
+                       data['wave_colors'], data['wave_radii'], data['num_waves'])
+
+
+def build_timeline(audio_info: list, config: VisualConfig) -> Timeline:
+    """
+    Run the simulation over a whole track and record the state of every frame.
+    :param audio_info: List of AudioInfo objects, one per frame.
+    :param config: VisualConfig object with settings.
+    :return: Timeline of the track.
+    """
+    frames = len(audio_info)
+    radius_scale = np.zeros(frames)
+    avg_freq = np.zeros(frames)
+    rotation = np.zeros(frames)
+    wave_colors = np.zeros((frames, config.max_waves, 3))
+    wave_radii = np.zeros((frames, config.max_waves))
+    num_waves = np.zeros(frames, dtype=np.int32)
+
+    simulation = Simulation(config)
+    for frame, curr_info in enumerate(audio_info):
+        state = simulation.step(curr_info)
+        radius_scale[frame] = state.radius_scale
+        avg_freq[frame] = state.avg_freq
+        rotation[frame] = state.rotation
+        num_waves[frame] = len(state.waves)
+        for i, wave in enumerate(state.waves):
+            wave_colors[frame, i] = wave['color']
+            wave_radii[frame, i] = wave['radius']
+    return Timeline(radius_scale, avg_freq, rotation, wave_colors, wave_radii, num_waves)
+
+def timeline_key(audio_file: str, config: VisualConfig) -> str:
+    """
+    Cache key of a timeline: a hash of the audio content and the config.
+    :param audio_file: Path to the audio file.
+    :param config: VisualConfig object with settings.
+    :return: Hex digest identifying the timeline.
+    """
+    digest = hashlib.sha256()
+    with open(audio_file, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    settings = asdict(config)
+    settings.pop('temp_file')  # does not affect the visuals
+    digest.update(json.dumps({'version': _TIMELINE_VERSION, 'config': settings}, sort_keys=True).encode('utf-8'))
+    return digest.hexdigest()
+
+def load_timeline(audio_file: str, config: VisualConfig, cache_dir: str = None) -> Timeline:
+    """
+    Load the timeline of a track from the cache, or analyse and simulate the
+    track once and cache the result.
+    :param audio_file: Path to the audio file.
+    :param config: VisualConfig object with settings.
+    :param cache_dir: Directory of the cached timelines, None for the default.
+    :return: Timeline of the track.
+    """
+    cache_path = Path(cache_dir or _CACHE_ROOT) / f"{timeline_key(audio_file, config)}.npz"
+    if cache_path.exists():
+        return Timeline.load(cache_path)
+
+    stft = short_time_fourrier_transform(audio_file, config)
+    timeline = build_timeline(get_audio_info(stft, config), config)
+    timeline.save(cache_path)
+    return timeline
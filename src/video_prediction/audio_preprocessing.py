@@ -1,3 +1,4 @@
+from typing import Iterator
 import librosa
 import numpy as np
 from video_prediction.constants import FREQ_BINS
@@ -16,6 +17,53 @@ def generate_spectrogram(
     """
     
     y, sr = librosa.load(audio_file, sr=None, mono=True, offset=start_time, duration=duration)
+    return spectrogram_from_samples(y, sr, freq, duration)
+
+
+def generate_spectrogram_windows(audio_file: str, freq: float, window_seconds: float) -> np.ndarray:
+    """
+    Decode an audio file once and compute the spectrogram of every
+    non-overlapping window that covers it. The last window is zero padded.
+    Each window is computed like `generate_spectrogram` with the matching start time.
+    :param audio_file: Path to the audio file.
+    :param freq: Frequency in Hz.
+    :param window_seconds: Length of each window in seconds.
+    :return: Spectrograms stacked as a 3D numpy array (windows, bands, spectrums).
+    """
+    return np.stack(list(iter_spectrogram_windows(audio_file, freq, window_seconds)), axis=0)
+
+
+def iter_spectrogram_windows(audio_file: str, freq: float, window_seconds: float) -> Iterator[np.ndarray]:
+    """
+    Lazy version of `generate_spectrogram_windows`. The file is decoded once up
+    front, the spectrogram of each window is only computed when requested.
+    :param audio_file: Path to the audio file.
+    :param freq: Frequency in Hz.
+    :param window_seconds: Length of each window in seconds.
+    :return: Iterator over the 2D spectrogram of each window.
+    """
+    y, sr = librosa.load(audio_file, sr=None, mono=True)
+    duration = len(y) / sr
+    start_time = 0.0
+    while True:
+        # Same sample rounding that librosa.load uses for offset/duration.
+        first = int(np.round(sr * start_time))
+        last = first + int(np.round(sr * window_seconds))
+        yield spectrogram_from_samples(y[first:last], sr, freq, window_seconds)
+        start_time = round(start_time + window_seconds, 6)
+        if start_time >= duration:
+            break
+
+
+def spectrogram_from_samples(y: np.ndarray, sr: float, freq: float, duration: float | None = None) -> np.ndarray:
+    """
+    Compute the normalized spectrogram of already decoded mono samples.
+    :param y: Mono audio samples.
+    :param sr: Sample rate of `y`.
+    :param freq: Frequency in Hz.
+    :param duration: Duration of the window in seconds, defaults to the length of `y`.
+    :return: Normalized spectrogram as a 2D numpy array.
+    """
     hop_length = int(sr / freq) # Spectrums per second
     bands = FREQ_BINS  # Number of frequency bands
     window_duration = duration if duration is not None else librosa.get_duration(y=y, sr=sr)
@@ -0,0 +1,271 @@
+import argparse
+import json
+import os
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import torch
+import torch.multiprocessing as mp
+
+from video_prediction.cpu_perf import CpuPerfConfig, apply_thread_settings
+from video_prediction.dataset import SAMPLE_FEATURES, prediction_sample_rate
+from video_prediction.export import is_torchscript_artifact, load_predictor
+from video_prediction.inference_pipeline import predict_video
+from video_prediction.interpolation import INTERPOLATION_MODES
+from video_prediction.model import MODEL_VARIANTS
+from video_prediction.constants import (
+    DEFAULT_INTERPOLATION,
+    DEFAULT_MODEL_PATH,
+    DEFAULT_MODEL_VARIANT,
+    DEFAULT_PIPELINE_QUEUE_SIZE,
+    DEFAULT_PREDICT_BATCH_SIZE,
+    VIDEO_RESIZE,
+    VIDEO_TARGET_FPS,
+)
+
+AUDIO_EXTENSIONS = (".mp3", ".wav", ".flac", ".ogg", ".m4a")
+
+
+@dataclass
+class FileResult:
+    """Outcome of one track of a batch prediction."""
+    input_path: str
+    output_path: str
+    video_seconds: float = 0.0
+    wall_seconds: float = 0.0
+    error: Optional[str] = None
+
+    def real_time_factor(self) -> float:
+        return self.video_seconds / self.wall_seconds if self.wall_seconds > 0 else 0.0
+
+
+def collect_inputs(inputs: List[str], input_list: Optional[str] = None) -> List[Path]:
+    """
+    Expands the inputs of a batch run: directories contribute every audio file
+    directly inside them, files are taken as they are, and `input_list` is a
+    text file with one path per line.
+    """
+    paths: List[Path] = []
+    for entry in inputs:
+        path = Path(entry)
+        if path.is_dir():
+            paths.extend(sorted(child for child in path.iterdir() if child.suffix.lower() in AUDIO_EXTENSIONS))
+        else:
+            paths.append(path)
+    if input_list is not None:
+        with open(input_list, "r", encoding="utf-8") as handle:
+            paths.extend(Path(line.strip()) for line in handle if line.strip())
+    return paths
+
+
+def output_paths(inputs: List[Path], output_dir: Path) -> List[Path]:
+    """
+    `<output_dir>/<stem>.mp4` for every input. Inputs with the same stem are
+    named after their path relative to the common directory of all inputs,
+    e.g. `a_x_song.mp4`, and those still equal after that also keep their
+    extension, e.g. `a_x_song_wav.mp4`. Raises ValueError if names still
+    clash, e.g. for an input given twice.
+    """
+    resolved = [path.resolve() for path in inputs]
+    root = Path(os.path.commonpath([str(path.parent) for path in resolved])) if resolved else Path()
+    names = [path.stem for path in inputs]
+    names = [
+        "_".join(path.relative_to(root).with_suffix("").parts) if names.count(name) > 1 else name
+        for name, path in zip(names, resolved)
+    ]
+    names = [
+        f"{name}_{path.suffix.lstrip('.').lower()}" if names.count(name) > 1 and path.suffix else name
+        for name, path in zip(names, resolved)
+    ]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError(f"Inputs would overwrite each other's output: {', '.join(duplicates)}")
+    return [output_dir / f"{name}.mp4" for name in names]
+
+
+def plan_workers(files: int, workers: int = 0, threads_per_worker: int = 0) -> Tuple[int, int, int]:
+    """
+    Splits the CPU cores between worker processes so that together they use
+    every core once. Returns the number of workers, and the torch threads and
+    video encoder threads of each. The thread budget of a worker (by default
+    two threads) is shared by its model stage and the ffmpeg encoder, which
+    runs alongside it; the analysis and resize stages are light next to them.
+    """
+    cores = os.cpu_count() or 1
+    if workers <= 0:
+        workers = max(1, cores // max(1, threads_per_worker or 2))
+    workers = max(1, min(workers, files))
+    if threads_per_worker <= 0:
+        threads_per_worker = max(1, cores // workers)
+    encoder_threads = max(1, threads_per_worker // 2)
+    return workers, max(1, threads_per_worker - encoder_threads), encoder_threads
+
+
+# State of a worker process, set once by _init_worker.
+_worker: Dict[str, Any] = {}
+
+
+def _init_worker(model: Any, variant: str, threads: int, settings: Dict[str, Any]) -> None:
+    apply_thread_settings(CpuPerfConfig(intra_op_threads=threads, inter_op_threads=1))
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    if isinstance(model, str):
+        # TorchScript artifacts cannot be sent to other processes, every worker maps the file itself.
+        model = load_predictor(model, device, variant)
+    _worker.update(model=model, device=device, settings=settings)
+
+
+def _predict_file(paths: Tuple[str, str]) -> FileResult:
+    input_path, output_path = paths
+    result = FileResult(input_path, output_path)
+    settings = _worker["settings"]
+    start = time.perf_counter()
+    try:
+        report = predict_video(_worker["model"], input_path, output_path, device=_worker["device"], **settings)
+        result.video_seconds = report.frames / report.fps if report.fps > 0 else 0.0
+    except Exception as error:
+        # One broken track should not end the whole batch.
+        result.error = f"{type(error).__name__}: {error}"
+    result.wall_seconds = time.perf_counter() - start
+    return result
+
+
+def predict_batch(
+    inputs: List[Path],
+    output_dir: Path,
+    model_path: str = DEFAULT_MODEL_PATH,
+    variant: str = DEFAULT_MODEL_VARIANT,
+    workers: int = 0,
+    threads_per_worker: int = 0,
+    fps: float = VIDEO_TARGET_FPS,
+    width: int = VIDEO_RESIZE[1],
+    height: int = VIDEO_RESIZE[0],
+    batch_size: int = DEFAULT_PREDICT_BATCH_SIZE,
+    queue_size: int = DEFAULT_PIPELINE_QUEUE_SIZE,
+    skip_existing: bool = False,
+    interpolation: str = DEFAULT_INTERPOLATION,
+    features: str = "spectrogram",
+) -> Iterator[FileResult]:
+    """
+    Predicts the videos of many tracks with a pool of worker processes that
+    each run whole tracks through `predict_video`. The model is loaded once
+    and its weights are moved to shared memory, so the workers use the same
+    copy instead of each loading the checkpoint. Results are yielded as the
+    tracks finish; the worker plan is printed once the tracks left to do are
+    known. `features` names the audio features the model was
+    trained on, which sets the rate the tracks are decoded at.
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    jobs = [
+        (str(input_path), str(output_path))
+        for input_path, output_path in zip(inputs, output_paths(inputs, output_dir))
+        if not (skip_existing and output_path.exists())
+    ]
+    if not jobs:
+        return
+    workers, threads, encoder_threads = plan_workers(len(jobs), workers, threads_per_worker)
+    print(f"Predicting {len(jobs)} files with {workers} workers x {threads} torch threads "
+          f"+ {encoder_threads} encoder threads")
+
+    if is_torchscript_artifact(model_path):
+        model: Any = model_path
+    else:
+        device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        model = load_predictor(model_path, device, variant)
+        if device.type == "cpu":
+            model.share_memory()
+    settings = {"fps": fps, "width": width, "height": height, "batch_size": batch_size, "queue_size": queue_size,
+                "interpolation": interpolation, "sample_rate": prediction_sample_rate(features),
+                "encoder_threads": encoder_threads}
+
+    context = mp.get_context("spawn")
+    with context.Pool(workers, initializer=_init_worker, initargs=(model, variant, threads, settings)) as pool:
+        yield from pool.imap_unordered(_predict_file, jobs)
+
+
+def format_report(results: List[FileResult], wall_seconds: float) -> str:
+    """Per-file timings followed by the totals of the run."""
+    width = max([len(Path(result.input_path).name) for result in results] + [4])
+    lines = [f"{'file':<{width}}  {'video s':>8}  {'wall s':>8}  {'RTF':>7}  status"]
+    for result in sorted(results, key=lambda result: result.input_path):
+        status = "ok" if result.error is None else f"FAILED {result.error}"
+        lines.append(
+            f"{Path(result.input_path).name:<{width}}  {result.video_seconds:8.1f}  {result.wall_seconds:8.2f}  "
+            f"{result.real_time_factor():6.2f}x  {status}"
+        )
+    video_seconds = sum(result.video_seconds for result in results)
+    failed = sum(result.error is not None for result in results)
+    lines.append(
+        f"{len(results) - failed}/{len(results)} files in {wall_seconds:.2f}s, {video_seconds:.1f}s of video, "
+        f"overall real-time factor {video_seconds / wall_seconds if wall_seconds > 0 else 0.0:.2f}x"
+    )
+    return "\n".join(lines)
+
+
+def main() -> None:
+    """
+    Predicts videos for a directory or list of audio files with a pool of
+    worker processes sharing one copy of the model.
+    """
+    parser = argparse.ArgumentParser(description="Predict videos for many audio files")
+    parser.add_argument("inputs", nargs="*", help="Audio files and/or directories of audio files")
+    parser.add_argument("--input-list", type=str, default=None, help="Text file with one audio path per line")
+    parser.add_argument("--output-dir", "-o", type=str, required=True)
+    parser.add_argument("--model-path", "-m", type=str, default=DEFAULT_MODEL_PATH)
+    parser.add_argument("--model-variant", choices=sorted(MODEL_VARIANTS), default=DEFAULT_MODEL_VARIANT,
+                        help="Architecture of a plain state dict checkpoint")
+    parser.add_argument("--workers", "-w", type=int, default=0,
+                        help="Number of worker processes (default: CPU cores / threads per worker)")
+    parser.add_argument("--threads-per-worker", "-t", type=int, default=0,
+                        help="CPU threads per worker, shared by torch and the video encoder (default: CPU cores / workers)")
+    parser.add_argument("--fps", "-f", type=int, default=VIDEO_TARGET_FPS)
+    parser.add_argument("--interpolation", choices=INTERPOLATION_MODES, default=DEFAULT_INTERPOLATION,
+                        help="How frames are made when --fps differs from the frame rate of the model")
+    parser.add_argument("--video-width", "-W", type=int, default=VIDEO_RESIZE[1])
+    parser.add_argument("--video-height", "-H", type=int, default=VIDEO_RESIZE[0])
+    parser.add_argument("--batch-size", "-b", type=int, default=DEFAULT_PREDICT_BATCH_SIZE)
+    parser.add_argument("--queue-size", type=int, default=DEFAULT_PIPELINE_QUEUE_SIZE)
+    parser.add_argument("--features", choices=SAMPLE_FEATURES, default="spectrogram",
+                        help="Audio features the model was trained on (train --features)")
+    parser.add_argument("--skip-existing", action="store_true", help="Skip tracks whose output video exists")
+    parser.add_argument("--report", type=str, default=None, help="Also write the per-file timings as JSON")
+    args = parser.parse_args()
+
+    inputs = collect_inputs(args.inputs, args.input_list)
+    if not inputs:
+        parser.error("no input audio files given")
+
+    start = time.perf_counter()
+    results = []
+    for result in predict_batch(
+        inputs,
+        Path(args.output_dir),
+        model_path=args.model_path,
+        variant=args.model_variant,
+        workers=args.workers,
+        threads_per_worker=args.threads_per_worker,
+        fps=args.fps,
+        width=args.video_width,
+        height=args.video_height,
+        batch_size=args.batch_size,
+        queue_size=args.queue_size,
+        skip_existing=args.skip_existing,
+        interpolation=args.interpolation,
+        features=args.features,
+    ):
+        results.append(result)
+        status = "done" if result.error is None else "failed"
+        print(f"[{len(results)}] {status} {result.input_path} in {result.wall_seconds:.2f}s")
+    wall_seconds = time.perf_counter() - start
+
+    if results:
+        print(format_report(results, wall_seconds))
+    if args.report:
+        report_path = Path(args.report)
+        report_path.parent.mkdir(parents=True, exist_ok=True)
+        with report_path.open("w", encoding="utf-8") as handle:
+            json.dump({"wall_seconds": wall_seconds, "files": [asdict(result) for result in results]}, handle, indent=2)
+
+
+if __name__ == "__main__":
+    main()
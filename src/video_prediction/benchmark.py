@@ -0,0 +1,244 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+import torch
+
+from video_prediction.model import MODEL_VARIANTS, build_model
+from video_prediction.constants import (
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_LR,
+    DEFAULT_MODEL_VARIANT,
+    DEFAULT_NUM_WORKERS,
+    VIDEO_RESIZE,
+    VIDEO_TARGET_FPS,
+    WINDOW_SECONDS,
+)
+
+# Bump when the measurements or their meaning change, so results of different
+# harness versions are not compared by accident.
+_RESULTS_VERSION = 1
+
+
+def _run_ffmpeg(args: List[str]) -> None:
+    result = subprocess.run(["ffmpeg", "-y", "-loglevel", "error", *args], capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed: {result.stderr.strip()}")
+
+
+def synthesize_inputs(work_dir: Path, clips: int, seconds: float) -> Tuple[Path, Path]:
+    """
+    Generates `clips` paired inputs with ffmpeg test sources: a sine tone of a
+    different pitch per clip as MP3, and a moving test pattern with the same
+    tone muxed in as MP4, like the output of the generator. Returns the audio
+    and video directories.
+    """
+    audio_dir = work_dir / "input"
+    video_dir = work_dir / "output"
+    audio_dir.mkdir(parents=True, exist_ok=True)
+    video_dir.mkdir(parents=True, exist_ok=True)
+    for clip in range(clips):
+        tone = f"sine=frequency={220 * (clip + 1)}:beep_factor=4:duration={seconds}:sample_rate=44100"
+        _run_ffmpeg(["-f", "lavfi", "-i", tone, "-c:a", "libmp3lame", str(audio_dir / f"clip{clip}.mp3")])
+        _run_ffmpeg([
+            "-f", "lavfi", "-i", f"testsrc2=size=320x240:rate=30:duration={seconds}",
+            "-f", "lavfi", "-i", tone,
+            "-c:v", "libx264", "-preset", "ultrafast", "-pix_fmt", "yuv420p",
+            "-c:a", "aac", "-shortest", str(video_dir / f"clip{clip}.mp4"),
+        ])
+    return audio_dir, video_dir
+
+
+def _timed(fn: Any, *args: Any, **kwargs: Any) -> Tuple[Any, float]:
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def bench_preprocessing(audio_dir: Path, video_dir: Path, data_dir: Path) -> Tuple[Path, Dict[str, float]]:
+    """Full (non-incremental) dataset build, then an incremental rebuild with nothing to do."""
+    from video_prediction.preprocess_dataset import build_dataset
+
+    manifest_path, seconds = _timed(build_dataset, str(audio_dir), str(video_dir), str(data_dir), force=True)
+    with manifest_path.open("r", encoding="utf-8") as manifest:
+        windows = sum(1 for line in manifest if line.strip())
+    _, noop_seconds = _timed(build_dataset, str(audio_dir), str(video_dir), str(data_dir))
+    return manifest_path, {
+        "windows": windows,
+        "seconds": seconds,
+        "windows_per_second": windows / seconds if seconds > 0 else 0.0,
+        "incremental_noop_seconds": noop_seconds,
+    }
+
+
+def bench_dataset(manifest_path: Path) -> Dict[str, float]:
+    """Construction time of `CachedClipDataset` with and without the binary index."""
+    from video_prediction.dataset import CachedClipDataset
+    from video_prediction.manifest_index import index_path_for
+
+    dataset, indexed_seconds = _timed(CachedClipDataset, str(manifest_path))
+    index_path = index_path_for(str(manifest_path))
+    backup_path = index_path.with_name(index_path.name + ".bak")
+    os.replace(index_path, backup_path)
+    try:
+        _, unindexed_seconds = _timed(CachedClipDataset, str(manifest_path))
+    finally:
+        os.replace(backup_path, index_path)
+    return {"samples": len(dataset), "indexed_seconds": indexed_seconds, "unindexed_seconds": unindexed_seconds}
+
+
+def bench_loader(manifest_path: Path, batch_size: int, num_workers: int, epochs: int) -> Dict[str, float]:
+    """Samples/sec of the training input pipeline alone, without any model work."""
+    from video_prediction.dataset import CachedClipDataset
+    from video_prediction.input_pipeline import build_input_pipeline
+
+    dataset = CachedClipDataset(str(manifest_path))
+    loader = build_input_pipeline(dataset, batch_size, torch.device("cpu"), num_workers)
+    samples = 0
+    start = time.perf_counter()
+    for epoch in range(epochs):
+        loader.set_epoch(epoch)
+        for batch in loader:
+            samples += len(batch["audio"])
+    seconds = time.perf_counter() - start
+    return {"samples": samples, "seconds": seconds, "samples_per_second": samples / seconds if seconds > 0 else 0.0}
+
+
+def bench_training(manifest_path: Path, work_dir: Path, variant: str, batch_size: int,
+                   num_workers: int, epochs: int) -> Tuple[torch.nn.Module, Dict[str, float]]:
+    """Per-step timings of `train.train`, taken from its telemetry log. The first step is warm-up."""
+    from video_prediction.dataset import CachedClipDataset
+    from video_prediction.telemetry import STAGES, TrainingTelemetry
+    from video_prediction.train import train
+
+    log_path = work_dir / "train_steps.jsonl"
+    log_path.unlink(missing_ok=True)
+    model = build_model(variant)
+    dataset = CachedClipDataset(str(manifest_path))
+    telemetry = TrainingTelemetry(log_path=str(log_path), summary_every=10 ** 9)
+    train(model, dataset, epochs, batch_size, DEFAULT_LR, num_workers, telemetry=telemetry)
+
+    with log_path.open("r", encoding="utf-8") as log:
+        steps = [json.loads(line) for line in log if line.strip()]
+    measured = steps[1:] or steps
+    results = {
+        "steps": len(steps),
+        "step_seconds_median": statistics.median(step["step_s"] for step in measured),
+        "samples_per_second": sum(step["samples"] for step in measured) / sum(step["step_s"] for step in measured),
+        "peak_rss_mb": max(step["peak_rss_mb"] for step in steps),
+    }
+    for stage in STAGES:
+        results[f"{stage}_seconds_median"] = statistics.median(step[f"{stage}_s"] for step in measured)
+    return model, results
+
+
+def bench_prediction(model: torch.nn.Module, audio_path: Path, output_path: Path) -> Dict[str, float]:
+    """Real-time factor of the pipelined prediction of one clip at the training resolution."""
+    from video_prediction.inference_pipeline import predict_video
+
+    model = model.cpu().eval()
+    report = predict_video(model, str(audio_path), str(output_path), VIDEO_TARGET_FPS,
+                           VIDEO_RESIZE[1], VIDEO_RESIZE[0], torch.device("cpu"))
+    return {
+        "frames": report.frames,
+        "seconds": report.total_seconds,
+        "real_time_factor": report.real_time_factor(),
+        **{f"{name}_seconds": seconds for name, seconds in report.stage_seconds.items()},
+    }
+
+
+def _git_revision() -> str:
+    try:
+        result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=Path(__file__).resolve().parent)
+    except OSError:
+        return "unknown"
+    return result.stdout.strip() if result.returncode == 0 else "unknown"
+
+
+def run_benchmarks(
+    work_dir: Path,
+    clips: int = 2,
+    seconds: float = 8 * WINDOW_SECONDS,
+    variant: str = DEFAULT_MODEL_VARIANT,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    num_workers: int = DEFAULT_NUM_WORKERS,
+    epochs: int = 1,
+) -> Dict[str, Any]:
+    """
+    Runs the whole video_prediction pipeline on synthetic inputs in `work_dir`
+    and returns every measurement together with a description of the machine.
+    """
+    torch.manual_seed(0)
+    audio_dir, video_dir = synthesize_inputs(work_dir, clips, seconds)
+    manifest_path, preprocessing = bench_preprocessing(audio_dir, video_dir, work_dir / "data")
+    dataset = bench_dataset(manifest_path)
+    loader = bench_loader(manifest_path, batch_size, num_workers, epochs)
+    model, training = bench_training(manifest_path, work_dir, variant, batch_size, num_workers, epochs)
+    prediction = bench_prediction(model, audio_dir / "clip0.mp3", work_dir / "prediction.mp4")
+    return {
+        "version": _RESULTS_VERSION,
+        "revision": _git_revision(),
+        "environment": {
+            "python": platform.python_version(),
+            "torch": torch.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "torch_threads": torch.get_num_threads(),
+            "cuda": torch.cuda.is_available(),
+        },
+        "settings": {
+            "clips": clips,
+            "seconds": seconds,
+            "model_variant": variant,
+            "batch_size": batch_size,
+            "num_workers": num_workers,
+            "epochs": epochs,
+        },
+        "preprocessing": preprocessing,
+        "dataset": dataset,
+        "loader": loader,
+        "training": training,
+        "prediction": prediction,
+    }
+
+
+def main() -> None:
+    """
+    Benchmarks preprocessing, dataset loading, training and prediction on
+    synthetic clips and writes the results as JSON.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the video prediction pipeline")
+    parser.add_argument("--output", "-o", type=str, default="benchmark_results.json")
+    parser.add_argument("--clips", "-n", type=int, default=2)
+    parser.add_argument("--seconds", "-s", type=float, default=8 * WINDOW_SECONDS, help="Length of every clip")
+    parser.add_argument("--model-variant", choices=sorted(MODEL_VARIANTS), default=DEFAULT_MODEL_VARIANT)
+    parser.add_argument("--batch-size", "-b", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--num-workers", "-w", type=int, default=DEFAULT_NUM_WORKERS)
+    parser.add_argument("--epochs", "-e", type=int, default=1)
+    parser.add_argument("--work-dir", type=str, default=None,
+                        help="Keep the synthetic inputs and dataset here (default: temporary directory)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        work_dir = Path(args.work_dir) if args.work_dir else Path(temp_dir)
+        work_dir.mkdir(parents=True, exist_ok=True)
+        results = run_benchmarks(work_dir, args.clips, args.seconds, args.model_variant,
+                                 args.batch_size, args.num_workers, args.epochs)
+
+    output_path = Path(args.output)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with output_path.open("w", encoding="utf-8") as handle:
+        json.dump(results, handle, indent=2)
+    print(json.dumps(results, indent=2))
+    print(f"Saved results to {output_path}")
+
+
+if __name__ == "__main__":
+    main()
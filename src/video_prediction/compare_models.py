@@ -0,0 +1,119 @@
+import argparse
+import math
+import time
+from typing import Any, Dict, List, Optional
+import torch
+from torch.utils.data import Dataset, Subset
+from torch.utils.flop_counter import FlopCounterMode
+
+from video_prediction.model import MODEL_VARIANTS, VideoPredictor, build_model
+from video_prediction.constants import (
+    AUDIO_FEATURES_PER_SECOND,
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_LR,
+    DEFAULT_PREDICT_BATCH_SIZE,
+    FREQ_BINS,
+    WINDOW_SECONDS,
+)
+
+
+def _windows(batch_size: int) -> torch.Tensor:
+    return torch.rand(batch_size, 1, FREQ_BINS, int(WINDOW_SECONDS * AUDIO_FEATURES_PER_SECOND))
+
+
+def count_flops(model: VideoPredictor) -> int:
+    """Floating point operations of one forward pass over a single window."""
+    with FlopCounterMode(display=False) as counter, torch.inference_mode():
+        model(_windows(1))
+    return counter.get_total_flops()
+
+
+def cpu_latency_per_window(model: VideoPredictor, batch_size: int, repeats: int = 5) -> float:
+    """Seconds per window of a CPU forward pass over batches of `batch_size` windows."""
+    windows = _windows(batch_size)
+    with torch.inference_mode():
+        model(windows)  # Warm-up.
+        start = time.perf_counter()
+        for _ in range(repeats):
+            model(windows)
+    return (time.perf_counter() - start) / (repeats * batch_size)
+
+
+def validation_loss(model: VideoPredictor, dataset: Dataset, batch_size: int) -> float:
+    """Mean squared error of the model over `dataset`."""
+    loader = torch.utils.data.DataLoader(dataset, batch_size=batch_size)
+    total = 0.0
+    count = 0
+    with torch.inference_mode():
+        for batch in loader:
+            output = model(batch["audio"])
+            total += torch.nn.functional.mse_loss(output, batch["video"], reduction="sum").item()
+            count += batch["video"].numel()
+    return total / count if count else math.nan
+
+
+def compare_variants(
+    variants: List[str],
+    batch_size: int = DEFAULT_PREDICT_BATCH_SIZE,
+    manifest_path: Optional[str] = None,
+    epochs: int = 1,
+    validation_fraction: float = 0.2,
+) -> List[Dict[str, Any]]:
+    """
+    Reports parameters, FLOPs per window and CPU latency per window of every
+    model variant. With a dataset manifest, every variant is also trained for
+    `epochs` epochs on the first part of the dataset and evaluated on the rest.
+    """
+    train_set = validation_set = None
+    if manifest_path is not None:
+        from video_prediction.dataset import CachedClipDataset
+
+        dataset = CachedClipDataset(manifest_path)
+        split = int(len(dataset) * (1.0 - validation_fraction))
+        if split == 0 or split == len(dataset):
+            raise RuntimeError(f"{manifest_path} has too few samples ({len(dataset)}) for a validation split")
+        train_set = Subset(dataset, range(split))
+        validation_set = Subset(dataset, range(split, len(dataset)))
+
+    rows = []
+    for name in variants:
+        model = build_model(name).cpu().eval()
+        row: Dict[str, Any] = {
+            "variant": name,
+            "params": sum(parameter.numel() for parameter in model.parameters()),
+            "flops": count_flops(model),
+            "latency_ms": 1000.0 * cpu_latency_per_window(model, batch_size),
+            "val_loss": math.nan,
+        }
+        if train_set is not None:
+            from video_prediction.train import train
+
+            torch.manual_seed(0)
+            model = build_model(name)
+            train(model, train_set, epochs, DEFAULT_BATCH_SIZE, DEFAULT_LR, num_workers=0)
+            row["val_loss"] = validation_loss(model.cpu().eval(), validation_set, batch_size)
+        rows.append(row)
+    return rows
+
+
+def main() -> None:
+    """Compares the registered model variants for CPU deployment."""
+    parser = argparse.ArgumentParser(description="Compare model variants")
+    parser.add_argument("--variants", nargs="+", choices=sorted(MODEL_VARIANTS), default=list(MODEL_VARIANTS))
+    parser.add_argument("--batch-size", "-b", type=int, default=DEFAULT_PREDICT_BATCH_SIZE)
+    parser.add_argument("--threads", "-t", type=int, default=1)
+    parser.add_argument("--manifest-path", type=str, default=None,
+                        help="Dataset used to train and validate every variant (default: skip validation loss)")
+    parser.add_argument("--epochs", "-e", type=int, default=1)
+    args = parser.parse_args()
+
+    torch.set_num_threads(args.threads)
+    rows = compare_variants(args.variants, args.batch_size, args.manifest_path, args.epochs)
+    print(f"{'Variant':<10}{'Params':>12}{'GFLOPs':>10}{'Latency/window':>18}{'Val loss':>12}")
+    for row in rows:
+        print(f"{row['variant']:<10}{row['params']:>12,}{row['flops'] / 1e9:>10.2f}"
+              f"{row['latency_ms']:>15.2f} ms{row['val_loss']:>12.5f}")
+
+
+if __name__ == "__main__":
+    main()
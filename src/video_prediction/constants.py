@@ -7,4 +7,16 @@ FREQ_BINS = 128
 DEFAULT_LR = 1e-4
 DEFAULT_EPOCHS = 10
 DEFAULT_BATCH_SIZE = 4
-DEFAULT_MODEL_PATH = "video_prediction/models/model.pth"
\ No newline at end of file
+DEFAULT_MODEL_PATH = "video_prediction/models/model.pth"
+DEFAULT_MODEL_VARIANT = "rnn"
+DEFAULT_NUM_WORKERS = 2
+DEFAULT_PREFETCH_BATCHES = 4
+DEFAULT_PREDICT_BATCH_SIZE = 8
+DEFAULT_PIPELINE_QUEUE_SIZE = 2
+DEFAULT_MASTER_PORT = 29500
+DEFAULT_SAMPLE_CACHE_MB = 0
+DEFAULT_SERVER_PORT = 8765
+DEFAULT_SERVER_MAX_DELAY_MS = 10.0
+DEFAULT_INTERPOLATION = "linear"
+AUDIO_SAMPLE_RATE = 44100
+DEFAULT_TOP_DB = 80.0
@@ -0,0 +1,278 @@
+import argparse
+import contextlib
+import itertools
+import math
+import multiprocessing
+import os
+import time
+from dataclasses import asdict, dataclass, replace
+from typing import Any, ContextManager, Dict, Iterator, List, Tuple
+import torch
+import torch.nn as nn
+
+from video_prediction.model import VideoPredictor
+from video_prediction.constants import (
+    AUDIO_FEATURES_PER_SECOND,
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_LR,
+    FREQ_BINS,
+    VIDEO_RESIZE,
+    VIDEO_TARGET_FPS,
+    WINDOW_SECONDS,
+)
+
+
+@dataclass(frozen=True)
+class CpuPerfConfig:
+    """
+    Performance settings for training on CPU. Thread counts of 0 keep the
+    torch defaults. The memory settings bound the activation memory of a
+    step: every batch is run as micro-batches of `micro_batch_size` samples
+    whose gradients are accumulated, frames are decoded `decode_chunk_frames`
+    at a time and `checkpoint_decoder` recomputes the decoder activations
+    during backward instead of keeping them. 0 disables a setting.
+    """
+    bf16: bool = False
+    compile: bool = False
+    channels_last: bool = False
+    intra_op_threads: int = 0
+    inter_op_threads: int = 0
+    micro_batch_size: int = 0
+    decode_chunk_frames: int = 0
+    checkpoint_decoder: bool = False
+
+    def describe(self) -> str:
+        parts = [
+            "bf16" if self.bf16 else "fp32",
+            "compiled" if self.compile else "eager",
+        ]
+        if self.channels_last:
+            parts.append("channels_last")
+        if self.intra_op_threads:
+            parts.append(f"{self.intra_op_threads} threads")
+        if self.inter_op_threads:
+            parts.append(f"{self.inter_op_threads} inter-op")
+        if self.micro_batch_size:
+            parts.append(f"micro-batch {self.micro_batch_size}")
+        if self.decode_chunk_frames:
+            parts.append(f"decode {self.decode_chunk_frames} frames")
+        if self.checkpoint_decoder:
+            parts.append("checkpointed decoder")
+        return ", ".join(parts)
+
+
+def apply_thread_settings(config: CpuPerfConfig) -> None:
+    """
+    Applies the thread settings of `config` to this process. The inter-op pool
+    can only be sized before it is first used, later calls keep the old size.
+    """
+    if config.intra_op_threads > 0:
+        torch.set_num_threads(config.intra_op_threads)
+    if config.inter_op_threads > 0:
+        try:
+            torch.set_num_interop_threads(config.inter_op_threads)
+        except RuntimeError:
+            print("Inter-op threads were already in use, keeping "
+                  f"{torch.get_num_interop_threads()} instead of {config.inter_op_threads}.")
+
+
+def _to_channels_last(_: nn.Module, inputs: Tuple[torch.Tensor, ...]) -> Tuple[torch.Tensor, ...]:
+    return (inputs[0].contiguous(memory_format=torch.channels_last),)
+
+
+def prepare_model(model: VideoPredictor, config: CpuPerfConfig) -> VideoPredictor:
+    """
+    Switches the decoder convolutions to channels_last when requested. A hook
+    converts the decoder input, so parameter names and checkpoints are unchanged.
+    Also applies the decoder memory settings.
+    """
+    model.set_memory_options(config.decode_chunk_frames, config.checkpoint_decoder)
+    if config.channels_last:
+        model.decoder.to(memory_format=torch.channels_last)
+        model.decoder.register_forward_pre_hook(_to_channels_last)
+    return model
+
+
+def compile_model(model: nn.Module, config: CpuPerfConfig) -> nn.Module:
+    """Returns `torch.compile(model)` when compilation is enabled, the model itself otherwise."""
+    return torch.compile(model) if config.compile else model
+
+
+def autocast(device: torch.device, config: CpuPerfConfig) -> ContextManager:
+    """bf16 autocast for CPU training, a no-op everywhere else."""
+    if device.type == "cpu" and config.bf16:
+        return torch.autocast(device_type="cpu", dtype=torch.bfloat16)
+    return contextlib.nullcontext()
+
+
+def micro_batches(batch_size: int, config: CpuPerfConfig) -> Iterator[Tuple[slice, float]]:
+    """
+    Splits a batch of `batch_size` samples into the micro-batches of `config`,
+    as (slice, weight) where the weight scales the mean loss of the micro-batch
+    so the accumulated gradients equal those of the whole batch.
+    """
+    size = config.micro_batch_size if config.micro_batch_size > 0 else batch_size
+    for first in range(0, batch_size, size):
+        last = min(first + size, batch_size)
+        yield slice(first, last), (last - first) / batch_size
+
+
+def synthetic_batch(batch_size: int) -> Tuple[torch.Tensor, torch.Tensor]:
+    """Random audio/video tensors with the shapes of a real training batch."""
+    audio = torch.rand(batch_size, 1, FREQ_BINS, int(WINDOW_SECONDS * AUDIO_FEATURES_PER_SECOND))
+    video = torch.rand(batch_size, int(WINDOW_SECONDS * VIDEO_TARGET_FPS), 3, VIDEO_RESIZE[0], VIDEO_RESIZE[1])
+    return audio, video
+
+
+def peak_rss_mb() -> float:
+    """Peak resident memory of this process in MiB, NaN where it cannot be measured."""
+    try:
+        import resource
+    except ImportError:
+        return math.nan
+    # ru_maxrss is in KiB on Linux and in bytes on macOS.
+    bytes_per_unit = 1 if os.uname().sysname == "Darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * bytes_per_unit / (1024 * 1024)
+
+
+def _measure(config: CpuPerfConfig, batch_size: int, steps: int, results: Any) -> None:
+    """Runs in a fresh process so thread settings and peak memory are per variant."""
+    try:
+        apply_thread_settings(config)
+        device = torch.device("cpu")
+        model = prepare_model(VideoPredictor(), config)
+        model.train()
+        step_model = compile_model(model, config)
+        optimizer = torch.optim.Adam(model.parameters(), lr=DEFAULT_LR)
+        loss_func = torch.nn.MSELoss()
+        audio, video = synthetic_batch(batch_size)
+
+        def step() -> None:
+            optimizer.zero_grad(set_to_none=True)
+            for part, weight in micro_batches(batch_size, config):
+                with autocast(device, config):
+                    loss = loss_func(step_model(audio[part]), video[part]) * weight
+                loss.backward()
+            optimizer.step()
+
+        step()  # Warm-up, includes compilation.
+        start = time.perf_counter()
+        for _ in range(steps):
+            step()
+        elapsed = time.perf_counter() - start
+        results.put((batch_size * steps / elapsed, peak_rss_mb(), None))
+    except Exception as error:
+        results.put((math.nan, peak_rss_mb(), f"{type(error).__name__}: {error}"))
+
+
+def benchmark_config(config: CpuPerfConfig, batch_size: int, steps: int) -> Dict[str, Any]:
+    """
+    Measures training samples/sec and peak memory of one configuration in a
+    separate process.
+    """
+    context = multiprocessing.get_context("spawn")
+    results = context.SimpleQueue()
+    process = context.Process(target=_measure, args=(config, batch_size, steps, results))
+    process.start()
+    process.join()
+    if results.empty():
+        return {"config": config, "samples_per_second": math.nan, "peak_rss_mb": math.nan,
+                "error": f"benchmark process exited with code {process.exitcode}"}
+    samples_per_second, peak_memory, error = results.get()
+    return {"config": config, "samples_per_second": samples_per_second, "peak_rss_mb": peak_memory, "error": error}
+
+
+def default_candidates(cores: int = 0) -> List[CpuPerfConfig]:
+    """
+    All combinations of precision, compilation, memory format and thread count
+    worth trying on `cores` cores (default: all cores of this host).
+    """
+    cores = cores or os.cpu_count() or 1
+    thread_counts = sorted({cores, max(1, cores // 2)}, reverse=True)
+    return [
+        CpuPerfConfig(bf16=bf16, compile=compiled, channels_last=channels_last,
+                      intra_op_threads=threads, inter_op_threads=1)
+        for bf16, compiled, channels_last, threads in itertools.product(
+            (False, True), (False, True), (False, True), thread_counts
+        )
+    ]
+
+
+def memory_candidates(batch_size: int, base: CpuPerfConfig = CpuPerfConfig()) -> List[CpuPerfConfig]:
+    """
+    `base` with increasingly memory-saving settings for a batch of
+    `batch_size`: decoder checkpointing per window and per quarter window,
+    and micro-batches down to a single sample with and without checkpointing.
+    """
+    frames = int(WINDOW_SECONDS * VIDEO_TARGET_FPS)
+    candidates = [
+        base,
+        replace(base, checkpoint_decoder=True),
+        replace(base, decode_chunk_frames=frames // 4, checkpoint_decoder=True),
+    ]
+    micro_batch_size = batch_size // 2
+    while micro_batch_size >= 1:
+        candidates.append(replace(base, micro_batch_size=micro_batch_size))
+        candidates.append(replace(base, micro_batch_size=micro_batch_size, checkpoint_decoder=True))
+        micro_batch_size //= 2
+    return candidates
+
+
+def autotune(
+    candidates: List[CpuPerfConfig],
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    steps: int = 5,
+    verbose: bool = True,
+) -> Tuple[CpuPerfConfig, List[Dict[str, Any]]]:
+    """
+    Benchmarks every candidate configuration on synthetic batches and returns
+    the fastest one together with all measurements.
+    """
+    results = []
+    for config in candidates:
+        result = benchmark_config(config, batch_size, steps)
+        results.append(result)
+        if verbose:
+            if result["error"]:
+                print(f"{config.describe():<64} failed: {result['error']}")
+            else:
+                print(f"{config.describe():<64}{result['samples_per_second']:>10.2f} samples/s"
+                      f"{result['peak_rss_mb']:>10.0f} MB peak")
+
+    usable = [result for result in results if not math.isnan(result["samples_per_second"])]
+    if not usable:
+        raise RuntimeError("None of the CPU performance configurations could be benchmarked")
+    best = max(usable, key=lambda result: result["samples_per_second"])
+    return best["config"], results
+
+
+def main() -> None:
+    """
+    Finds the fastest CPU training configuration on this machine. With
+    --memory it instead reports peak memory and throughput of the memory
+    saving settings for the batch size.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark CPU training configurations")
+    parser.add_argument("--batch-size", "-b", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--steps", "-s", type=int, default=5)
+    parser.add_argument("--no-compile", action="store_true", help="Skip the torch.compile variants")
+    parser.add_argument("--memory", action="store_true",
+                        help="Compare checkpointing, chunked decoding and micro-batch sizes instead")
+    args = parser.parse_args()
+
+    if args.memory:
+        _, results = autotune(memory_candidates(args.batch_size), args.batch_size, args.steps)
+        usable = [result for result in results if not math.isnan(result["samples_per_second"])]
+        smallest = min(usable, key=lambda result: result["peak_rss_mb"])
+        print(f"Smallest peak memory: {smallest['config'].describe()} {asdict(smallest['config'])}")
+        return
+
+    candidates = default_candidates()
+    if args.no_compile:
+        candidates = [config for config in candidates if not config.compile]
+    best, _ = autotune(candidates, args.batch_size, args.steps)
+    print(f"Fastest configuration: {best.describe()} {asdict(best)}")
+
+
+if __name__ == "__main__":
+    main()
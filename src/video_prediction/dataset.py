@@ -1,18 +1,37 @@
 import json
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 import numpy as np
 import torch
 from torch.utils.data import Dataset
 
 from video_prediction.constants import (
     AUDIO_FEATURES_PER_SECOND,
+    AUDIO_SAMPLE_RATE,
     FREQ_BINS,
     VIDEO_RESIZE,
     VIDEO_TARGET_FPS,
     WINDOW_SECONDS,
 )
+from video_prediction.manifest_index import load_index, path_hash
+from video_prediction.sample_cache import SharedSampleCache
+from video_prediction.spectrogram import PcmCache
+
+# What the "audio" of a sample is: the stored spectrogram, or the raw PCM of its
+# window for a SpectrogramFrontend that runs in the training graph.
+SAMPLE_FEATURES = ("spectrogram", "pcm")
+
+
+def prediction_sample_rate(features: str) -> Optional[int]:
+    """
+    Rate prediction decodes a track at for a model trained on `features`: the
+    native rate of the track, like the stored spectrograms, or the rate of the
+    `PcmCache` that PCM training reads from.
+    """
+    if features not in SAMPLE_FEATURES:
+        raise ValueError(f"Unknown sample features {features!r}, expected one of {SAMPLE_FEATURES}")
+    return AUDIO_SAMPLE_RATE if features == "pcm" else None
 
 
 @dataclass(frozen=True)
@@ -27,9 +46,24 @@ class ClipRecord:
     duration: float
 
 
-def load_manifest(manifest_path: str) -> List[ClipRecord]:
+def _resolve_manifest_path(path: str, manifest_root: Path) -> str:
+    """
+    Resolves a path from the manifest. Relative paths are tried against the
+    current working directory first and the manifest directory second.
+    """
+    candidate = Path(path)
+    if candidate.is_absolute():
+        return str(candidate)
+    if candidate.exists():
+        return str(candidate.resolve())
+    return str((manifest_root / candidate).resolve())
+
+
+def load_manifest(manifest_path: str, resolve_paths: bool = True) -> List[ClipRecord]:
     """
     Loads a manifest file containing audio/video clip records and returns a list of ClipRecord instances.
+    With `resolve_paths=False` the paths are returned exactly as written, which avoids
+    touching the filesystem for every record.
     """
     records: List[ClipRecord] = []
     manifest_root = Path(manifest_path).resolve().parent
@@ -38,29 +72,18 @@ def load_manifest(manifest_path: str) -> List[ClipRecord]:
             if not line.strip():
                 continue
             item = json.loads(line)
-            sample_path = Path(item["sample_path"])
-            if not sample_path.is_absolute():
-                if sample_path.exists():
-                    sample_path = sample_path.resolve()
-                else:
-                    sample_path = (manifest_root / sample_path).resolve()
-            source_audio = Path(item["source_audio"])
-            if not source_audio.is_absolute():
-                if source_audio.exists():
-                    source_audio = source_audio.resolve()
-                else:
-                    source_audio = (manifest_root / source_audio).resolve()
-            source_video = Path(item["source_video"])
-            if not source_video.is_absolute():
-                if source_video.exists():
-                    source_video = source_video.resolve()
-                else:
-                    source_video = (manifest_root / source_video).resolve()
+            sample_path = item["sample_path"]
+            source_audio = item["source_audio"]
+            source_video = item["source_video"]
+            if resolve_paths:
+                sample_path = _resolve_manifest_path(sample_path, manifest_root)
+                source_audio = _resolve_manifest_path(source_audio, manifest_root)
+                source_video = _resolve_manifest_path(source_video, manifest_root)
             records.append(
                 ClipRecord(
-                    sample_path=str(sample_path),
-                    source_audio=str(source_audio),
-                    source_video=str(source_video),
+                    sample_path=sample_path,
+                    source_audio=source_audio,
+                    source_video=source_video,
                     start_time=float(item["start_time"]),
                     duration=float(item["duration"]),
                 )
@@ -70,46 +93,170 @@ def load_manifest(manifest_path: str) -> List[ClipRecord]:
 
 class CachedClipDataset(Dataset):
     """
-    Load cached 4-second audio/video windows from a manifest.
+    Load cached 4-second audio/video windows from a manifest. With
+    `cache_mb` > 0 decoded samples are kept in a shared-memory LRU cache of
+    that size, so samples are only decompressed once per run if they fit.
+
+    With `features="pcm"` the audio of a sample is the mono PCM of its window
+    (AUDIO_SAMPLE_RATE, shape (1, samples)) instead of the stored spectrogram.
+    Source tracks are decoded once into a `PcmCache` next to the manifest.
+    Every track is resampled to AUDIO_SAMPLE_RATE so windows can be batched;
+    prediction decodes at the same rate for such models, see
+    `prediction_sample_rate`.
     """
-    def __init__(self, manifest_path: str):
+    def __init__(self, manifest_path: str, cache_mb: float = 0, features: str = "spectrogram"):
         if torch is None:
             raise ImportError("torch is required to use CachedClipDataset")
+        if features not in SAMPLE_FEATURES:
+            raise ValueError(f"Unknown sample features {features!r}, expected one of {SAMPLE_FEATURES}")
         self.manifest_path = manifest_path
-        self.records = self._filter_valid_records(load_manifest(manifest_path))
+        self.manifest_root = Path(manifest_path).resolve().parent
+        self.features = features
+        self.pcm = PcmCache(str(self.manifest_root / "pcm")) if features == "pcm" else None
+        records = load_manifest(manifest_path, resolve_paths=False)
+        index = load_index(manifest_path)
+        # Stored video dtypes of the records, so the cache can keep them losslessly.
+        self.video_dtypes: set = set()
+        if index is not None and len(index) == len(records):
+            self.records = self._filter_indexed_records(records, index)
+        else:
+            # Datasets built before the index existed still work, just slowly.
+            self.records = self._filter_valid_records(records)
+        if self.pcm is not None:
+            self.records = [record for record in self.records if Path(self._resolve(record.source_audio)).exists()]
+        self.audio_shape = _expected_pcm_shape() if self.pcm is not None else _expected_audio_shape()
+        self.cache: Optional[SharedSampleCache] = None
+        if cache_mb > 0 and self.records:
+            # Float video from caches written before uint8 samples is kept as float, not quantized.
+            video_dtype = np.uint8 if self.video_dtypes <= {"uint8"} else np.float32
+            self.cache = SharedSampleCache(len(self.records), int(cache_mb * 2 ** 20),
+                                           self.audio_shape, _expected_video_shape(), video_dtype)
+
+    def _filter_indexed_records(self, records: List[ClipRecord], index: np.ndarray) -> List[ClipRecord]:
+        hashes = np.fromiter((path_hash(record.sample_path) for record in records), dtype=np.uint32, count=len(records))
+        if not np.array_equal(hashes, index["path_hash"]):
+            # The index belongs to a different manifest; do not trust any of it.
+            return self._filter_valid_records(records)
+
+        valid = (
+            np.all(index["audio_shape"] == _expected_audio_shape(), axis=1)
+            & np.all(index["video_shape"] == _expected_video_shape(), axis=1)
+            & (index["audio_dtype"] == "float32")
+            & np.isin(index["video_dtype"], _VIDEO_DTYPES)
+        )
+        self.video_dtypes = {str(dtype) for dtype in np.unique(index["video_dtype"][valid])}
+        return [record for record, ok in zip(records, valid) if ok]
 
     def _filter_valid_records(self, records: List[ClipRecord]) -> List[ClipRecord]:
         valid_records: List[ClipRecord] = []
-        expected_audio_shape = (FREQ_BINS, int(WINDOW_SECONDS * AUDIO_FEATURES_PER_SECOND))
-        expected_video_shape = (int(WINDOW_SECONDS * VIDEO_TARGET_FPS), 3, VIDEO_RESIZE[0], VIDEO_RESIZE[1])
+        expected_audio_shape = _expected_audio_shape()
+        expected_video_shape = _expected_video_shape()
 
         for record in records:
             try:
-                with np.load(record.sample_path) as data:
+                with np.load(self._resolve(record.sample_path)) as data:
                     audio = data["audio"]
                     video = data["video"]
                 if audio.shape == expected_audio_shape and video.shape == expected_video_shape:
                     valid_records.append(record)
+                    self.video_dtypes.add(str(video.dtype))
             except Exception:
                 continue
 
         return valid_records
 
+    def _resolve(self, path: str) -> str:
+        return _resolve_manifest_path(path, self.manifest_root)
+
     def __len__(self) -> int:
         return len(self.records)
 
+    def _read_arrays(self, index: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns the audio and the stored video of a sample, from the cache if possible."""
+        if self.cache is not None:
+            cached = self.cache.get(index)
+            if cached is not None:
+                return cached
+        record = self.records[index]
+        with np.load(self._resolve(record.sample_path)) as data:
+            audio = data["audio"] if self.pcm is None else None
+            video = data["video"]
+        if self.pcm is not None:
+            audio = self.pcm.window(self._resolve(record.source_audio), record.start_time, WINDOW_SECONDS)
+        if self.cache is not None:
+            self.cache.put(index, audio, video)
+        return audio, video
+
     def __getitem__(self, index: int) -> Dict[str, Any]:
         record = self.records[index]
-        with np.load(record.sample_path) as data:
-            # Add a channel dimension so the spectrogram is ready for CNN-style models.
-            audio = torch.from_numpy(data["audio"]).float().unsqueeze(0)
-            video = torch.from_numpy(data["video"]).float()
+        audio, video = self._read_arrays(index)
+        # Add a channel dimension so the spectrogram (or PCM) is ready for CNN-style models.
+        audio = torch.from_numpy(audio).float().unsqueeze(0)
+        video = torch.from_numpy(_video_to_float(video))
 
         return {
             "audio": audio,
             "video": video,
-            "source_audio": record.source_audio,
-            "source_video": record.source_video,
+            "source_audio": self._resolve(record.source_audio),
+            "source_video": self._resolve(record.source_video),
             "start_time": record.start_time,
             "duration": record.duration,
         }
+
+    def load_batch(self, indices: Sequence[int]) -> Dict[str, Any]:
+        """
+        Read several samples at once and collate them into a batch. Files are
+        opened in path order so neighbouring samples are read sequentially, and
+        the arrays are decoded straight into preallocated batch buffers.
+        """
+        records = [self.records[index] for index in indices]
+        audio = np.empty((len(records), 1) + self.audio_shape, dtype=np.float32)
+        video = np.empty((len(records),) + _expected_video_shape(), dtype=np.float32)
+        for slot in sorted(range(len(records)), key=lambda i: records[i].sample_path):
+            sample_audio, sample_video = self._read_arrays(indices[slot])
+            audio[slot, 0] = sample_audio
+            _video_to_float(sample_video, out=video[slot])
+
+        return {
+            "audio": torch.from_numpy(audio),
+            "video": torch.from_numpy(video),
+            "source_audio": [self._resolve(record.source_audio) for record in records],
+            "source_video": [self._resolve(record.source_video) for record in records],
+            "start_time": torch.tensor([record.start_time for record in records], dtype=torch.float64),
+            "duration": torch.tensor([record.duration for record in records], dtype=torch.float64),
+        }
+
+    def locality_order(self) -> List[int]:
+        """
+        Returns the dataset indices sorted so that samples stored next to each
+        other on disk are adjacent.
+        """
+        return sorted(range(len(self.records)), key=lambda i: self.records[i].sample_path)
+
+
+# Older caches store frames as float32; newer ones keep the decoded uint8 pixels.
+_VIDEO_DTYPES = ("float32", "uint8")
+
+
+def _video_to_float(video: np.ndarray, out: np.ndarray | None = None) -> np.ndarray:
+    """
+    Converts cached video frames to float32 values in [0, 1].
+    """
+    if video.dtype == np.uint8:
+        return np.divide(video, np.float32(255.0), out=out, dtype=np.float32)
+    if out is None:
+        return video.astype(np.float32, copy=False)
+    out[...] = video
+    return out
+
+
+def _expected_audio_shape() -> Tuple[int, int]:
+    return (FREQ_BINS, int(WINDOW_SECONDS * AUDIO_FEATURES_PER_SECOND))
+
+
+def _expected_pcm_shape() -> Tuple[int]:
+    return (int(np.round(AUDIO_SAMPLE_RATE * WINDOW_SECONDS)),)
+
+
+def _expected_video_shape() -> Tuple[int, int, int, int]:
+    return (int(WINDOW_SECONDS * VIDEO_TARGET_FPS), 3, VIDEO_RESIZE[0], VIDEO_RESIZE[1])
@@ -0,0 +1,193 @@
+import argparse
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, List, Tuple
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+from torch.nn.parallel import DistributedDataParallel
+
+from video_prediction.model import VideoPredictor
+from video_prediction.cpu_perf import synthetic_batch
+from video_prediction.constants import DEFAULT_BATCH_SIZE, DEFAULT_LR, DEFAULT_MASTER_PORT
+
+
+@dataclass(frozen=True)
+class DistributedContext:
+    """
+    Position of the current process in a data-parallel run. A single-process
+    run is rank 0 of a world of size 1.
+    """
+    rank: int = 0
+    world_size: int = 1
+    local_rank: int = 0
+
+    @property
+    def is_main(self) -> bool:
+        return self.rank == 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.world_size > 1
+
+
+def current_context() -> DistributedContext:
+    """Returns the context of the initialized process group, or a single-process context."""
+    if not (dist.is_available() and dist.is_initialized()):
+        return DistributedContext()
+    return DistributedContext(
+        rank=dist.get_rank(),
+        world_size=dist.get_world_size(),
+        local_rank=int(os.environ.get("LOCAL_RANK", 0)),
+    )
+
+
+def init_from_env(backend: str = "gloo") -> DistributedContext:
+    """
+    Joins the process group described by the standard RANK, WORLD_SIZE,
+    MASTER_ADDR and MASTER_PORT environment variables, as set by `launch` or
+    by torchrun. Does nothing when WORLD_SIZE is missing or 1.
+    """
+    world_size = int(os.environ.get("WORLD_SIZE", 1))
+    if world_size > 1 and not dist.is_initialized():
+        dist.init_process_group(backend=backend, rank=int(os.environ["RANK"]), world_size=world_size)
+    return current_context()
+
+
+def cleanup() -> None:
+    if dist.is_available() and dist.is_initialized():
+        dist.destroy_process_group()
+
+
+def wrap_model(model: torch.nn.Module, device: torch.device) -> torch.nn.Module:
+    """Wraps the model in DistributedDataParallel when running in a process group."""
+    if not current_context().enabled:
+        return model
+    device_ids = [device.index if device.index is not None else torch.cuda.current_device()] if device.type == "cuda" else None
+    return DistributedDataParallel(model, device_ids=device_ids)
+
+
+def _worker(
+    local_rank: int,
+    fn: Callable[..., None],
+    args: Tuple[Any, ...],
+    nproc_per_node: int,
+    nnodes: int,
+    node_rank: int,
+    master_addr: str,
+    master_port: int,
+    threads: int,
+) -> None:
+    os.environ["MASTER_ADDR"] = master_addr
+    os.environ["MASTER_PORT"] = str(master_port)
+    os.environ["WORLD_SIZE"] = str(nproc_per_node * nnodes)
+    os.environ["RANK"] = str(node_rank * nproc_per_node + local_rank)
+    os.environ["LOCAL_RANK"] = str(local_rank)
+    torch.set_num_threads(threads)
+    if torch.cuda.is_available():
+        torch.cuda.set_device(local_rank % torch.cuda.device_count())
+    init_from_env()
+    try:
+        fn(*args)
+    finally:
+        cleanup()
+
+
+def launch(
+    fn: Callable[..., None],
+    args: Tuple[Any, ...] = (),
+    nproc_per_node: int = 1,
+    nnodes: int = 1,
+    node_rank: int = 0,
+    master_addr: str = "127.0.0.1",
+    master_port: int = DEFAULT_MASTER_PORT,
+    threads_per_process: int = 0,
+) -> None:
+    """
+    Starts `nproc_per_node` processes on this host that each call `fn(*args)`
+    inside a gloo process group. For a multi-host run, start the same command on
+    every host with the same `nnodes`, `master_addr` and `master_port` and a
+    distinct `node_rank`. By default the CPU cores of the host are split evenly
+    between its processes.
+    """
+    if threads_per_process <= 0:
+        threads_per_process = max(1, (os.cpu_count() or 1) // nproc_per_node)
+    mp.spawn(
+        _worker,
+        args=(fn, args, nproc_per_node, nnodes, node_rank, master_addr, master_port, threads_per_process),
+        nprocs=nproc_per_node,
+        join=True,
+    )
+
+
+def _benchmark_worker(steps: int, batch_size: int, results: Any) -> None:
+    context = current_context()
+    device = torch.device("cpu")
+    model = wrap_model(VideoPredictor(), device)
+    optimizer = torch.optim.Adam(model.parameters(), lr=DEFAULT_LR)
+    loss_func = torch.nn.MSELoss()
+    audio, video = synthetic_batch(batch_size)
+
+    def step() -> None:
+        optimizer.zero_grad(set_to_none=True)
+        loss_func(model(audio), video).backward()
+        optimizer.step()
+
+    step()  # Warm-up, also lets DDP build its gradient buckets.
+    if context.enabled:
+        dist.barrier()
+    start = time.perf_counter()
+    for _ in range(steps):
+        step()
+    if context.enabled:
+        dist.barrier()
+    elapsed = time.perf_counter() - start
+    if context.is_main:
+        results.put(context.world_size * batch_size * steps / elapsed)
+
+
+def benchmark_scaling(process_counts: List[int], steps: int, batch_size: int) -> List[Tuple[int, float]]:
+    """
+    Measures training throughput (samples/sec over all processes) on synthetic
+    data for every number of local processes in `process_counts`. Each process
+    trains with `batch_size` samples per step, as in a real data-parallel run.
+    """
+    results = []
+    queue = mp.get_context("spawn").SimpleQueue()
+    for offset, nproc in enumerate(process_counts):
+        # A fresh port per run avoids waiting for the previous one to be released.
+        launch(_benchmark_worker, (steps, batch_size, queue), nproc_per_node=nproc,
+               master_port=DEFAULT_MASTER_PORT + 1 + offset)
+        results.append((nproc, queue.get()))
+    return results
+
+
+def main() -> None:
+    """
+    Benchmarks how training throughput scales with the number of local
+    data-parallel processes.
+    """
+    parser = argparse.ArgumentParser(description="Data-parallel training scaling benchmark")
+    parser.add_argument("--max-procs", "-n", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--steps", "-s", type=int, default=10)
+    parser.add_argument("--batch-size", "-b", type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    counts = []
+    count = 1
+    while count < args.max_procs:
+        counts.append(count)
+        count *= 2
+    counts.append(args.max_procs)
+
+    results = benchmark_scaling(counts, args.steps, args.batch_size)
+    baseline = results[0][1]
+    print(f"{'Processes':>10}{'Samples/sec':>14}{'Speed-up':>10}{'Efficiency':>12}")
+    for nproc, samples_per_second in results:
+        speedup = samples_per_second / baseline
+        print(f"{nproc:>10}{samples_per_second:>14.2f}{speedup:>9.2f}x{100.0 * speedup / nproc:>11.0f}%")
+
+
+if __name__ == "__main__":
+    main()
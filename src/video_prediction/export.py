@@ -0,0 +1,243 @@
+import argparse
+import copy
+import math
+import tempfile
+import time
+import zipfile
+from pathlib import Path
+from typing import Dict, List, Optional
+import torch
+import torch.nn as nn
+
+from video_prediction.model import MODEL_VARIANTS, VideoPredictor, build_model
+from video_prediction.constants import (
+    AUDIO_FEATURES_PER_SECOND,
+    DEFAULT_MODEL_PATH,
+    DEFAULT_MODEL_VARIANT,
+    DEFAULT_PREDICT_BATCH_SIZE,
+    FREQ_BINS,
+    WINDOW_SECONDS,
+)
+
+QUANTIZE_MODES = ("none", "dynamic", "static")
+
+
+class _ToChannelsLast(nn.Module):
+    """Switches the decoder input to channels_last so the convolutions use the NHWC kernels."""
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        return x.contiguous(memory_format=torch.channels_last)
+
+
+class _Bfloat16Wrapper(nn.Module):
+    """Runs a bf16 model on float32 input and returns float32 output."""
+    def __init__(self, model: nn.Module):
+        super().__init__()
+        self.model = model
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        return self.model(x.to(torch.bfloat16)).float()
+
+
+def _example_windows(batch_size: int) -> torch.Tensor:
+    time_steps = int(WINDOW_SECONDS * AUDIO_FEATURES_PER_SECOND)
+    return torch.rand(batch_size, 1, FREQ_BINS, time_steps)
+
+
+def _decoder_inputs(model: VideoPredictor, windows: torch.Tensor) -> torch.Tensor:
+    """Runs the encoder part of the model to get realistic decoder inputs for calibration."""
+    captured: List[torch.Tensor] = []
+    handle = model.decoder.register_forward_pre_hook(lambda _, inputs: captured.append(inputs[0].detach()))
+    try:
+        with torch.inference_mode():
+            model(windows)
+    finally:
+        handle.remove()
+    return torch.cat(captured, dim=0)
+
+
+def optimize_model(
+    model: VideoPredictor,
+    quantize: str = "none",
+    channels_last: bool = False,
+    bf16: bool = False,
+    calibration_windows: Optional[torch.Tensor] = None,
+) -> torch.jit.ScriptModule:
+    """
+    Builds an optimized CPU inference graph from a trained model: optional int8
+    quantization (dynamic for the RNN and linear layers, static additionally
+    quantizes the decoder convolutions), optional channels_last decoder and
+    optional bf16 weights, traced and frozen with TorchScript.
+    """
+    if quantize not in QUANTIZE_MODES:
+        raise ValueError(f"Unknown quantization mode {quantize!r}, expected one of {QUANTIZE_MODES}")
+    if bf16 and quantize != "none":
+        raise ValueError("bf16 cannot be combined with int8 quantization")
+
+    model = copy.deepcopy(model).cpu().eval()
+    example = _example_windows(2)
+    if calibration_windows is None:
+        calibration_windows = _example_windows(DEFAULT_PREDICT_BATCH_SIZE)
+
+    if quantize == "static":
+        from torch.ao.quantization import get_default_qconfig_mapping
+        from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+        features = _decoder_inputs(model, calibration_windows)
+        prepared = prepare_fx(model.decoder, get_default_qconfig_mapping("x86"), example_inputs=(features[:1],))
+        with torch.inference_mode():
+            prepared(features)
+        model.decoder = convert_fx(prepared)
+    if quantize in ("dynamic", "static"):
+        from torch.ao.quantization import quantize_dynamic
+
+        model = quantize_dynamic(model, {nn.Linear, nn.RNN, nn.GRU}, dtype=torch.qint8)
+    elif channels_last:
+        model.decoder = nn.Sequential(_ToChannelsLast(), *model.decoder).to(memory_format=torch.channels_last)
+
+    scripted: nn.Module = model
+    if bf16:
+        scripted = _Bfloat16Wrapper(model.to(torch.bfloat16))
+    with torch.inference_mode():
+        traced = torch.jit.trace(scripted.eval(), example)
+        frozen = torch.jit.freeze(traced)
+        # Tracing records Python control flow for the example batch only; a
+        # graph that depends on it fails here instead of in every consumer.
+        check = _example_windows(DEFAULT_PREDICT_BATCH_SIZE)
+        frames = frozen(check)
+    if frames.size(0) != len(check):
+        raise RuntimeError(f"Traced model returned {frames.size(0)} clips for a batch of {len(check)}")
+    return frozen
+
+
+def is_torchscript_artifact(path: str) -> bool:
+    """TorchScript archives contain serialized code, plain state dicts do not."""
+    if not zipfile.is_zipfile(path):
+        return False
+    with zipfile.ZipFile(path) as archive:
+        return any("/code/" in name for name in archive.namelist())
+
+
+def load_predictor(path: str, device: torch.device, variant: str = DEFAULT_MODEL_VARIANT) -> nn.Module:
+    """
+    Loads either an optimized artifact written by this module or a plain
+    `VideoPredictor` state dict of the model variant `variant`, ready for
+    inference on `device`. Artifacts already contain their architecture.
+    """
+    if is_torchscript_artifact(path):
+        artifact = torch.jit.load(path, map_location=device).eval()
+        # The CPU-specific graph rewrites cannot be serialized, so apply them at load time.
+        return torch.jit.optimize_for_inference(artifact) if device.type == "cpu" else artifact
+    model = build_model(variant)
+    model.load_state_dict(torch.load(path, map_location=device))
+    return model.to(device).eval()
+
+
+def _psnr(reference: torch.Tensor, output: torch.Tensor) -> float:
+    mse = torch.mean((reference.float() - output.float()) ** 2).item()
+    return math.inf if mse == 0 else 10.0 * math.log10(1.0 / mse)
+
+
+def _latency_per_window(model: nn.Module, windows: torch.Tensor, repeats: int) -> float:
+    with torch.inference_mode():
+        model(windows)  # Warm-up, also triggers TorchScript profiling passes.
+        model(windows)
+        start = time.perf_counter()
+        for _ in range(repeats):
+            model(windows)
+    return (time.perf_counter() - start) / (repeats * len(windows))
+
+
+def benchmark(model: VideoPredictor, windows: torch.Tensor, repeats: int = 5) -> List[Dict[str, float]]:
+    """
+    Compares the eager fp32 model with every export variant: latency per
+    window, cold-start load time of the saved artifact and PSNR of the output
+    against the eager fp32 output.
+    """
+    model = model.cpu().eval()
+    with torch.inference_mode():
+        reference = model(windows)
+
+    variants = {
+        "torchscript fp32": dict(),
+        "torchscript fp32 channels_last": dict(channels_last=True),
+        "torchscript bf16": dict(bf16=True),
+        "dynamic int8": dict(quantize="dynamic"),
+        "static int8": dict(quantize="static"),
+    }
+    rows = [{
+        "variant": "eager fp32",
+        "latency_ms": 1000.0 * _latency_per_window(model, windows, repeats),
+        "load_ms": float("nan"),
+        "psnr_db": math.inf,
+    }]
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for name, options in variants.items():
+            artifact_path = str(Path(temp_dir) / "model.pt")
+            optimize_model(model, calibration_windows=windows, **options).save(artifact_path)
+            load_start = time.perf_counter()
+            artifact = load_predictor(artifact_path, torch.device("cpu"))
+            load_ms = 1000.0 * (time.perf_counter() - load_start)
+            with torch.inference_mode():
+                output = artifact(windows)
+            rows.append({
+                "variant": name,
+                "latency_ms": 1000.0 * _latency_per_window(artifact, windows, repeats),
+                "load_ms": load_ms,
+                "psnr_db": _psnr(reference, output),
+            })
+    return rows
+
+
+def _calibration_windows(manifest_path: Optional[str], count: int) -> torch.Tensor:
+    if manifest_path is None:
+        return _example_windows(count)
+    from video_prediction.dataset import CachedClipDataset
+
+    dataset = CachedClipDataset(manifest_path)
+    if len(dataset) == 0:
+        raise RuntimeError(f"No usable samples in {manifest_path}")
+    indices = torch.linspace(0, len(dataset) - 1, min(count, len(dataset))).long().tolist()
+    return dataset.load_batch(indices)["audio"]
+
+
+def main() -> None:
+    """
+    Exports a trained model as an optimized inference artifact that predict.py
+    can load directly, or benchmarks all export variants against the fp32 model.
+    """
+    parser = argparse.ArgumentParser(description="Export an optimized inference model")
+    parser.add_argument("--model-path", "-m", type=str, default=DEFAULT_MODEL_PATH)
+    parser.add_argument("--model-variant", choices=sorted(MODEL_VARIANTS), default=DEFAULT_MODEL_VARIANT)
+    parser.add_argument("--output", "-o", type=str, default=None,
+                        help="Artifact path (default: model path with .ts.pt suffix)")
+    parser.add_argument("--quantize", "-q", choices=QUANTIZE_MODES, default="none")
+    parser.add_argument("--channels-last", action="store_true")
+    parser.add_argument("--bf16", action="store_true")
+    parser.add_argument("--manifest-path", type=str, default=None,
+                        help="Dataset manifest used for static quantization calibration and benchmarking")
+    parser.add_argument("--calibration-windows", type=int, default=32)
+    parser.add_argument("--benchmark", action="store_true", help="Benchmark all variants instead of exporting")
+    parser.add_argument("--batch-size", "-b", type=int, default=DEFAULT_PREDICT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    model = build_model(args.model_variant)
+    model.load_state_dict(torch.load(args.model_path, map_location="cpu"))
+    model.eval()
+
+    if args.benchmark:
+        windows = _calibration_windows(args.manifest_path, args.batch_size)
+        print(f"{'Variant':<32}{'Latency/window':>16}{'Load':>10}{'PSNR':>10}")
+        for row in benchmark(model, windows):
+            print(f"{row['variant']:<32}{row['latency_ms']:>13.2f} ms{row['load_ms']:>7.0f} ms{row['psnr_db']:>7.1f} dB")
+        return
+
+    calibration = _calibration_windows(args.manifest_path, args.calibration_windows)
+    artifact = optimize_model(model, args.quantize, args.channels_last, args.bf16, calibration)
+    output_path = Path(args.output) if args.output else Path(args.model_path).with_suffix(".ts.pt")
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    artifact.save(str(output_path))
+    print(f"Saved optimized model to {output_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,308 @@
+import queue
+import subprocess
+import tempfile
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+import numpy as np
+import torch
+import torch.nn.functional as F
+from torch.nn import Module
+
+from video_prediction.interpolation import TemporalInterpolator
+from video_prediction.spectrogram import SpectrogramFrontend, decode_audio, pcm_windows
+from video_prediction.constants import (
+    DEFAULT_INTERPOLATION,
+    DEFAULT_PREDICT_BATCH_SIZE,
+    DEFAULT_PIPELINE_QUEUE_SIZE,
+    VIDEO_TARGET_FPS,
+    WINDOW_SECONDS,
+)
+
+
+class FFmpegVideoWriter:
+    """
+    Streams raw RGB frames into a single ffmpeg process that encodes them and
+    muxes the audio track in the same pass. yuv420p needs even dimensions, so
+    odd sizes are padded by one black row or column. The ffmpeg log goes to a
+    temporary file, which cannot fill up and block the writer. `threads` caps
+    the encoder threads, 0 leaves the choice to ffmpeg.
+    """
+    def __init__(self, output_path: str, audio_path: Optional[str], width: int, height: int, fps: float,
+                 threads: int = 0):
+        path = Path(output_path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        command = [
+            "ffmpeg",
+            "-y",
+            "-loglevel",
+            "error",
+            "-f",
+            "rawvideo",
+            "-pix_fmt",
+            "rgb24",
+            "-s",
+            f"{width}x{height}",
+            "-r",
+            str(fps),
+            "-i",
+            "-",
+        ]
+        if audio_path is not None:
+            command += ["-i", audio_path, "-map", "0:v:0", "-map", "1:a:0", "-c:a", "aac", "-shortest"]
+        if width % 2 or height % 2:
+            command += ["-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2"]
+        if threads > 0:
+            command += ["-threads", str(threads)]
+        command += ["-c:v", "libx264", "-pix_fmt", "yuv420p", str(path)]
+        self.log = tempfile.TemporaryFile()
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stderr=self.log)
+
+    def write(self, frames: np.ndarray) -> None:
+        """Writes a batch of frames with shape (frames, height, width, 3) and dtype uint8."""
+        try:
+            self.process.stdin.write(np.ascontiguousarray(frames).tobytes())
+        except BrokenPipeError:
+            self.close()
+            raise
+
+    def close(self) -> None:
+        if self.process.returncode is not None:
+            return
+        try:
+            self.process.stdin.close()
+        except BrokenPipeError:
+            pass
+        self.process.wait()
+        self.log.seek(0)
+        stderr = self.log.read()
+        self.log.close()
+        if self.process.returncode != 0:
+            raise RuntimeError(f"ffmpeg failed while encoding the video: {stderr.decode(errors='replace').strip()}")
+
+
+def upscale_frames(frames: torch.Tensor, width: int, height: int) -> torch.Tensor:
+    """
+    Resizes model output (batch, frames, 3, h, w) with values in [0, 1] in one
+    batched interpolation and returns uint8 frames (batch * frames, height, width, 3).
+    """
+    frames = frames.flatten(0, 1)
+    if frames.shape[-2:] != (height, width):
+        frames = F.interpolate(frames, size=(height, width), mode="bilinear", align_corners=False)
+    frames = frames.clamp(0.0, 1.0).mul(255.0).to(torch.uint8)
+    return frames.permute(0, 2, 3, 1).contiguous()
+
+
+@dataclass
+class PipelineReport:
+    """
+    Timing of a pipelined prediction. `stage_seconds` is the time each stage
+    spent working; the slowest stage bounds the throughput of the pipeline.
+    """
+    windows: int = 0
+    frames: int = 0
+    fps: float = 0.0
+    total_seconds: float = 0.0
+    stage_seconds: Dict[str, float] = field(default_factory=dict)
+
+    def real_time_factor(self) -> float:
+        video_seconds = self.frames / self.fps if self.fps > 0 else 0.0
+        return video_seconds / self.total_seconds if self.total_seconds > 0 else 0.0
+
+    def summary(self) -> str:
+        stages = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in self.stage_seconds.items())
+        return (
+            f"Predicted {self.frames / self.fps:.1f}s of video ({self.windows} windows) in {self.total_seconds:.2f}s "
+            f"({stages}), real-time factor {self.real_time_factor():.2f}x"
+        )
+
+
+_DONE = object()
+
+
+def run_stages(
+    source: Iterable[Any],
+    stages: List[Callable[[Any], Any]],
+    sink: Callable[[Any], None],
+    names: List[str],
+    queue_size: int = DEFAULT_PIPELINE_QUEUE_SIZE,
+) -> Dict[str, float]:
+    """
+    Runs `source -> stages... -> sink` with every step in its own thread,
+    connected by bounded queues. The first error raised by any step stops the
+    whole pipeline and is re-raised here. Returns the busy time of every step.
+    """
+    steps = len(stages) + 2
+    if len(names) != steps:
+        raise ValueError(f"Expected {steps} stage names, got {len(names)}")
+    queues = [queue.Queue(maxsize=max(1, queue_size)) for _ in range(steps - 1)]
+    stop = threading.Event()
+    errors: List[BaseException] = []
+    busy = {name: 0.0 for name in names}
+
+    def put(target: queue.Queue, item: Any) -> bool:
+        while not stop.is_set():
+            try:
+                target.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def items(inbox: queue.Queue) -> Iterator[Any]:
+        while not stop.is_set():
+            try:
+                item = inbox.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if item is _DONE:
+                return
+            yield item
+
+    def run_source() -> None:
+        iterator = iter(source)
+        while not stop.is_set():
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                break
+            busy[names[0]] += time.perf_counter() - start
+            if not put(queues[0], item):
+                return
+        put(queues[0], _DONE)
+
+    def run_stage(position: int) -> None:
+        for item in items(queues[position - 1]):
+            start = time.perf_counter()
+            result = stages[position - 1](item)
+            busy[names[position]] += time.perf_counter() - start
+            if not put(queues[position], result):
+                return
+        put(queues[position], _DONE)
+
+    def run_sink() -> None:
+        for item in items(queues[-1]):
+            start = time.perf_counter()
+            sink(item)
+            busy[names[-1]] += time.perf_counter() - start
+
+    def guarded(target: Callable[..., None], *args: Any) -> Callable[[], None]:
+        def run() -> None:
+            try:
+                target(*args)
+            except BaseException as error:
+                errors.append(error)
+                stop.set()
+        return run
+
+    threads = [threading.Thread(target=guarded(run_source), daemon=True)]
+    threads += [threading.Thread(target=guarded(run_stage, position), daemon=True) for position in range(1, steps - 1)]
+    for thread in threads:
+        thread.start()
+    guarded(run_sink)()
+    stop.set()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+    return busy
+
+
+def _batched(items: Iterable[np.ndarray], batch_size: int) -> Iterator[np.ndarray]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield np.stack(batch, axis=0)
+            batch = []
+    if batch:
+        yield np.stack(batch, axis=0)
+
+
+def predict_video(
+    model: Module,
+    audio_path: str,
+    output_path: str,
+    fps: float,
+    width: int,
+    height: int,
+    device: torch.device,
+    batch_size: int = DEFAULT_PREDICT_BATCH_SIZE,
+    queue_size: int = DEFAULT_PIPELINE_QUEUE_SIZE,
+    interpolation: str = DEFAULT_INTERPOLATION,
+    frontend: Optional[SpectrogramFrontend] = None,
+    sample_rate: Optional[int] = None,
+    encoder_threads: int = 0,
+) -> PipelineReport:
+    """
+    Predicts the video for a whole audio file with overlapping stages:
+    spectrogram analysis, model inference, batched upscaling and encoding all
+    run concurrently. Frames go straight to one ffmpeg process that also muxes
+    the original audio, so no intermediate video file is written.
+
+    The track is decoded to PCM once, at `sample_rate` or at its native rate
+    if None, which must be the rate the model was trained with (see
+    `dataset.prediction_sample_rate`); the spectrogram windows are computed by
+    `frontend` (default settings if None) batched on the device, right before
+    the model.
+
+    The model predicts VIDEO_TARGET_FPS frames per second; for any other `fps`
+    the resize stage first resamples them in time with `interpolation` (see
+    `video_prediction.interpolation`), so the video stays in sync with the audio.
+    `encoder_threads` caps the threads of ffmpeg (0: its own choice).
+    """
+    report = PipelineReport(fps=fps)
+    frontend = (frontend or SpectrogramFrontend()).to(device)
+    interpolator = TemporalInterpolator(VIDEO_TARGET_FPS, fps, interpolation)
+    writer = FFmpegVideoWriter(output_path, audio_path, width, height, fps, encoder_threads)
+    # Set by the analysis stage before its first window reaches the model.
+    decoded_rate = sample_rate
+
+    def infer(windows: np.ndarray) -> torch.Tensor:
+        report.windows += len(windows)
+        with torch.inference_mode():
+            batch = frontend(torch.from_numpy(windows).to(device), decoded_rate)
+            return model(batch)
+
+    def upscale(output: torch.Tensor) -> np.ndarray:
+        with torch.inference_mode():
+            frames = interpolator.push(output.flatten(0, 1))
+            return upscale_frames(frames.unsqueeze(0), width, height).cpu().numpy()
+
+    def encode(frames: np.ndarray) -> None:
+        writer.write(frames)
+        report.frames += len(frames)
+
+    def windows() -> Iterator[np.ndarray]:
+        nonlocal decoded_rate
+        # Decoded lazily, so the time counts towards the analysis stage.
+        pcm, decoded_rate = decode_audio(audio_path, sample_rate)
+        yield from pcm_windows(pcm, decoded_rate, WINDOW_SECONDS)
+
+    start = time.perf_counter()
+    try:
+        report.stage_seconds = run_stages(
+            _batched(windows(), max(1, batch_size)),
+            [infer, upscale],
+            encode,
+            names=["analysis", "model", "resize", "encode"],
+            queue_size=queue_size,
+        )
+        # The frames after the last predicted frame that complete the duration.
+        with torch.inference_mode():
+            tail = interpolator.flush()
+            if len(tail):
+                encode(upscale_frames(tail.unsqueeze(0), width, height).cpu().numpy())
+    except BaseException:
+        # Report the pipeline error, not the follow-up failure of the encoder.
+        try:
+            writer.close()
+        except RuntimeError:
+            pass
+        raise
+    writer.close()
+    report.total_seconds = time.perf_counter() - start
+    return report
@@ -0,0 +1,245 @@
+import queue
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+import torch
+from torch.utils.data import DataLoader, Dataset, Sampler
+from torch.utils.data.dataloader import default_collate
+
+from video_prediction.constants import DEFAULT_NUM_WORKERS, DEFAULT_PREFETCH_BATCHES
+from video_prediction.distributed import current_context
+
+
+class LocalityBatchSampler(Sampler[List[int]]):
+    """
+    Shuffle-aware batch sampler that keeps samples stored close together on disk
+    in the same batch. The locality order is cut into batch-sized groups at a
+    random offset every epoch, then both the group order and the order inside
+    each group are shuffled.
+
+    In a data-parallel run every process builds the same batches from the
+    shared seed and takes every `num_replicas`-th one, starting at `rank`, like
+    `DistributedSampler` does for single samples. All processes get the same
+    number of batches so their gradient synchronization stays in step.
+    """
+    def __init__(
+        self,
+        locality_order: Sequence[int],
+        batch_size: int,
+        shuffle: bool = True,
+        drop_last: bool = False,
+        seed: int = 0,
+        num_replicas: int = 1,
+        rank: int = 0,
+    ):
+        if batch_size <= 0:
+            raise ValueError(f"batch_size must be positive, got {batch_size}")
+        if not 0 <= rank < num_replicas:
+            raise ValueError(f"rank {rank} is out of range for {num_replicas} replicas")
+        self.locality_order = list(locality_order)
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.drop_last = drop_last
+        self.seed = seed
+        self.num_replicas = num_replicas
+        self.rank = rank
+        self.epoch = 0
+
+    def set_epoch(self, epoch: int) -> None:
+        """Changes the shuffle for the next pass over the data."""
+        self.epoch = epoch
+
+    def __iter__(self) -> Iterator[List[int]]:
+        order = self.locality_order
+        rng = random.Random(self.seed + self.epoch)
+        if self.shuffle and order:
+            offset = rng.randrange(len(order))
+            order = order[offset:] + order[:offset]
+
+        batches = [order[i:i + self.batch_size] for i in range(0, len(order), self.batch_size)]
+        if self.drop_last and batches and len(batches[-1]) < self.batch_size:
+            batches.pop()
+        if self.shuffle:
+            rng.shuffle(batches)
+            for batch in batches:
+                rng.shuffle(batch)
+        if self.num_replicas > 1:
+            batches = batches[self.rank:len(self) * self.num_replicas:self.num_replicas]
+        return iter(batches)
+
+    def __len__(self) -> int:
+        if self.drop_last:
+            total = len(self.locality_order) // self.batch_size
+        else:
+            total = (len(self.locality_order) + self.batch_size - 1) // self.batch_size
+        return total // self.num_replicas if self.num_replicas > 1 else total
+
+
+class _BatchView(Dataset):
+    """
+    Maps a list of indices to a collated batch so whole batches are read and
+    converted inside the DataLoader workers.
+    """
+    def __init__(self, dataset: Dataset):
+        self.dataset = dataset
+
+    def __getitem__(self, indices: List[int]) -> Dict[str, Any]:
+        load_batch = getattr(self.dataset, "load_batch", None)
+        if load_batch is not None:
+            return load_batch(indices)
+        return default_collate([self.dataset[index] for index in indices])
+
+
+@dataclass
+class PipelineStats:
+    """
+    Throughput counters for one pass over the data. Loader throughput only
+    counts the time spent producing batches, compute throughput only the time
+    the training loop was busy with them.
+    """
+    batches: int = 0
+    samples: int = 0
+    fetch_seconds: float = 0.0
+    wait_seconds: float = 0.0
+    total_seconds: float = 0.0
+
+    def loader_samples_per_second(self) -> float:
+        return self.samples / self.fetch_seconds if self.fetch_seconds > 0 else 0.0
+
+    def compute_samples_per_second(self) -> float:
+        compute_seconds = self.total_seconds - self.wait_seconds
+        return self.samples / compute_seconds if compute_seconds > 0 else 0.0
+
+    def summary(self) -> str:
+        return (
+            f"loader {self.loader_samples_per_second():.1f} samples/s, "
+            f"compute {self.compute_samples_per_second():.1f} samples/s, "
+            f"waited {self.wait_seconds:.2f}s of {self.total_seconds:.2f}s on data"
+        )
+
+
+_END = object()
+
+
+class PrefetchLoader:
+    """
+    Wraps a DataLoader with a bounded queue that a background thread keeps
+    filled with up to `prefetch_batches` ready batches, already moved to the
+    target device.
+    """
+    def __init__(self, dataloader: DataLoader, device: torch.device, prefetch_batches: int = DEFAULT_PREFETCH_BATCHES):
+        self.dataloader = dataloader
+        self.device = device
+        self.prefetch_batches = max(1, prefetch_batches)
+        self.stats = PipelineStats()
+
+    def set_epoch(self, epoch: int) -> None:
+        """Forwards the epoch to the batch sampler so every epoch is shuffled differently."""
+        sampler = self.dataloader.sampler
+        if hasattr(sampler, "set_epoch"):
+            sampler.set_epoch(epoch)
+
+    def __len__(self) -> int:
+        return len(self.dataloader)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        self.stats = PipelineStats()
+        batches: queue.Queue = queue.Queue(maxsize=self.prefetch_batches)
+        stop = threading.Event()
+        producer = threading.Thread(target=self._produce, args=(batches, stop), daemon=True)
+        start = time.perf_counter()
+        producer.start()
+        try:
+            while True:
+                wait_start = time.perf_counter()
+                item = batches.get()
+                self.stats.wait_seconds += time.perf_counter() - wait_start
+                if item is _END:
+                    break
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            stop.set()
+            # Unblock the producer if it is waiting on a full queue.
+            while producer.is_alive():
+                try:
+                    batches.get_nowait()
+                except queue.Empty:
+                    producer.join(timeout=0.01)
+            self.stats.total_seconds = time.perf_counter() - start
+
+    def _produce(self, batches: queue.Queue, stop: threading.Event) -> None:
+        non_blocking = self.device.type == "cuda"
+        try:
+            iterator = iter(self.dataloader)
+            while not stop.is_set():
+                fetch_start = time.perf_counter()
+                try:
+                    batch = next(iterator)
+                except StopIteration:
+                    break
+                batch = {
+                    key: value.to(self.device, non_blocking=non_blocking) if isinstance(value, torch.Tensor) else value
+                    for key, value in batch.items()
+                }
+                self.stats.fetch_seconds += time.perf_counter() - fetch_start
+                self.stats.batches += 1
+                self.stats.samples += len(batch["audio"])
+                if not _put(batches, batch, stop):
+                    return
+        except BaseException as error:
+            _put(batches, error, stop)
+            return
+        _put(batches, _END, stop)
+
+
+def _put(batches: queue.Queue, item: Any, stop: threading.Event) -> bool:
+    """Blocking put that gives up once the consumer has stopped listening."""
+    while not stop.is_set():
+        try:
+            batches.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def build_input_pipeline(
+    dataset: Dataset,
+    batch_size: int,
+    device: torch.device,
+    num_workers: int = DEFAULT_NUM_WORKERS,
+    prefetch_batches: int = DEFAULT_PREFETCH_BATCHES,
+    shuffle: bool = True,
+    seed: int = 0,
+    sampler: Optional[Sampler[List[int]]] = None,
+) -> PrefetchLoader:
+    """
+    Builds the training input pipeline: a locality-grouped batch sampler, whole
+    batches decoded in persistent worker processes, and a bounded prefetch queue
+    in front of the training loop. Inside a data-parallel process group the
+    batches are sharded across the processes.
+    """
+    if sampler is None:
+        locality_order = getattr(dataset, "locality_order", None)
+        order = locality_order() if locality_order is not None else range(len(dataset))
+        context = current_context()
+        sampler = LocalityBatchSampler(order, batch_size, shuffle=shuffle, seed=seed,
+                                       num_replicas=context.world_size, rank=context.rank)
+
+    loader_kwargs: Dict[str, Any] = {}
+    if num_workers > 0:
+        loader_kwargs["persistent_workers"] = True
+        loader_kwargs["prefetch_factor"] = 2
+    dataloader = DataLoader(
+        _BatchView(dataset),
+        sampler=sampler,
+        batch_size=None,
+        num_workers=num_workers,
+        pin_memory=device.type == "cuda",
+        **loader_kwargs,
+    )
+    return PrefetchLoader(dataloader, device, prefetch_batches)
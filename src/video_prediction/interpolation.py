@@ -0,0 +1,142 @@
+import math
+from typing import Optional
+import torch
+import torch.nn.functional as F
+
+INTERPOLATION_MODES = ("nearest", "linear", "motion")
+
+# Block size and minimum phase correlation peak of the motion estimate.
+_MOTION_BLOCK = 16
+_MOTION_MIN_PEAK = 0.15
+
+
+class TemporalInterpolator:
+    """
+    Resamples a stream of frames from `source_fps` to `target_fps` so the
+    video keeps the length of the audio whatever the output frame rate. Output
+    frame k shows time k / target_fps; it is made from the two source frames
+    around that time:
+
+    - `nearest` takes the closer one (frames are repeated or dropped),
+    - `linear` blends them by their distance in time,
+    - `motion` estimates the motion between them with block-wise phase
+      correlation, moves both towards the output time and then blends them.
+
+    Frames are pushed in consecutive chunks of shape (frames, 3, height, width),
+    e.g. one batch of model output at a time; the last frame of every chunk is
+    kept so output frames between chunks are made as well. All work is done
+    in batch on the device of the frames. `flush` returns the frames after the
+    last pushed frame that complete the duration.
+    """
+    def __init__(self, source_fps: float, target_fps: float, mode: str = "linear"):
+        if mode not in INTERPOLATION_MODES:
+            raise ValueError(f"Unknown interpolation mode {mode!r}, expected one of {INTERPOLATION_MODES}")
+        if source_fps <= 0 or target_fps <= 0:
+            raise ValueError(f"Frame rates must be positive, got {source_fps} and {target_fps}")
+        self.source_fps = float(source_fps)
+        self.target_fps = float(target_fps)
+        self.mode = mode
+        self.previous: Optional[torch.Tensor] = None
+        self.consumed = 0
+        self.emitted = 0
+
+    def push(self, frames: torch.Tensor) -> torch.Tensor:
+        """Adds the next source frames and returns the output frames that are complete."""
+        if self.source_fps == self.target_fps:
+            self.consumed += len(frames)
+            self.emitted += len(frames)
+            return frames
+        if len(frames) == 0:
+            return frames
+        base = self.consumed
+        if self.previous is not None:
+            frames = torch.cat([self.previous, frames], dim=0)
+            base -= 1
+        self.consumed = base + len(frames)
+        self.previous = frames[-1:]
+
+        # Output frames whose time is not after the last source frame.
+        last = self.consumed - 1
+        available = math.floor(last * self.target_fps / self.source_fps + 1e-6) + 1
+        return self._resample(frames, base, available - self.emitted)
+
+    def flush(self) -> torch.Tensor:
+        """
+        Returns the remaining output frames, which hold the last source frame,
+        so that the output lasts as long as the pushed source frames.
+        """
+        total = round(self.consumed * self.target_fps / self.source_fps)
+        remaining = max(0, total - self.emitted)
+        self.emitted += remaining
+        if self.previous is None:
+            return torch.empty(0)
+        return self.previous.expand(remaining, *self.previous.shape[1:]).contiguous()
+
+    def _resample(self, frames: torch.Tensor, base: int, count: int) -> torch.Tensor:
+        if count <= 0:
+            return frames[:0]
+        steps = torch.arange(self.emitted, self.emitted + count, device=frames.device, dtype=torch.float64)
+        positions = steps * (self.source_fps / self.target_fps) - base
+        first = positions.floor().long().clamp(0, len(frames) - 1)
+        second = (first + 1).clamp(max=len(frames) - 1)
+        weights = (positions - first).clamp(0.0, 1.0).to(frames.dtype)
+        self.emitted += count
+
+        if self.mode == "nearest":
+            return frames[torch.where(weights < 0.5, first, second)]
+        before, after = frames[first], frames[second]
+        if self.mode == "motion" and len(frames) > 1:
+            flows = estimate_motion(frames)
+            flow = flows[first.clamp(max=len(flows) - 1)] * (second > first).view(-1, 1, 1, 1).to(frames.dtype)
+            before = warp(before, flow * -weights.view(-1, 1, 1, 1))
+            after = warp(after, flow * (1.0 - weights).view(-1, 1, 1, 1))
+        weights = weights.view(-1, 1, 1, 1)
+        return before * (1.0 - weights) + after * weights
+
+
+def interpolate_frames(frames: torch.Tensor, source_fps: float, target_fps: float, mode: str = "linear") -> torch.Tensor:
+    """Resamples a whole clip (frames, 3, height, width) from `source_fps` to `target_fps`."""
+    interpolator = TemporalInterpolator(source_fps, target_fps, mode)
+    return torch.cat([interpolator.push(frames), interpolator.flush().to(frames)], dim=0)
+
+
+def estimate_motion(frames: torch.Tensor, block: int = _MOTION_BLOCK) -> torch.Tensor:
+    """
+    Motion from every frame to the next one, (frames - 1, 2, height, width) as
+    (x, y) pixel offsets. The offset of each block is the peak of the phase
+    correlation of its luminance, blocks without a clear peak (flat areas) do
+    not move; the block offsets are smoothly upsampled to pixels.
+    """
+    count, _, height, width = frames.shape
+    rows, columns = height // block, width // block
+    if count < 2 or rows == 0 or columns == 0:
+        return frames.new_zeros((max(0, count - 1), 2, height, width))
+    gray = frames.float().mean(dim=1)[:, :rows * block, :columns * block]
+    blocks = gray.reshape(count, rows, block, columns, block).permute(0, 1, 3, 2, 4)
+    blocks = blocks - blocks.mean(dim=(-2, -1), keepdim=True)
+    window = torch.hann_window(block, periodic=False, device=frames.device)
+    spectra = torch.fft.rfft2(blocks * (window[:, None] * window[None, :]))
+    cross = spectra[1:] * spectra[:-1].conj()
+    correlation = torch.fft.irfft2(cross / cross.abs().clamp_min(1e-8), s=(block, block))
+
+    peak, index = correlation.flatten(-2).max(dim=-1)
+    dy = index // block
+    dx = index % block
+    offsets = torch.stack([dx, dy], dim=1).float()
+    offsets = torch.where(offsets >= block // 2, offsets - block, offsets)
+    offsets = offsets * (peak >= _MOTION_MIN_PEAK).unsqueeze(1)
+    flow = F.interpolate(offsets, size=(height, width), mode="bilinear", align_corners=False)
+    return flow.to(frames.dtype)
+
+
+def warp(frames: torch.Tensor, flow: torch.Tensor) -> torch.Tensor:
+    """Samples every pixel of `frames` (n, c, h, w) at its position plus `flow` (n, 2, h, w) in pixels."""
+    _, _, height, width = frames.shape
+    ys = torch.linspace(-1.0 + 1.0 / height, 1.0 - 1.0 / height, height, device=frames.device, dtype=frames.dtype)
+    xs = torch.linspace(-1.0 + 1.0 / width, 1.0 - 1.0 / width, width, device=frames.device, dtype=frames.dtype)
+    grid_y, grid_x = torch.meshgrid(ys, xs, indexing="ij")
+    grid = torch.stack([
+        grid_x + flow[:, 0] * (2.0 / width),
+        grid_y + flow[:, 1] * (2.0 / height),
+    ], dim=-1)
+    return F.grid_sample(frames, grid, mode="bilinear", padding_mode="border", align_corners=False)
@@ -0,0 +1,207 @@
+import argparse
+import http.client
+import io
+import itertools
+import json
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+import numpy as np
+import torch
+
+from video_prediction.export import load_predictor
+from video_prediction.model import MODEL_VARIANTS, build_model
+from video_prediction.server import FRAMES_PER_WINDOW, WINDOW_SHAPE, create_server
+from video_prediction.constants import DEFAULT_MODEL_PATH, DEFAULT_MODEL_VARIANT, VIDEO_RESIZE
+
+
+@dataclass
+class LoadResult:
+    """Latencies of the requests of one load test run, in seconds."""
+    requests: int
+    windows: int
+    wall_seconds: float
+    latencies: List[float]
+    first_window_latencies: List[float]
+    errors: int = 0
+    mean_batch_size: float = 0.0
+
+    def summary(self) -> str:
+        latencies = np.asarray(self.latencies) * 1000.0
+        first = np.asarray(self.first_window_latencies) * 1000.0
+        if len(latencies) == 0:
+            return f"all {self.errors} requests failed"
+        return (
+            f"{self.windows / self.wall_seconds:7.1f} windows/s  {self.requests / self.wall_seconds:6.1f} req/s  "
+            f"p50 {np.percentile(latencies, 50):7.1f} ms  p99 {np.percentile(latencies, 99):7.1f} ms  "
+            f"first window p50 {np.percentile(first, 50):7.1f} ms  "
+            f"mean batch {self.mean_batch_size:4.1f}  errors {self.errors}"
+        )
+
+
+def _request_body(windows: int, seed: int = 0) -> bytes:
+    rng = np.random.default_rng(seed)
+    buffer = io.BytesIO()
+    np.save(buffer, rng.random((windows,) + WINDOW_SHAPE, dtype=np.float32))
+    return buffer.getvalue()
+
+
+def _stats(host: str, port: int) -> Dict[str, float]:
+    connection = http.client.HTTPConnection(host, port)
+    try:
+        connection.request("GET", "/stats")
+        return json.loads(connection.getresponse().read())
+    finally:
+        connection.close()
+
+
+def run_load(host: str, port: int, requests: int, concurrency: int, windows_per_request: int = 1) -> LoadResult:
+    """
+    Sends `requests` prediction requests from `concurrency` client threads,
+    each with its own keep-alive connection, and measures the latency of every
+    request until its last frame and until its first window of frames.
+    """
+    body = _request_body(windows_per_request)
+    window_bytes = FRAMES_PER_WINDOW * VIDEO_RESIZE[0] * VIDEO_RESIZE[1] * 3
+    counter = itertools.count()
+    lock = threading.Lock()
+    latencies: List[float] = []
+    first_window: List[float] = []
+    errors = [0]
+    before = _stats(host, port)
+
+    def client() -> None:
+        connection = http.client.HTTPConnection(host, port)
+        try:
+            while next(counter) < requests:
+                start = time.perf_counter()
+                try:
+                    connection.request("POST", "/predict", body, {"Content-Type": "application/x-npy"})
+                    response = connection.getresponse()
+                    if response.status != 200:
+                        raise RuntimeError(response.read().decode(errors="replace"))
+                    first = response.read(window_bytes)
+                    first_seconds = time.perf_counter() - start
+                    rest = response.read()
+                    if len(first) + len(rest) != windows_per_request * window_bytes:
+                        raise RuntimeError("incomplete response")
+                except Exception:
+                    connection.close()
+                    connection = http.client.HTTPConnection(host, port)
+                    with lock:
+                        errors[0] += 1
+                    continue
+                seconds = time.perf_counter() - start
+                with lock:
+                    latencies.append(seconds)
+                    first_window.append(first_seconds)
+        finally:
+            connection.close()
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(max(1, concurrency))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall_seconds = time.perf_counter() - start
+
+    after = _stats(host, port)
+    batches = after["batches"] - before["batches"]
+    windows = after["windows"] - before["windows"]
+    return LoadResult(
+        requests=len(latencies),
+        windows=len(latencies) * windows_per_request,
+        wall_seconds=wall_seconds,
+        latencies=latencies,
+        first_window_latencies=first_window,
+        errors=errors[0],
+        mean_batch_size=windows / batches if batches else 0.0,
+    )
+
+
+def sweep(
+    model: torch.nn.Module,
+    device: torch.device,
+    batch_sizes: List[int],
+    delays_ms: List[float],
+    requests: int,
+    concurrency: int,
+    windows_per_request: int = 1,
+) -> List[Tuple[int, float, LoadResult]]:
+    """Runs the load test against an in-process server for every batch size and deadline."""
+    results = []
+    for batch_size, delay_ms in itertools.product(batch_sizes, delays_ms):
+        server = create_server(model, device, port=0, max_batch_size=batch_size, max_delay_ms=delay_ms)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            host, port = server.server_address[:2]
+            run_load(host, port, min(requests, concurrency), concurrency, windows_per_request)  # warm up
+            result = run_load(host, port, requests, concurrency, windows_per_request)
+        finally:
+            server.shutdown()
+            server.server_close()
+        results.append((batch_size, delay_ms, result))
+        print(f"batch {batch_size:3d}  deadline {delay_ms:6.1f} ms  {result.summary()}")
+    return results
+
+
+def main() -> None:
+    """
+    Load generator for `video_prediction.server`. With --url it measures a
+    running server; otherwise it starts one in this process for every
+    combination of --batch-sizes and --delays-ms and compares them.
+    """
+    parser = argparse.ArgumentParser(description="Measure throughput and latency of the prediction server")
+    parser.add_argument("--url", type=str, default=None, help="Server to measure, e.g. http://127.0.0.1:8765")
+    parser.add_argument("--model-path", "-m", type=str, default=None,
+                        help=f"Model of the in-process server, e.g. {DEFAULT_MODEL_PATH} (default: random weights)")
+    parser.add_argument("--model-variant", choices=sorted(MODEL_VARIANTS), default=DEFAULT_MODEL_VARIANT)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4, 8, 16])
+    parser.add_argument("--delays-ms", type=float, nargs="+", default=[0.0, 5.0, 20.0])
+    parser.add_argument("--requests", "-n", type=int, default=64)
+    parser.add_argument("--concurrency", "-c", type=int, default=8, help="Number of concurrent clients")
+    parser.add_argument("--windows-per-request", "-w", type=int, default=1)
+    parser.add_argument("--output", "-o", type=str, default=None, help="Also write the results as JSON")
+    args = parser.parse_args()
+
+    rows = []
+    if args.url:
+        url = urlparse(args.url)
+        result = run_load(url.hostname, url.port or 80, args.requests, args.concurrency, args.windows_per_request)
+        print(result.summary())
+        rows.append({"url": args.url, **_row(result)})
+    else:
+        device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        if args.model_path:
+            model = load_predictor(args.model_path, device, args.model_variant)
+        else:
+            model = build_model(args.model_variant).to(device).eval()
+        for batch_size, delay_ms, result in sweep(model, device, args.batch_sizes, args.delays_ms, args.requests,
+                                                  args.concurrency, args.windows_per_request):
+            rows.append({"max_batch_size": batch_size, "max_delay_ms": delay_ms, **_row(result)})
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump(rows, handle, indent=2)
+
+
+def _row(result: LoadResult) -> Dict[str, Optional[float]]:
+    latencies = np.asarray(result.latencies) * 1000.0
+    ok = len(latencies) > 0
+    return {
+        "requests": result.requests,
+        "errors": result.errors,
+        "windows_per_second": result.windows / result.wall_seconds,
+        "p50_ms": float(np.percentile(latencies, 50)) if ok else None,
+        "p99_ms": float(np.percentile(latencies, 99)) if ok else None,
+        "first_window_p50_ms": float(np.percentile(np.asarray(result.first_window_latencies) * 1000.0, 50)) if ok else None,
+        "mean_batch_size": result.mean_batch_size,
+    }
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+import os
+import zlib
+from pathlib import Path
+from typing import Iterable, Optional, Tuple
+import numpy as np
+
+# One row per manifest line, in the same order. Everything the dataset needs to
+# validate a sample lives here, so the .npz files never have to be opened at startup.
+INDEX_DTYPE = np.dtype([
+    ("path_hash", "<u4"),
+    ("audio_shape", "<i4", (2,)),
+    ("video_shape", "<i4", (4,)),
+    ("audio_dtype", "U8"),
+    ("video_dtype", "U8"),
+    ("audio_nbytes", "<i8"),
+    ("video_nbytes", "<i8"),
+    ("file_size", "<i8"),
+    ("checksum", "<u4"),
+])
+
+
+def index_path_for(manifest_path: str) -> Path:
+    """
+    Returns the path of the binary index that belongs to a manifest file.
+    """
+    return Path(manifest_path).with_suffix(".index.npy")
+
+
+def path_hash(sample_path: str) -> int:
+    """
+    Cheap hash of the sample path exactly as written in the manifest. Used to
+    detect an index that no longer lines up with its manifest.
+    """
+    return zlib.crc32(sample_path.encode("utf-8"))
+
+
+def file_checksum(path: str, chunk_size: int = 1 << 20) -> Tuple[int, int]:
+    """
+    Returns the CRC32 checksum and size in bytes of a file on disk.
+    """
+    checksum = 0
+    size = 0
+    with open(path, "rb") as handle:
+        while True:
+            chunk = handle.read(chunk_size)
+            if not chunk:
+                break
+            checksum = zlib.crc32(chunk, checksum)
+            size += len(chunk)
+    return checksum, size
+
+
+def describe_sample(sample_path: str, audio: np.ndarray, video: np.ndarray) -> tuple:
+    """
+    Builds the index row for a sample that has just been written to `sample_path`.
+    """
+    checksum, file_size = file_checksum(sample_path)
+    return (
+        path_hash(sample_path),
+        audio.shape,
+        video.shape,
+        audio.dtype.name,
+        video.dtype.name,
+        audio.nbytes,
+        video.nbytes,
+        file_size,
+        checksum,
+    )
+
+
+def describe_sample_file(sample_path: str) -> tuple:
+    """
+    Builds the index row for an existing sample by reading it back from disk.
+    """
+    with np.load(sample_path) as data:
+        audio = data["audio"]
+        video = data["video"]
+    return describe_sample(sample_path, audio, video)
+
+
+def write_index(manifest_path: str, rows: Iterable[tuple]) -> Path:
+    """
+    Writes the index for a manifest. The file is replaced atomically so readers
+    never see a partially written index.
+    """
+    index_path = index_path_for(manifest_path)
+    index = np.array(list(rows), dtype=INDEX_DTYPE)
+    temp_path = index_path.with_name(index_path.name + ".tmp")
+    with open(temp_path, "wb") as handle:
+        np.save(handle, index, allow_pickle=False)
+    os.replace(temp_path, index_path)
+    return index_path
+
+
+def load_index(manifest_path: str) -> Optional[np.ndarray]:
+    """
+    Loads the index belonging to a manifest, or returns None if there is no
+    usable index (missing, unreadable or written with a different layout).
+    """
+    index_path = index_path_for(manifest_path)
+    if not index_path.exists():
+        return None
+    try:
+        index = np.load(index_path, allow_pickle=False)
+    except (OSError, ValueError):
+        return None
+    if index.dtype != INDEX_DTYPE:
+        return None
+    return index
+
+
+def verify_sample(sample_path: str, row: np.void) -> bool:
+    """
+    Full integrity check of a single sample against its index row. This reads
+    the whole file, so it is meant for spot checks rather than dataset startup.
+    """
+    try:
+        checksum, file_size = file_checksum(sample_path)
+    except OSError:
+        return False
+    return file_size == int(row["file_size"]) and checksum == int(row["checksum"])
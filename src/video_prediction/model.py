@@ -1,46 +1,125 @@
+from typing import Callable, Dict, Optional, Tuple
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
+from torch.utils.checkpoint import checkpoint
 
-from video_prediction.constants import FREQ_BINS, VIDEO_RESIZE, VIDEO_TARGET_FPS, WINDOW_SECONDS
+from video_prediction.constants import DEFAULT_MODEL_VARIANT, FREQ_BINS, VIDEO_RESIZE, VIDEO_TARGET_FPS, WINDOW_SECONDS
+
+ENCODER_TYPES = ("rnn", "gru", "tcn")
+
+
+class CausalConvEncoder(nn.Module):
+    """A stack of causal dilated 1D convolutions over the pooled audio steps.
+
+    Follows the `nn.RNN` calling convention, `(output, state) = encoder(x, state)`
+    with batch-first input, so it can replace the RNN everywhere, including
+    streaming inference. The state holds the most recent input steps that the
+    receptive field still needs; `None` means zero padding, like the start of a
+    window.
+    """
+
+    def __init__(self, input_size: int, hidden_size: int, kernel_size: int = 3, num_layers: int = 4):
+        super().__init__()
+        self.hidden_size = hidden_size
+        self.kernel_size = kernel_size
+        self.dilations = [2 ** layer for layer in range(num_layers)]
+        self.receptive_field = 1 + (kernel_size - 1) * sum(self.dilations)
+        self.input_proj = nn.Conv1d(input_size, hidden_size, kernel_size=1)
+        self.layers = nn.ModuleList(
+            nn.Conv1d(hidden_size, hidden_size, kernel_size=kernel_size, dilation=dilation)
+            for dilation in self.dilations
+        )
+
+    def forward(self, x: torch.Tensor, state: Optional[torch.Tensor] = None) -> Tuple[torch.Tensor, torch.Tensor]:
+        steps = x.size(1)
+        history = self.receptive_field - 1
+        if state is None:
+            state = x.new_zeros(x.size(0), history, x.size(2))
+        full = torch.cat([state, x], dim=1)  # (B, history + T, F)
+
+        out = self.input_proj(full.transpose(1, 2))
+        for layer, dilation in zip(self.layers, self.dilations):
+            # Left padding only, so no step sees the future.
+            padded = F.pad(out, ((self.kernel_size - 1) * dilation, 0))
+            out = torch.tanh(layer(padded)) + out
+        out = out[:, :, -steps:].transpose(1, 2).contiguous()  # (B, T, H)
+        return out, full[:, -history:] if history > 0 else full[:, :0]
 
 
 class VideoPredictor(nn.Module):
     """A small RNN that maps an audio spectrogram window to a video clip.
 
+    The sequence encoder (`encoder`), the rank of the frame head (`frame_head_rank`,
+    0 for a full linear layer) and the decoder width (`decoder_width`) can be
+    changed to get cheaper variants, see `MODEL_VARIANTS`. The encoder keeps the
+    attribute name `rnn` whatever its type, so checkpoints of the default model
+    stay loadable.
+
+    Frames are decoded `decode_chunk_frames` at a time (0 decodes all frames
+    of the batch at once). With `checkpoint_decoder` the activations of every
+    chunk, by default one window of frames, are dropped after the forward pass
+    and recomputed chunk by chunk during backward, so training only keeps the
+    encoder outputs and the decoded frames; see `set_memory_options`.
+
     Input shape:
         (batch_size, 1, freq_bins, audio_time_steps)
     Output shape:
         (batch_size, video_frames, 3, height, width)
     """
 
-    def __init__(self, hidden_size: int = 128, low_res_scale: int = 8):
+    def __init__(
+        self,
+        hidden_size: int = 128,
+        low_res_scale: int = 8,
+        encoder: str = "rnn",
+        frame_head_rank: int = 0,
+        decoder_width: float = 1.0,
+    ):
         super().__init__()
+        if encoder not in ENCODER_TYPES:
+            raise ValueError(f"Unknown encoder {encoder!r}, expected one of {ENCODER_TYPES}")
         self.freq_bins = FREQ_BINS
         self.video_frames = int(WINDOW_SECONDS * VIDEO_TARGET_FPS)
         self.hidden_size = hidden_size
 
         self.low_res_height = VIDEO_RESIZE[0] // low_res_scale
         self.low_res_width = VIDEO_RESIZE[1] // low_res_scale
-        self.feature_channels = 64
+        channels = [max(1, int(round(width * decoder_width))) for width in (64, 32, 16, 8)]
+        self.feature_channels = channels[0]
         self.frame_vector_size = self.feature_channels * self.low_res_height * self.low_res_width
 
-        self.rnn = nn.RNN(
-            input_size=self.freq_bins,
-            hidden_size=self.hidden_size,
-            num_layers=1,
-            batch_first=True,
-            nonlinearity="tanh",
-        )
-        self.frame_head = nn.Linear(self.hidden_size, self.frame_vector_size)
+        if encoder == "rnn":
+            self.rnn = nn.RNN(
+                input_size=self.freq_bins,
+                hidden_size=self.hidden_size,
+                num_layers=1,
+                batch_first=True,
+                nonlinearity="tanh",
+            )
+        elif encoder == "gru":
+            self.rnn = nn.GRU(input_size=self.freq_bins, hidden_size=self.hidden_size, num_layers=1, batch_first=True)
+        else:
+            self.rnn = CausalConvEncoder(self.freq_bins, self.hidden_size)
+
+        if frame_head_rank > 0:
+            # Factorized head: hidden -> rank -> frame vector, far fewer weights than the full matrix.
+            self.frame_head = nn.Sequential(
+                nn.Linear(self.hidden_size, frame_head_rank, bias=False),
+                nn.Linear(frame_head_rank, self.frame_vector_size),
+            )
+        else:
+            self.frame_head = nn.Linear(self.hidden_size, self.frame_vector_size)
+        self.decode_chunk_frames = 0
+        self.checkpoint_decoder = False
         self.decoder = nn.Sequential(
-            nn.ConvTranspose2d(self.feature_channels, 32, kernel_size=4, stride=2, padding=1),
+            nn.ConvTranspose2d(channels[0], channels[1], kernel_size=4, stride=2, padding=1),
             nn.ReLU(inplace=True),
-            nn.ConvTranspose2d(32, 16, kernel_size=4, stride=2, padding=1),
+            nn.ConvTranspose2d(channels[1], channels[2], kernel_size=4, stride=2, padding=1),
             nn.ReLU(inplace=True),
-            nn.ConvTranspose2d(16, 8, kernel_size=4, stride=2, padding=1),
+            nn.ConvTranspose2d(channels[2], channels[3], kernel_size=4, stride=2, padding=1),
             nn.ReLU(inplace=True),
-            nn.Conv2d(8, 3, kernel_size=3, padding=1),
+            nn.Conv2d(channels[3], 3, kernel_size=3, padding=1),
             nn.Sigmoid(),
         )
 
@@ -55,17 +134,93 @@ class VideoPredictor(nn.Module):
         audio = audio.transpose(1, 2).contiguous()  # (B, 32, F)
 
         rnn_out, _ = self.rnn(audio)  # (B, 32, H)
-        frame_vectors = self.frame_head(rnn_out)  # (B, 32, C*H*W)
-
-        frames = frame_vectors.view(
-            frame_vectors.size(0),
-            self.video_frames,
-            self.feature_channels,
-            self.low_res_height,
-            self.low_res_width,
-        )
+        return self.decode_frames(rnn_out)
+
+    def set_memory_options(self, decode_chunk_frames: int = 0, checkpoint_decoder: bool = False) -> None:
+        """Trades compute for activation memory, the weights and the output are unchanged."""
+        self.decode_chunk_frames = max(0, decode_chunk_frames)
+        self.checkpoint_decoder = checkpoint_decoder
+
+    def decode_frames(self, rnn_out: torch.Tensor) -> torch.Tensor:
+        """Decode RNN outputs (batch, frames, hidden) into frames (batch, frames, 3, height, width)."""
+        batch_size, frame_count = rnn_out.size(0), rnn_out.size(1)
+        hidden = rnn_out.reshape(batch_size * frame_count, rnn_out.size(2))
+        recompute = self.checkpoint_decoder and torch.is_grad_enabled()
+        if self.decode_chunk_frames == 0 and not recompute:
+            # No Python-level slicing, so traced graphs stay valid for any batch size.
+            frames = self._decode_chunk(hidden)
+        else:
+            chunk = self.decode_chunk_frames or frame_count
+            chunks = []
+            for first in range(0, len(hidden), chunk):
+                part = hidden[first:first + chunk]
+                if recompute:
+                    chunks.append(checkpoint(self._decode_chunk, part, use_reentrant=False))
+                else:
+                    chunks.append(self._decode_chunk(part))
+            frames = torch.cat(chunks, dim=0)
+        return frames.view(batch_size, frame_count, 3, VIDEO_RESIZE[0], VIDEO_RESIZE[1])
+
+    def _decode_chunk(self, hidden: torch.Tensor) -> torch.Tensor:
+        """Frame head and decoder for (frames, hidden), returns (frames, 3, height, width)."""
+        frame_vectors = self.frame_head(hidden)  # (N, C*H*W)
+        frames = frame_vectors.view(-1, self.feature_channels, self.low_res_height, self.low_res_width)
+        return self.decoder(frames)
+
+
+MODEL_VARIANTS: Dict[str, Callable[[], VideoPredictor]] = {}
+
+
+def register_model(name: str) -> Callable[[Callable[[], VideoPredictor]], Callable[[], VideoPredictor]]:
+    """Decorator that makes a model factory available under `name`."""
+    def decorator(factory: Callable[[], VideoPredictor]) -> Callable[[], VideoPredictor]:
+        if name in MODEL_VARIANTS:
+            raise ValueError(f"Model variant {name!r} is already registered")
+        MODEL_VARIANTS[name] = factory
+        return factory
+    return decorator
+
+
+def build_model(variant: str = DEFAULT_MODEL_VARIANT) -> VideoPredictor:
+    """Creates a fresh model of the registered variant `variant`."""
+    try:
+        factory = MODEL_VARIANTS[variant]
+    except KeyError:
+        raise ValueError(f"Unknown model variant {variant!r}, expected one of {sorted(MODEL_VARIANTS)}") from None
+    return factory()
+
+
+@register_model("rnn")
+def _rnn() -> VideoPredictor:
+    """The original architecture."""
+    return VideoPredictor()
+
+
+@register_model("gru")
+def _gru() -> VideoPredictor:
+    """Gated recurrent encoder, better at holding on to slow changes in the music."""
+    return VideoPredictor(encoder="gru")
+
+
+@register_model("tcn")
+def _tcn() -> VideoPredictor:
+    """Causal dilated convolutions instead of a recurrence, parallel over the frames of a window."""
+    return VideoPredictor(encoder="tcn")
+
+
+@register_model("lowrank")
+def _lowrank() -> VideoPredictor:
+    """Rank-32 frame head, about a quarter of the parameters of the full head."""
+    return VideoPredictor(frame_head_rank=32)
+
+
+@register_model("narrow")
+def _narrow() -> VideoPredictor:
+    """Decoder with half the channels in every layer."""
+    return VideoPredictor(decoder_width=0.5)
+
 
-        frames = frames.view(-1, self.feature_channels, self.low_res_height, self.low_res_width)
-        frames = self.decoder(frames)
-        frames = frames.view(-1, self.video_frames, 3, VIDEO_RESIZE[0], VIDEO_RESIZE[1])
-        return frames
+@register_model("tiny")
+def _tiny() -> VideoPredictor:
+    """GRU encoder, rank-16 frame head and half-width decoder, meant for real-time CPU use."""
+    return VideoPredictor(encoder="gru", frame_head_rank=16, decoder_width=0.5)
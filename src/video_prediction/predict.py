@@ -1,6 +1,5 @@
 import argparse
 import os
-import subprocess
 from pathlib import Path
 from typing import Any
 
@@ -8,14 +7,22 @@ import imageio
 import numpy as np
 from PIL import Image
 import torch
-from video_prediction.model import VideoPredictor
-from video_prediction.audio_preprocessing import generate_spectrogram
+from video_prediction.export import load_predictor
+from video_prediction.inference_pipeline import predict_video
+from video_prediction.interpolation import INTERPOLATION_MODES
+from video_prediction.spectrogram import build_frontend
+from video_prediction.dataset import SAMPLE_FEATURES, prediction_sample_rate
+from video_prediction.model import MODEL_VARIANTS
 from video_prediction.constants import (
+    AUDIO_FEATURES_PER_SECOND,
+    DEFAULT_INTERPOLATION,
     DEFAULT_MODEL_PATH,
-    WINDOW_SECONDS,
+    DEFAULT_MODEL_VARIANT,
+    DEFAULT_PIPELINE_QUEUE_SIZE,
+    DEFAULT_PREDICT_BATCH_SIZE,
+    DEFAULT_TOP_DB,
     VIDEO_RESIZE,
     VIDEO_TARGET_FPS,
-    AUDIO_FEATURES_PER_SECOND
 )
 
 def save_video(frames: np.ndarray, output_path: str, fps: int, width: int, height: int):
@@ -46,102 +53,66 @@ def save_video(frames: np.ndarray, output_path: str, fps: int, width: int, heigh
         writer.close()
 
 
-def _mux_audio_with_video(video_path: str, audio_path: str, output_path: str) -> None:
-    """Attach the original audio track to the generated video clip."""
-    process = subprocess.Popen([
-        "ffmpeg",
-        "-y",
-        "-i",
-        video_path,
-        "-i",
-        audio_path,
-        "-c:v",
-        "copy",
-        "-c:a",
-        "aac",
-        "-map",
-        "0:v:0",
-        "-map",
-        "1:a:0",
-        "-shortest",
-        output_path,
-    ], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    process.communicate()
-    if process.returncode != 0:
-        raise RuntimeError("ffmpeg failed while muxing audio and video")
-
-
-def _iter_audio_window_starts(audio_path: str, window_seconds: float) -> list[float]:
-    """Return non-overlapping window starts that cover the whole audio file."""
-    import librosa
-
-    duration = float(librosa.get_duration(path=audio_path))
-    if duration <= 0:
-        return [0.0]
-
-    starts = []
-    start = 0.0
-    while start < duration:
-        starts.append(round(start, 6))
-        start += window_seconds
-    return starts or [0.0]
-
-
 def main():
     """
     Main function to predict a full video from a given audio file using the
-    trained model. It loads the model, processes the audio, and generates the
-    predicted video frames.
+    trained model. Analysis, inference, resizing and encoding run as
+    overlapping pipeline stages (see `video_prediction.inference_pipeline`).
     """
     parser = argparse.ArgumentParser(description="Predict video from audio")
     parser.add_argument("--input-audio", "-i", type=str, required=True)
     parser.add_argument("--output-video", "-o", type=str, required=True)
     parser.add_argument("--model-path", "-m", type=str, default=DEFAULT_MODEL_PATH)
+    parser.add_argument("--model-variant", choices=sorted(MODEL_VARIANTS), default=DEFAULT_MODEL_VARIANT,
+                        help="Architecture of a plain state dict checkpoint")
     parser.add_argument("--fps", "-f", type=int, default=VIDEO_TARGET_FPS)
+    parser.add_argument("--interpolation", choices=INTERPOLATION_MODES, default=DEFAULT_INTERPOLATION,
+                        help=f"How frames are made when --fps differs from the {VIDEO_TARGET_FPS:g} fps of the model")
     parser.add_argument("--video-width", "-W", type=int, default=VIDEO_RESIZE[1])
     parser.add_argument("--video-height", "-H", type=int, default=VIDEO_RESIZE[0])
+    parser.add_argument("--batch-size", "-b", type=int, default=DEFAULT_PREDICT_BATCH_SIZE,
+                        help="Number of windows passed through the model at once")
+    parser.add_argument("--threads", "-t", type=int, default=os.cpu_count() or 1,
+                        help="Number of CPU threads used by torch")
+    parser.add_argument("--queue-size", type=int, default=DEFAULT_PIPELINE_QUEUE_SIZE,
+                        help="Number of batches buffered between pipeline stages")
+    parser.add_argument("--compile", action="store_true", help="Compile the model with torch.compile before predicting")
+    parser.add_argument("--audio-features-per-second", type=float, default=AUDIO_FEATURES_PER_SECOND,
+                        help="Spectrogram columns per second, must match the training data")
+    parser.add_argument("--top-db", type=float, default=DEFAULT_TOP_DB,
+                        help="Dynamic range of the spectrogram in dB, must match the training data")
+    parser.add_argument("--features", choices=SAMPLE_FEATURES, default="spectrogram",
+                        help="Audio features the model was trained on (train --features); pcm decodes at the "
+                             "sample rate of PCM training instead of the native rate of the track")
     args = parser.parse_args()
 
-    model = VideoPredictor()
+    torch.set_num_threads(max(1, args.threads))
     if not torch.cuda.is_available():
         print("CUDA is not available. Prediction will be performed on CPU, which may be slow.")
     device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-    model.load_state_dict(torch.load(args.model_path, map_location=device))
-    model.to(device)
-    model.eval()
-
-    output_path = Path(args.output_video)
-    temp_video_path = output_path.with_suffix(".silent.mp4")
-
-    window_starts = _iter_audio_window_starts(args.input_audio, WINDOW_SECONDS)
-    writer: Any = imageio.get_writer(str(temp_video_path), fps=args.fps)
-    try:
-        with torch.no_grad():
-            for start_time in window_starts:
-                audio_window = generate_spectrogram(
-                    args.input_audio,
-                    freq=AUDIO_FEATURES_PER_SECOND,
-                    start_time=start_time,
-                    duration=WINDOW_SECONDS,
-                )
-                audio_window = torch.from_numpy(audio_window).unsqueeze(0).unsqueeze(0).to(device)
-                output = model(audio_window).squeeze(0).detach().cpu().numpy()
-
-                frames = np.asarray(output)
-                if frames.ndim == 4 and frames.shape[1] in (1, 3):
-                    frames = np.transpose(frames, (0, 2, 3, 1))
-                if frames.dtype != np.uint8:
-                    frames = np.clip(frames, 0.0, 1.0)
-                    frames = (frames * 255.0).astype(np.uint8)
-                for frame in frames:
-                    if frame.shape[0] != args.video_height or frame.shape[1] != args.video_width:
-                        frame = np.asarray(Image.fromarray(frame).resize((args.video_width, args.video_height), Image.Resampling.BILINEAR))
-                    writer.append_data(frame)
-    finally:
-        writer.close()
-
-    _mux_audio_with_video(str(temp_video_path), args.input_audio, str(output_path))
-    os.remove(temp_video_path)
+    # Accepts both plain state dicts and artifacts written by video_prediction.export.
+    model = load_predictor(args.model_path, device, args.model_variant)
+    if args.compile:
+        if isinstance(model, torch.jit.ScriptModule):
+            print("The model is already an exported artifact, ignoring --compile.")
+        else:
+            model = torch.compile(model)
+
+    report = predict_video(
+        model,
+        args.input_audio,
+        args.output_video,
+        fps=args.fps,
+        width=args.video_width,
+        height=args.video_height,
+        device=device,
+        batch_size=args.batch_size,
+        queue_size=args.queue_size,
+        interpolation=args.interpolation,
+        frontend=build_frontend(args.audio_features_per_second, args.top_db),
+        sample_rate=prediction_sample_rate(args.features),
+    )
+    print(report.summary())
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
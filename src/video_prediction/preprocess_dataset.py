@@ -1,17 +1,30 @@
 import argparse
+import hashlib
 import json
+import os
+import time
+from collections import Counter
 from pathlib import Path
-from typing import Iterable, List, Tuple
+from typing import Any, Dict, Iterable, List, Tuple
 import numpy as np
 from video_prediction.audio_preprocessing import generate_spectrogram
 from video_prediction.video_preprocessing import read_video_frames
+from video_prediction.manifest_index import describe_sample, describe_sample_file, load_index, path_hash, write_index
 from video_prediction.constants import (
     WINDOW_SECONDS,
     AUDIO_FEATURES_PER_SECOND,
     VIDEO_TARGET_FPS,
     VIDEO_RESIZE,
+    FREQ_BINS,
 )
 
+# Bump when the content of a cached sample changes, so existing samples are rebuilt.
+_SAMPLE_FORMAT_VERSION = 2
+_STATE_VERSION = 1
+# Shortest time between two commits of a running build.
+_COMMIT_SECONDS = 30.0
+
+
 def _pair_media_files(audio_dir: Path, video_dir: Path) -> List[Tuple[Path, Path]]:
     """
     Finds audio and video files with matching stems in the given directories.
@@ -23,7 +36,7 @@ def _pair_media_files(audio_dir: Path, video_dir: Path) -> List[Tuple[Path, Path
     return [(audio_map[stem], video_map[stem]) for stem in common_stems]
 
 
-def _window_starts(duration: float, window_seconds: float, stride_seconds: float) -> Iterable[float]:
+def window_starts(duration: float, window_seconds: float, stride_seconds: float) -> Iterable[float]:
     """
     Generate start times for sliding windows over a media file of given duration.
     Returns a list of start times (in seconds) for each window.
@@ -40,6 +53,236 @@ def _window_starts(duration: float, window_seconds: float, stride_seconds: float
     return starts
 
 
+def hash_file(path: Path, hash_cache: Dict[str, Dict[str, Any]]) -> str:
+    """
+    Returns the SHA-256 of a file's content. Hashes are cached by path, size and
+    modification time so unchanged media files are only read once.
+    """
+    stat = path.stat()
+    key = str(path)
+    cached = hash_cache.get(key)
+    if cached and cached["size"] == stat.st_size and cached["mtime_ns"] == stat.st_mtime_ns:
+        return cached["sha256"]
+
+    digest = hashlib.sha256()
+    with path.open("rb") as handle:
+        for chunk in iter(lambda: handle.read(1 << 20), b""):
+            digest.update(chunk)
+    hash_cache[key] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": digest.hexdigest()}
+    return hash_cache[key]["sha256"]
+
+
+def _pair_fingerprint(audio_hash: str, video_hash: str, params: Dict[str, Any]) -> str:
+    """
+    Fingerprint of everything that determines the samples of one audio/video
+    pair: the content of both files and the preprocessing parameters.
+    """
+    payload = json.dumps({"audio": audio_hash, "video": video_hash, "params": params}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def write_json_atomic(path: Path, data: Any) -> None:
+    temp_path = path.with_name(path.name + ".tmp")
+    with temp_path.open("w", encoding="utf-8") as handle:
+        json.dump(data, handle)
+    os.replace(temp_path, path)
+
+
+def load_json(path: Path) -> Dict[str, Any]:
+    if not path.exists():
+        return {}
+    try:
+        with path.open("r", encoding="utf-8") as handle:
+            return json.load(handle)
+    except (OSError, ValueError):
+        return {}
+
+
+def load_existing_entries(manifest_path: Path) -> List[Tuple[Dict[str, Any], tuple]]:
+    """
+    Reads the current manifest together with its index rows. Rows are taken from
+    the binary index when it lines up with the manifest and rebuilt from the
+    sample files otherwise. Entries whose sample file is gone are dropped.
+    """
+    if not manifest_path.exists():
+        return []
+    with manifest_path.open("r", encoding="utf-8") as handle:
+        items = [json.loads(line) for line in handle if line.strip()]
+
+    index = load_index(str(manifest_path))
+    aligned = index is not None and len(index) == len(items) and all(
+        int(row["path_hash"]) == path_hash(item["sample_path"]) for item, row in zip(items, index)
+    )
+
+    entries = []
+    for position, item in enumerate(items):
+        if "fingerprint" not in item:
+            # Written before incremental builds existed; it will be regenerated.
+            continue
+        if aligned:
+            entries.append((item, index[position].item()))
+            continue
+        try:
+            entries.append((item, describe_sample_file(item["sample_path"])))
+        except (OSError, ValueError, KeyError):
+            continue
+    return entries
+
+
+def commit_manifest(manifest_path: Path, state_path: Path, entries: List[Tuple[Dict[str, Any], tuple]],
+            pairs: Dict[str, Dict[str, Any]]) -> None:
+    """
+    Atomically replaces the index, the manifest and the build state. Each file
+    is written to a temporary path first, so an interrupted build leaves the
+    previous commit in place and the next run resumes from it.
+    """
+    write_index(str(manifest_path), [row for _, row in entries])
+    temp_path = manifest_path.with_name(manifest_path.name + ".tmp")
+    with temp_path.open("w", encoding="utf-8") as manifest:
+        for item, _ in entries:
+            manifest.write(json.dumps(item) + "\n")
+    os.replace(temp_path, manifest_path)
+    write_json_atomic(state_path, {"version": _STATE_VERSION, "pairs": pairs})
+
+
+class ManifestCommitter:
+    """
+    Commits a growing build with `commit_manifest` at most every
+    `interval_seconds`, and never more often than every ten times the last
+    commit took, so rewriting the manifest and index does not dominate first
+    builds of large catalogues. An interrupted build loses only the pairs
+    since the last commit, the next run redoes them. `flush` commits whatever
+    is pending.
+    """
+    def __init__(self, manifest_path: Path, state_path: Path, interval_seconds: float = _COMMIT_SECONDS):
+        self.manifest_path = manifest_path
+        self.state_path = state_path
+        self.interval_seconds = interval_seconds
+        self.last_commit = time.monotonic()
+        self.last_duration = 0.0
+        self.pending = False
+
+    def update(self, entries: List[Tuple[Dict[str, Any], tuple]], pairs: Dict[str, Dict[str, Any]]) -> None:
+        self.pending = True
+        if time.monotonic() - self.last_commit >= max(self.interval_seconds, 10.0 * self.last_duration):
+            self.flush(entries, pairs)
+
+    def flush(self, entries: List[Tuple[Dict[str, Any], tuple]], pairs: Dict[str, Dict[str, Any]]) -> None:
+        if not self.pending:
+            return
+        start = time.monotonic()
+        commit_manifest(self.manifest_path, self.state_path, entries, pairs)
+        self.last_commit = time.monotonic()
+        self.last_duration = self.last_commit - start
+        self.pending = False
+
+
+def collect_garbage(samples_root: Path, entries: List[Tuple[Dict[str, Any], tuple]]) -> int:
+    """
+    Deletes cached samples that the committed manifest no longer references.
+    Returns the number of removed files.
+    """
+    referenced = {str(Path(item["sample_path"]).resolve()) for item, _ in entries}
+    removed = 0
+    for sample_path in samples_root.glob("*.npz"):
+        if str(sample_path.resolve()) not in referenced:
+            sample_path.unlink()
+            removed += 1
+    return removed
+
+
+def _process_pair(
+    audio_path: Path,
+    video_path: Path,
+    fingerprint: str,
+    samples_root: Path,
+    window_seconds: float,
+    stride_seconds: float,
+    audio_features_per_second: float,
+    video_target_fps: float,
+    video_resize: Tuple[int, int],
+) -> List[Tuple[Dict[str, Any], tuple]]:
+    """
+    Cuts one audio/video pair into windows and writes a sample per window.
+    Sample names are derived from the pair fingerprint, so rerunning an
+    interrupted pair overwrites its partial output instead of duplicating it.
+    """
+    import librosa
+
+    # Skip clips that cannot provide a full 4-second window.
+    audio_duration = float(librosa.get_duration(path=str(audio_path)))
+    video_duration = float(librosa.get_duration(path=str(video_path)))
+    duration = min(audio_duration, video_duration)
+    if duration < window_seconds:
+        return []
+
+    entries = []
+    for start_time in window_starts(duration, window_seconds, stride_seconds):
+        audio = generate_spectrogram(
+            audio_file=str(audio_path),
+            freq=audio_features_per_second,
+            start_time=start_time,
+            duration=window_seconds,
+        )
+        video = read_video_frames(
+            video_path=str(video_path),
+            target_fps=video_target_fps,
+            resize=video_resize,
+            start_time=start_time,
+            duration=window_seconds,
+            as_uint8=True,
+        )
+
+        expected_audio_shape = (128, int(window_seconds * audio_features_per_second))
+        expected_video_shape = (int(window_seconds * video_target_fps), 3, video_resize[0], video_resize[1])
+        if audio.shape != expected_audio_shape or video.shape != expected_video_shape:
+            continue
+
+        sample_name = f"{audio_path.stem}_{fingerprint[:16]}_{len(entries):05d}.npz"
+        entries.append(write_sample(
+            samples_root / sample_name, audio, video, audio_path, video_path, start_time, window_seconds, fingerprint
+        ))
+    return entries
+
+
+def write_sample(
+    sample_path: Path,
+    audio: np.ndarray,
+    video: np.ndarray,
+    source_audio: Path,
+    source_video: Path,
+    start_time: float,
+    duration: float,
+    fingerprint: str,
+) -> Tuple[Dict[str, Any], tuple]:
+    """
+    Writes one training sample and returns its manifest item and index row, as
+    expected by `commit_manifest`.
+    """
+    np.savez_compressed(
+        sample_path,
+        audio=audio,
+        video=video,
+        source_audio=str(source_audio),
+        source_video=str(source_video),
+        start_time=start_time,
+        duration=duration,
+    )
+
+    manifest_sample_path = str(sample_path.resolve())
+    return (
+        {
+            "sample_path": manifest_sample_path,
+            "source_audio": str(source_audio.resolve()),
+            "source_video": str(source_video.resolve()),
+            "start_time": start_time,
+            "duration": duration,
+            "fingerprint": fingerprint,
+        },
+        describe_sample(manifest_sample_path, audio, video),
+    )
+
+
 def build_dataset(
     audio_dir: str,
     video_dir: str,
@@ -49,9 +292,16 @@ def build_dataset(
     audio_features_per_second: float = AUDIO_FEATURES_PER_SECOND,
     video_target_fps: float = VIDEO_TARGET_FPS,
     video_resize: Tuple[int, int] = VIDEO_RESIZE,
+    force: bool = False,
 ) -> Path:
     """
     Preprocess paired audio/video files into cached 4-second training samples.
+    The build is incremental: every pair is fingerprinted by the content of both
+    files and the preprocessing parameters. Pairs with an unchanged fingerprint
+    are kept as they are, new or modified pairs are processed and appended, and
+    samples of pairs that no longer exist are deleted. The manifest is committed
+    atomically after every processed pair, so an interrupted run resumes where
+    it stopped.
     Args:
         audio_dir: Directory containing audio files (.mp3).
         video_dir: Directory containing video files (.mp4).
@@ -61,8 +311,11 @@ def build_dataset(
         audio_features_per_second: Number of audio features per second for spectrogram.
         video_target_fps: Target frames per second for video frames.
         video_resize: Target size (height, width) for resized video frames.
+        force: Ignore previously cached samples and rebuild every pair.
     Returns:
-        Path to the manifest file listing all generated samples.
+        Path to the manifest file listing all generated samples. A binary index
+        with the shape, dtype, size and checksum of every sample is written next
+        to it (see `video_prediction.manifest_index`).
     """
     audio_root = Path(audio_dir).resolve()
     video_root = Path(video_dir).resolve()
@@ -72,66 +325,70 @@ def build_dataset(
     samples_root.mkdir(parents=True, exist_ok=True)
 
     manifest_path = output_root / "manifest.jsonl"
+    state_path = output_root / "build_state.json"
+    hash_cache_path = output_root / "hash_cache.json"
     pairs = _pair_media_files(audio_root, video_root)
 
-    written = 0
-    with manifest_path.open("w", encoding="utf-8") as manifest:
-        for audio_path, video_path in pairs:
-            # Skip clips that cannot provide a full 4-second window.
-            import librosa
+    params = {
+        "version": _SAMPLE_FORMAT_VERSION,
+        "window_seconds": window_seconds,
+        "stride_seconds": stride_seconds,
+        "audio_features_per_second": audio_features_per_second,
+        "video_target_fps": video_target_fps,
+        "video_resize": list(video_resize),
+        "freq_bins": FREQ_BINS,
+    }
+    hash_cache = load_json(hash_cache_path)
+    fingerprints = {}
+    for audio_path, video_path in pairs:
+        fingerprints[(audio_path, video_path)] = _pair_fingerprint(
+            hash_file(audio_path, hash_cache), hash_file(video_path, hash_cache), params
+        )
+    write_json_atomic(hash_cache_path, hash_cache)
 
-            audio_duration = float(librosa.get_duration(path=str(audio_path)))
-            video_duration = float(librosa.get_duration(path=str(video_path)))
-            duration = min(audio_duration, video_duration)
-            if duration < window_seconds:
-                continue
+    state = {} if force else load_json(state_path)
+    done_pairs: Dict[str, Dict[str, Any]] = state.get("pairs", {}) if state.get("version") == _STATE_VERSION else {}
+    entries = [] if force else load_existing_entries(manifest_path)
+
+    # A pair is only reused if its last commit completed, i.e. the state file
+    # and the manifest agree on how many samples it produced.
+    sample_counts = Counter(item["fingerprint"] for item, _ in entries)
+    wanted = set(fingerprints.values())
+    done_pairs = {
+        fingerprint: info for fingerprint, info in done_pairs.items()
+        if fingerprint in wanted and sample_counts[fingerprint] == info["samples"]
+    }
+    entries = [(item, row) for item, row in entries if item["fingerprint"] in done_pairs]
+    commit_manifest(manifest_path, state_path, entries, done_pairs)
 
-            for start_time in _window_starts(duration, window_seconds, stride_seconds):
-                audio = generate_spectrogram(
-                    audio_file=str(audio_path),
-                    freq=audio_features_per_second,
-                    start_time=start_time,
-                    duration=window_seconds,
-                )
-                video = read_video_frames(
-                    video_path=str(video_path),
-                    target_fps=video_target_fps,
-                    resize=video_resize,
-                    start_time=start_time,
-                    duration=window_seconds,
-                )
-
-                expected_audio_shape = (128, int(window_seconds * audio_features_per_second))
-                expected_video_shape = (int(window_seconds * video_target_fps), 3, video_resize[0], video_resize[1])
-                if audio.shape != expected_audio_shape or video.shape != expected_video_shape:
-                    continue
-
-                sample_name = f"{audio_path.stem}_{written:06d}.npz"
-                sample_path = samples_root / sample_name
-                np.savez_compressed(
-                    sample_path,
-                    audio=audio,
-                    video=video,
-                    source_audio=str(audio_path),
-                    source_video=str(video_path),
-                    start_time=start_time,
-                    duration=window_seconds,
-                )
-
-                manifest.write(
-                    json.dumps(
-                        {
-                            "sample_path": str(sample_path.resolve()),
-                            "source_audio": str(audio_path.resolve()),
-                            "source_video": str(video_path.resolve()),
-                            "start_time": start_time,
-                            "duration": window_seconds,
-                        }
-                    )
-                    + "\n"
-                )
-                written += 1
+    committer = ManifestCommitter(manifest_path, state_path)
+    try:
+        for (audio_path, video_path), fingerprint in fingerprints.items():
+            if fingerprint in done_pairs:
+                continue
+            new_entries = _process_pair(
+                audio_path,
+                video_path,
+                fingerprint,
+                samples_root,
+                window_seconds,
+                stride_seconds,
+                audio_features_per_second,
+                video_target_fps,
+                video_resize,
+            )
+            entries.extend(new_entries)
+            done_pairs[fingerprint] = {
+                "source_audio": str(audio_path),
+                "source_video": str(video_path),
+                "samples": len(new_entries),
+            }
+            committer.update(entries, done_pairs)
+    finally:
+        # Completed pairs are kept even if the build is interrupted.
+        committer.flush(entries, done_pairs)
 
+    collect_garbage(samples_root, entries)
     return manifest_path
 
 
@@ -146,6 +403,7 @@ def main() -> None:
     parser.add_argument("--video-target-fps", type=float, default=VIDEO_TARGET_FPS)
     parser.add_argument("--video-width", type=int, default=VIDEO_RESIZE[1])
     parser.add_argument("--video-height", type=int, default=VIDEO_RESIZE[0])
+    parser.add_argument("--force", action="store_true", help="Rebuild every sample instead of updating incrementally")
     args = parser.parse_args()
 
     manifest_path = build_dataset(
@@ -157,6 +415,7 @@ def main() -> None:
         audio_features_per_second=args.audio_features_per_second,
         video_target_fps=args.video_target_fps,
         video_resize=(args.video_height, args.video_width),
+        force=args.force,
     )
     print(manifest_path)
 
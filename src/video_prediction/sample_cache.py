@@ -0,0 +1,106 @@
+import multiprocessing
+from typing import Dict, Optional, Tuple
+import numpy as np
+import torch
+
+# Positions in the shared counter tensor.
+_CLOCK, _HITS, _MISSES, _ENTRIES = range(4)
+
+
+class SharedSampleCache:
+    """
+    Bounded LRU cache of decoded samples in shared memory. All slots are
+    allocated up front as shared tensors, so DataLoader workers (and the
+    processes of a data-parallel run on the same host) that receive the
+    dataset see and fill the same cache. Video frames are kept in
+    `video_dtype`: uint8 makes a sample about a quarter of its float32 size,
+    float32 is needed to keep float video exactly. Samples are never
+    converted lossily, float video does not enter a uint8 cache.
+
+    Every sample has the same shape, so the cache is a fixed number of slots;
+    the least recently used slot is evicted when a new sample does not fit.
+    """
+    def __init__(self, num_samples: int, budget_bytes: int,
+                 audio_shape: Tuple[int, ...], video_shape: Tuple[int, ...], video_dtype: type = np.uint8):
+        self.video_dtype = np.dtype(video_dtype)
+        if self.video_dtype not in (np.uint8, np.float32):
+            raise ValueError(f"Video can be cached as uint8 or float32, not {self.video_dtype}")
+        slot_bytes = int(np.prod(audio_shape)) * 4 + int(np.prod(video_shape)) * self.video_dtype.itemsize
+        self.capacity = min(num_samples, budget_bytes // slot_bytes)
+        if self.capacity <= 0:
+            raise ValueError(f"A cache budget of {budget_bytes} bytes cannot hold one sample ({slot_bytes} bytes)")
+        self.slot_bytes = slot_bytes
+        self.audio = torch.zeros((self.capacity,) + tuple(audio_shape), dtype=torch.float32).share_memory_()
+        video_torch_dtype = torch.uint8 if self.video_dtype == np.uint8 else torch.float32
+        self.video = torch.zeros((self.capacity,) + tuple(video_shape), dtype=video_torch_dtype).share_memory_()
+        self.slot_of_sample = torch.full((num_samples,), -1, dtype=torch.int64).share_memory_()
+        self.sample_of_slot = torch.full((self.capacity,), -1, dtype=torch.int64).share_memory_()
+        self.last_used = torch.zeros(self.capacity, dtype=torch.int64).share_memory_()
+        self.counters = torch.zeros(4, dtype=torch.int64).share_memory_()
+        # A spawn-context lock can be handed to both forked and spawned processes.
+        self.lock = multiprocessing.get_context("spawn").Lock()
+
+    def get(self, index: int) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """Returns copies of the cached audio and video of a sample, or None on a miss."""
+        with self.lock:
+            slot = int(self.slot_of_sample[index])
+            if slot < 0:
+                self.counters[_MISSES] += 1
+                return None
+            self.counters[_HITS] += 1
+            self._touch(slot)
+            return self.audio[slot].numpy().copy(), self.video[slot].numpy().copy()
+
+    def put(self, index: int, audio: np.ndarray, video: np.ndarray) -> None:
+        """
+        Stores a decoded sample, evicting the least recently used one if the
+        cache is full. uint8 video in a float32 cache is stored as values in
+        [0, 1]; float video is not stored in a uint8 cache.
+        """
+        if video.dtype != self.video_dtype:
+            if self.video_dtype == np.uint8:
+                return
+            video = np.divide(video, np.float32(255.0), dtype=np.float32) if video.dtype == np.uint8 \
+                else video.astype(np.float32)
+        with self.lock:
+            if int(self.slot_of_sample[index]) >= 0:
+                return
+            entries = int(self.counters[_ENTRIES])
+            if entries < self.capacity:
+                slot = entries
+                self.counters[_ENTRIES] += 1
+            else:
+                slot = int(torch.argmin(self.last_used))
+                self.slot_of_sample[self.sample_of_slot[slot]] = -1
+            self.audio[slot] = torch.from_numpy(audio)
+            self.video[slot] = torch.from_numpy(video)
+            self.slot_of_sample[index] = slot
+            self.sample_of_slot[slot] = index
+            self._touch(slot)
+
+    def _touch(self, slot: int) -> None:
+        self.counters[_CLOCK] += 1
+        self.last_used[slot] = self.counters[_CLOCK]
+
+    def stats(self) -> Dict[str, float]:
+        """Hit rate and memory use, counted over all processes sharing the cache."""
+        hits = int(self.counters[_HITS])
+        misses = int(self.counters[_MISSES])
+        entries = int(self.counters[_ENTRIES])
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+            "entries": entries,
+            "capacity": self.capacity,
+            "used_mb": entries * self.slot_bytes / 2 ** 20,
+            "allocated_mb": self.capacity * self.slot_bytes / 2 ** 20,
+        }
+
+    def summary(self) -> str:
+        stats = self.stats()
+        return (
+            f"hit rate {100 * stats['hit_rate']:.1f}% ({stats['hits']} hits, {stats['misses']} misses), "
+            f"{stats['entries']}/{stats['capacity']} samples, "
+            f"{stats['used_mb']:.1f} of {stats['allocated_mb']:.1f} MB"
+        )
@@ -0,0 +1,265 @@
+import argparse
+import io
+import json
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Tuple
+import numpy as np
+import torch
+from torch.nn import Module
+
+from video_prediction.export import load_predictor
+from video_prediction.inference_pipeline import upscale_frames
+from video_prediction.model import MODEL_VARIANTS
+from video_prediction.constants import (
+    AUDIO_FEATURES_PER_SECOND,
+    DEFAULT_MODEL_PATH,
+    DEFAULT_MODEL_VARIANT,
+    DEFAULT_PREDICT_BATCH_SIZE,
+    DEFAULT_SERVER_MAX_DELAY_MS,
+    DEFAULT_SERVER_PORT,
+    FREQ_BINS,
+    VIDEO_RESIZE,
+    VIDEO_TARGET_FPS,
+    WINDOW_SECONDS,
+)
+
+WINDOW_SHAPE = (FREQ_BINS, int(WINDOW_SECONDS * AUDIO_FEATURES_PER_SECOND))
+FRAMES_PER_WINDOW = int(WINDOW_SECONDS * VIDEO_TARGET_FPS)
+
+_STOP = object()
+
+
+class DynamicBatcher:
+    """
+    Runs the model on windows submitted by many threads. A single worker
+    thread takes the queued windows and passes them through the model
+    together: a batch is closed when it has `max_batch_size` windows or when
+    the oldest window in it has waited `max_delay_ms`, so a lone request is
+    never held back longer than the deadline.
+
+    `submit` returns a future with the uint8 frames of the window,
+    (frames, height, width, 3).
+    """
+    def __init__(self, model: Module, device: torch.device,
+                 max_batch_size: int = DEFAULT_PREDICT_BATCH_SIZE,
+                 max_delay_ms: float = DEFAULT_SERVER_MAX_DELAY_MS):
+        self.model = model
+        self.device = device
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_delay = max(0.0, max_delay_ms) / 1000.0
+        self.pending: queue.Queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.batches = 0
+        self.windows = 0
+        self.model_seconds = 0.0
+        self.worker = threading.Thread(target=self._run, daemon=True)
+        self.worker.start()
+
+    def submit(self, window: np.ndarray) -> Future:
+        """Queues one spectrogram window with shape WINDOW_SHAPE."""
+        future: Future = Future()
+        self.pending.put((time.perf_counter(), window, future))
+        return future
+
+    def close(self) -> None:
+        """Finishes the queued windows and stops the worker thread."""
+        self.pending.put(_STOP)
+        self.worker.join()
+
+    def stats(self) -> Dict[str, float]:
+        with self.lock:
+            return {
+                "batches": self.batches,
+                "windows": self.windows,
+                "mean_batch_size": self.windows / self.batches if self.batches else 0.0,
+                "model_seconds": self.model_seconds,
+                "max_batch_size": self.max_batch_size,
+                "max_delay_ms": 1000.0 * self.max_delay,
+            }
+
+    def _next_batch(self) -> Tuple[List[Tuple[float, np.ndarray, Future]], bool]:
+        """Blocks for the first window, then collects more until the batch is full or its deadline passes."""
+        item = self.pending.get()
+        if item is _STOP:
+            return [], True
+        batch = [item]
+        deadline = item[0] + self.max_delay
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self.pending.get(timeout=remaining) if remaining > 0 else self.pending.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            batch, stopping = self._next_batch()
+            if not batch:
+                continue
+            # Windows of requests that were given up on are dropped.
+            live = [(window, future) for _, window, future in batch if future.set_running_or_notify_cancel()]
+            if not live:
+                continue
+            windows = np.stack([window for window, _ in live], axis=0)
+            futures = [future for _, future in live]
+            start = time.perf_counter()
+            try:
+                with torch.inference_mode():
+                    output = self.model(torch.from_numpy(windows).unsqueeze(1).to(self.device))
+                    frames = upscale_frames(output, VIDEO_RESIZE[1], VIDEO_RESIZE[0]).cpu().numpy()
+            except Exception as error:
+                for future in futures:
+                    future.set_exception(error)
+                continue
+            with self.lock:
+                self.batches += 1
+                self.windows += len(futures)
+                self.model_seconds += time.perf_counter() - start
+            for index, future in enumerate(futures):
+                future.set_result(frames[index * FRAMES_PER_WINDOW:(index + 1) * FRAMES_PER_WINDOW])
+
+
+class _PredictionHandler(BaseHTTPRequestHandler):
+    """
+    POST /predict with a .npy array of windows (windows, freq_bins, time_steps)
+    answers with the raw RGB frames of every window, streamed in chunks as the
+    windows are done. The frame size is in the X-Frame-Size header.
+    GET /stats returns the batching statistics as JSON.
+    """
+    protocol_version = "HTTP/1.1"
+    server: "PredictionServer"
+
+    def do_GET(self) -> None:
+        if self.path != "/stats":
+            self._send_error(404, f"Unknown path {self.path}")
+            return
+        body = json.dumps(self.server.batcher.stats()).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self) -> None:
+        if self.path != "/predict":
+            self._send_error(404, f"Unknown path {self.path}")
+            return
+        try:
+            windows = np.load(io.BytesIO(self.rfile.read(int(self.headers.get("Content-Length", 0)))))
+        except (ValueError, OSError) as error:
+            self._send_error(400, f"Expected a .npy array: {error}")
+            return
+        if windows.ndim == 2:
+            windows = windows[None]
+        if windows.shape[1:] != WINDOW_SHAPE:
+            self._send_error(400, f"Expected windows of shape {WINDOW_SHAPE}, got {windows.shape[1:]}")
+            return
+
+        # All windows are queued at once, so they can share batches with each other and with other requests.
+        futures = [self.server.batcher.submit(window) for window in windows.astype(np.float32)]
+        self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.send_header("X-Frame-Size", f"{VIDEO_RESIZE[1]}x{VIDEO_RESIZE[0]}")
+        self.send_header("X-Frames", str(len(windows) * FRAMES_PER_WINDOW))
+        self.end_headers()
+        try:
+            for future in futures:
+                frames = future.result().tobytes()
+                self.wfile.write(f"{len(frames):x}\r\n".encode() + frames + b"\r\n")
+                self.wfile.flush()
+        except Exception:
+            # The status is already sent; dropping the connection without the last chunk tells the client.
+            for future in futures:
+                future.cancel()
+            self.close_connection = True
+            return
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _send_error(self, status: int, message: str) -> None:
+        body = message.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class PredictionServer(ThreadingHTTPServer):
+    """HTTP server that keeps one model loaded and batches the windows of concurrent requests."""
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], batcher: DynamicBatcher, verbose: bool = False):
+        super().__init__(address, _PredictionHandler)
+        self.batcher = batcher
+        self.verbose = verbose
+
+    def server_close(self) -> None:
+        super().server_close()
+        self.batcher.close()
+
+
+def create_server(
+    model: Module,
+    device: torch.device,
+    host: str = "127.0.0.1",
+    port: int = DEFAULT_SERVER_PORT,
+    max_batch_size: int = DEFAULT_PREDICT_BATCH_SIZE,
+    max_delay_ms: float = DEFAULT_SERVER_MAX_DELAY_MS,
+    verbose: bool = False,
+) -> PredictionServer:
+    """Creates a server for `model`; port 0 picks a free port (see `server.server_address`)."""
+    return PredictionServer((host, port), DynamicBatcher(model, device, max_batch_size, max_delay_ms), verbose)
+
+
+def main() -> None:
+    """
+    Serves predictions over HTTP with one loaded model, so other tools do not
+    pay for a cold process and can share batches with each other.
+    """
+    parser = argparse.ArgumentParser(description="Serve video predictions over HTTP")
+    parser.add_argument("--model-path", "-m", type=str, default=DEFAULT_MODEL_PATH)
+    parser.add_argument("--model-variant", choices=sorted(MODEL_VARIANTS), default=DEFAULT_MODEL_VARIANT,
+                        help="Architecture of a plain state dict checkpoint")
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", "-p", type=int, default=DEFAULT_SERVER_PORT)
+    parser.add_argument("--max-batch-size", "-b", type=int, default=DEFAULT_PREDICT_BATCH_SIZE,
+                        help="Most windows passed through the model at once")
+    parser.add_argument("--max-delay-ms", "-d", type=float, default=DEFAULT_SERVER_MAX_DELAY_MS,
+                        help="Longest time a window waits for others to share its batch")
+    parser.add_argument("--threads", "-t", type=int, default=os.cpu_count() or 1,
+                        help="Number of CPU threads used by torch")
+    parser.add_argument("--verbose", "-v", action="store_true", help="Log every request")
+    args = parser.parse_args()
+
+    torch.set_num_threads(max(1, args.threads))
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    model = load_predictor(args.model_path, device, args.model_variant)
+    server = create_server(model, device, args.host, args.port, args.max_batch_size, args.max_delay_ms, args.verbose)
+    host, port = server.server_address[:2]
+    print(f"Serving {args.model_path} on http://{host}:{port} "
+          f"(batches of up to {args.max_batch_size} windows, {args.max_delay_ms:g} ms deadline)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
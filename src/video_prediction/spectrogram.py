@@ -0,0 +1,187 @@
+import hashlib
+import os
+import re
+import subprocess
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+import numpy as np
+import torch
+from torch import nn
+
+from video_prediction.constants import (
+    AUDIO_FEATURES_PER_SECOND,
+    AUDIO_SAMPLE_RATE,
+    DEFAULT_TOP_DB,
+    FREQ_BINS,
+    WINDOW_SECONDS,
+)
+
+
+class SpectrogramFrontend(nn.Module):
+    """
+    Computes the model input from raw mono PCM inside the torch graph, batched
+    over windows. The result matches `audio_preprocessing.spectrogram_from_samples`
+    (librosa) for the same samples at the same sample rate: a Hann windowed STFT
+    with `2 * freq_bins` points and one column per 1 / `features_per_second`
+    seconds, the magnitude
+    in dB relative to the loudest bin of the window and clipped `top_db` below
+    it, then normalized to [0, 1] per window.
+
+    The frequency of every bin depends on the sample rate, and the stored
+    training spectrograms use the native rate of each track. `forward` takes
+    the rate of its input for that reason; `sample_rate` is the default rate,
+    the one `PcmCache` decodes to.
+
+    Input shape:
+        (batch_size, samples) or (batch_size, 1, samples)
+    Output shape:
+        (batch_size, 1, freq_bins, window_seconds * features_per_second)
+    """
+
+    def __init__(
+        self,
+        sample_rate: int = AUDIO_SAMPLE_RATE,
+        freq_bins: int = FREQ_BINS,
+        features_per_second: float = AUDIO_FEATURES_PER_SECOND,
+        window_seconds: float = WINDOW_SECONDS,
+        top_db: float = DEFAULT_TOP_DB,
+    ):
+        super().__init__()
+        self.sample_rate = sample_rate
+        self.freq_bins = freq_bins
+        self.features_per_second = features_per_second
+        self.window_seconds = window_seconds
+        self.n_fft = 2 * freq_bins
+        self.hop_length = int(sample_rate / features_per_second)
+        self.columns = int(window_seconds * features_per_second)
+        self.window_samples = int(np.round(sample_rate * window_seconds))
+        self.top_db = top_db
+        self.register_buffer("window", torch.hann_window(self.n_fft), persistent=False)
+
+    def forward(self, pcm: torch.Tensor, sample_rate: Optional[int] = None) -> torch.Tensor:
+        # Same hop length as librosa at the rate of the input.
+        hop_length = self.hop_length if sample_rate is None else int(sample_rate / self.features_per_second)
+        if pcm.dim() == 3:
+            pcm = pcm.squeeze(1)
+        if pcm.dim() != 2:
+            raise ValueError(f"Expected PCM of shape (batch, samples), got {tuple(pcm.shape)}")
+        stft = torch.stft(
+            pcm.float(),
+            n_fft=self.n_fft,
+            hop_length=hop_length,
+            window=self.window,
+            center=True,
+            pad_mode="constant",
+            return_complex=True,
+        )
+        magnitude = stft.abs()[:, :self.freq_bins, :self.columns]
+        if magnitude.size(2) < self.columns:
+            magnitude = nn.functional.pad(magnitude, (0, self.columns - magnitude.size(2)))
+
+        # Same as librosa.amplitude_to_db(magnitude, ref=np.max), per window.
+        amin = 1e-5
+        reference = magnitude.amax(dim=(1, 2), keepdim=True)
+        decibels = 20.0 * torch.log10(magnitude.clamp_min(amin)) - 20.0 * torch.log10(reference.clamp_min(amin))
+        decibels = torch.maximum(decibels, decibels.amax(dim=(1, 2), keepdim=True) - self.top_db)
+        decibels = decibels - decibels.amin(dim=(1, 2), keepdim=True)
+        decibels = decibels / (decibels.amax(dim=(1, 2), keepdim=True) + 1e-8)
+        return decibels.unsqueeze(1)
+
+
+def decode_audio(audio_file: str, sample_rate: Optional[int] = AUDIO_SAMPLE_RATE) -> Tuple[np.ndarray, int]:
+    """
+    Decodes an audio file with ffmpeg to mono float32 samples.
+    :param audio_file: Path to the audio file.
+    :param sample_rate: Sample rate of the result, None keeps the rate of the file (like `librosa.load(sr=None)`).
+    :return: 1D array of samples and their sample rate.
+    """
+    command = ["ffmpeg", "-hide_banner", "-nostats", "-v", "info", "-i", str(audio_file),
+               "-f", "f32le", "-acodec", "pcm_f32le", "-ac", "1"]
+    if sample_rate is not None:
+        command += ["-ar", str(sample_rate)]
+    result = subprocess.run(command + ["-"], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    log = result.stderr.decode(errors="replace")
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg could not decode {audio_file}: {log.strip().splitlines()[-1] if log.strip() else ''}")
+    if sample_rate is None:
+        match = re.search(r"Audio: pcm_f32le, (\d+) Hz", log)
+        if match is None:
+            raise RuntimeError(f"ffmpeg did not report the sample rate of {audio_file}")
+        sample_rate = int(match.group(1))
+    return np.frombuffer(result.stdout, dtype=np.float32), sample_rate
+
+
+def pcm_window(pcm: np.ndarray, sample_rate: int, start_time: float, window_seconds: float) -> np.ndarray:
+    """
+    The samples of one window, cut like `librosa.load(offset=start_time,
+    duration=window_seconds)` and zero padded to the full window length.
+    """
+    first = int(np.round(sample_rate * start_time))
+    length = int(np.round(sample_rate * window_seconds))
+    window = np.zeros(length, dtype=np.float32)
+    samples = pcm[first:first + length]
+    window[:len(samples)] = samples
+    return window
+
+
+def pcm_windows(pcm: np.ndarray, sample_rate: int, window_seconds: float) -> np.ndarray:
+    """
+    Cuts decoded samples into the non-overlapping windows of
+    `audio_preprocessing.iter_spectrogram_windows`, (windows, samples).
+    """
+    duration = len(pcm) / sample_rate
+    windows = []
+    start_time = 0.0
+    while True:
+        windows.append(pcm_window(pcm, sample_rate, start_time, window_seconds))
+        start_time = round(start_time + window_seconds, 6)
+        if start_time >= duration:
+            break
+    return np.stack(windows, axis=0)
+
+
+class PcmCache:
+    """
+    Decoded tracks stored as .npy files under `cache_dir`, keyed by the path
+    and modification time of the source. All tracks are resampled to
+    `sample_rate` so windows of different tracks can be batched. Windows are read through a memory
+    map, so only their samples are loaded. Safe to share between processes:
+    a track decoded by two at once is written twice, atomically.
+    """
+    def __init__(self, cache_dir: str, sample_rate: int = AUDIO_SAMPLE_RATE):
+        self.cache_dir = Path(cache_dir)
+        self.sample_rate = sample_rate
+        self.tracks: Dict[str, np.ndarray] = {}
+
+    def window(self, audio_file: str, start_time: float, window_seconds: float) -> np.ndarray:
+        return pcm_window(self.track(audio_file), self.sample_rate, start_time, window_seconds)
+
+    def track(self, audio_file: str) -> np.ndarray:
+        track = self.tracks.get(audio_file)
+        if track is None:
+            path = self._path(audio_file)
+            if not path.exists():
+                path.parent.mkdir(parents=True, exist_ok=True)
+                temporary = path.with_name(f"{path.stem}.{os.getpid()}.tmp.npy")
+                np.save(temporary, decode_audio(audio_file, self.sample_rate)[0])
+                os.replace(temporary, path)
+            track = np.load(path, mmap_mode="r")
+            self.tracks[audio_file] = track
+        return track
+
+    def _path(self, audio_file: str) -> Path:
+        source = Path(audio_file).resolve()
+        key = f"{source}:{source.stat().st_mtime_ns}:{self.sample_rate}"
+        return self.cache_dir / f"{source.stem}_{hashlib.sha256(key.encode()).hexdigest()[:16]}.npy"
+
+    def __getstate__(self) -> Dict[str, object]:
+        # Memory maps are reopened by every DataLoader worker.
+        return {"cache_dir": self.cache_dir, "sample_rate": self.sample_rate, "tracks": {}}
+
+
+def build_frontend(features_per_second: Optional[float] = None, top_db: Optional[float] = None) -> SpectrogramFrontend:
+    """Frontend with the defaults of constants.py, overriding the options that are given."""
+    return SpectrogramFrontend(
+        features_per_second=features_per_second or AUDIO_FEATURES_PER_SECOND,
+        top_db=DEFAULT_TOP_DB if top_db is None else top_db,
+    )
@@ -0,0 +1,136 @@
+import argparse
+import time
+from typing import Optional
+import torch
+
+from video_prediction.model import MODEL_VARIANTS, VideoPredictor, build_model
+from video_prediction.constants import (
+    AUDIO_FEATURES_PER_SECOND,
+    AUDIO_FEATURES_PER_VIDEO_FEATURE,
+    DEFAULT_MODEL_PATH,
+    DEFAULT_MODEL_VARIANT,
+    FREQ_BINS,
+    VIDEO_RESIZE,
+    WINDOW_SECONDS,
+)
+
+
+class StreamingPredictor:
+    """
+    Incremental inference for `VideoPredictor`. Spectrogram columns can be
+    pushed in chunks of any size; as soon as enough columns for a video frame
+    have arrived, the frame is produced. The RNN hidden state is carried across
+    calls instead of being reset for every window.
+
+    `VideoPredictor.forward` pools every `columns_per_frame` columns into one
+    RNN step, so after a `reset()` the frames of one full window are the same
+    as those of the batch forward. With `window_aligned=True` the hidden state
+    is also reset at every window boundary, which reproduces the batch output
+    for a whole track; by default it keeps running, which avoids the
+    discontinuity between windows.
+    """
+    def __init__(
+        self,
+        model: VideoPredictor,
+        columns_per_frame: int = int(AUDIO_FEATURES_PER_VIDEO_FEATURE),
+        window_aligned: bool = False,
+    ):
+        self.model = model.eval()
+        self.columns_per_frame = columns_per_frame
+        self.window_aligned = window_aligned
+        self.reset()
+
+    def reset(self) -> None:
+        """Forgets the hidden state and any buffered columns."""
+        self.hidden: Optional[torch.Tensor] = None
+        self.pending: Optional[torch.Tensor] = None
+        self.frames_emitted = 0
+
+    def push(self, columns: torch.Tensor) -> torch.Tensor:
+        """
+        Adds spectrogram columns with shape (freq_bins, n) or (batch, freq_bins, n)
+        and returns the frames they complete, (batch, frames, 3, height, width).
+        The number of frames is zero until enough columns are buffered.
+        """
+        if columns.dim() == 2:
+            columns = columns.unsqueeze(0)
+        parameter = next(self.model.parameters())
+        columns = columns.to(device=parameter.device, dtype=parameter.dtype)
+        self.pending = columns if self.pending is None else torch.cat([self.pending, columns], dim=2)
+
+        ready = self.pending.size(2) // self.columns_per_frame
+        if ready == 0:
+            return columns.new_empty((columns.size(0), 0, 3) + VIDEO_RESIZE)
+
+        used = ready * self.columns_per_frame
+        steps = self.pending[:, :, :used]
+        self.pending = self.pending[:, :, used:]
+        # Same pooling as the batch forward: one RNN step per group of columns.
+        steps = steps.unflatten(2, (ready, self.columns_per_frame)).mean(dim=3).transpose(1, 2)
+
+        with torch.inference_mode():
+            if not self.window_aligned:
+                rnn_out, self.hidden = self.model.rnn(steps, self.hidden)
+                self.frames_emitted += ready
+            else:
+                rnn_out = self._aligned_steps(steps)
+            return self.model.decode_frames(rnn_out)
+
+    def _aligned_steps(self, steps: torch.Tensor) -> torch.Tensor:
+        """Runs the RNN while resetting the hidden state at every window boundary."""
+        outputs = []
+        first = 0
+        while first < steps.size(1):
+            if self.frames_emitted % self.model.video_frames == 0:
+                self.hidden = None
+            count = min(steps.size(1) - first, self.model.video_frames - self.frames_emitted % self.model.video_frames)
+            rnn_out, self.hidden = self.model.rnn(steps[:, first:first + count], self.hidden)
+            outputs.append(rnn_out)
+            first += count
+            self.frames_emitted += count
+        return torch.cat(outputs, dim=1)
+
+
+def main() -> None:
+    """
+    Streams a few windows of spectrogram columns through the model chunk by chunk,
+    reports the latency per chunk and checks the result against the batch forward.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark streaming inference")
+    parser.add_argument("--model-path", "-m", type=str, default=None,
+                        help=f"Trained weights, e.g. {DEFAULT_MODEL_PATH} (default: random weights)")
+    parser.add_argument("--model-variant", choices=sorted(MODEL_VARIANTS), default=DEFAULT_MODEL_VARIANT)
+    parser.add_argument("--chunk-columns", "-c", type=int, default=int(AUDIO_FEATURES_PER_VIDEO_FEATURE))
+    parser.add_argument("--windows", "-n", type=int, default=4)
+    parser.add_argument("--threads", "-t", type=int, default=1)
+    args = parser.parse_args()
+
+    torch.set_num_threads(args.threads)
+    model = build_model(args.model_variant)
+    if args.model_path:
+        model.load_state_dict(torch.load(args.model_path, map_location="cpu"))
+    model.eval()
+
+    time_steps = int(WINDOW_SECONDS * AUDIO_FEATURES_PER_SECOND)
+    track = torch.rand(1, FREQ_BINS, time_steps * args.windows)
+    streamer = StreamingPredictor(model, window_aligned=True)
+    latencies = []
+    frames = []
+    for first in range(0, track.size(2), args.chunk_columns):
+        start = time.perf_counter()
+        frames.append(streamer.push(track[:, :, first:first + args.chunk_columns]))
+        latencies.append(time.perf_counter() - start)
+    streamed = torch.cat(frames, dim=1)
+
+    with torch.inference_mode():
+        windows = track.unflatten(2, (args.windows, time_steps)).permute(2, 0, 1, 3)
+        batch = model(windows).flatten(0, 1).unsqueeze(0)
+    latencies_ms = sorted(1000.0 * latency for latency in latencies)
+    print(f"Chunks of {args.chunk_columns} columns: "
+          f"p50 {latencies_ms[len(latencies_ms) // 2]:.2f} ms, "
+          f"p99 {latencies_ms[min(len(latencies_ms) - 1, int(len(latencies_ms) * 0.99))]:.2f} ms, "
+          f"max |streamed - batch| {(streamed - batch).abs().max().item():.2e}")
+
+
+if __name__ == "__main__":
+    main()
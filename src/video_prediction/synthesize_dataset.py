@@ -0,0 +1,292 @@
+import argparse
+import hashlib
+import json
+import random
+from collections import Counter
+from dataclasses import asdict
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+import numpy as np
+
+from data_generator.audio.audio_processing import get_audio_info, stft_from_samples
+from data_generator.config import VisualConfig, load_config, randomize_config
+from data_generator.backends import RENDER_BACKENDS, create_frame_renderer
+from data_generator.simulation import simulate
+from video_prediction.audio_preprocessing import spectrogram_from_samples
+from video_prediction.preprocess_dataset import (
+    collect_garbage,
+    commit_manifest,
+    ManifestCommitter,
+    hash_file,
+    load_existing_entries,
+    load_json,
+    window_starts,
+    write_json_atomic,
+    write_sample,
+)
+from video_prediction.constants import (
+    WINDOW_SECONDS,
+    AUDIO_FEATURES_PER_SECOND,
+    VIDEO_TARGET_FPS,
+    VIDEO_RESIZE,
+    FREQ_BINS,
+)
+
+# Bump when the rendering or the content of a synthesized sample changes.
+_SYNTHESIS_VERSION = 1
+_STATE_VERSION = 1
+DEFAULT_SUPERSAMPLE = 4
+
+
+def _track_fingerprint(audio_hash: str, config: VisualConfig, params: Dict[str, Any]) -> str:
+    """
+    Fingerprint of everything that determines the samples of one synthesized
+    track: the audio content, the visual config and the sample parameters.
+    """
+    payload = json.dumps({"audio": audio_hash, "config": asdict(config), "params": params}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _track_configs(config: VisualConfig, stem: str, variants: int, strength: float, seed: int) -> List[VisualConfig]:
+    """
+    The configs a track is rendered with: the config itself, followed by
+    `variants - 1` randomized versions. The randomization only depends on the
+    seed and the track name, so rebuilds produce the same variants.
+    """
+    configs = [config]
+    for variant in range(1, variants):
+        rng = random.Random(f"{seed}:{stem}:{variant}")
+        configs.append(randomize_config(config, rng, strength))
+    return configs
+
+
+def _synthesize_track(
+    audio_path: Path,
+    config: VisualConfig,
+    config_path: Path,
+    fingerprint: str,
+    samples_root: Path,
+    ctx: Any,
+    window_seconds: float,
+    stride_seconds: float,
+    audio_features_per_second: float,
+    video_target_fps: float,
+    video_resize: Tuple[int, int],
+    supersample: int,
+    backend: str,
+) -> List[Tuple[Dict[str, Any], tuple]]:
+    """
+    Runs the visualizer simulation over one track at the frame rate of the
+    config and renders only the frames a training window samples, directly at
+    the training resolution. Frames are picked with the same timestamps as
+    `read_video_frames` uses on a rendered video.
+    """
+    import librosa
+
+    y, sr = librosa.load(str(audio_path), sr=None, mono=True)
+    audio_info = get_audio_info(stft_from_samples(y, sr, config), config)
+    duration = min(len(y) / sr, len(audio_info) / config.fps)
+    if duration < window_seconds:
+        return []
+
+    frames_per_window = int(round(window_seconds * video_target_fps))
+    windows = []
+    for start_time in window_starts(duration, window_seconds, stride_seconds):
+        indices = [int(round((start_time + i / video_target_fps) * config.fps)) for i in range(frames_per_window)]
+        if indices[-1] < len(audio_info):
+            windows.append((start_time, indices))
+    states = simulate(audio_info, config, keep_frames=[index for _, indices in windows for index in indices])
+
+    renderer = create_frame_renderer(backend, config, video_resize[1], video_resize[0], supersample, ctx)
+    expected_audio_shape = (FREQ_BINS, int(window_seconds * audio_features_per_second))
+    entries = []
+    try:
+        for start_time, indices in windows:
+            # Same sample rounding that librosa.load uses for offset/duration.
+            first = int(np.round(sr * start_time))
+            last = first + int(np.round(sr * window_seconds))
+            audio = spectrogram_from_samples(y[first:last], sr, audio_features_per_second, window_seconds)
+            if audio.shape != expected_audio_shape:
+                continue
+            video = renderer.render_batch([states[index] for index in indices]).transpose(0, 3, 1, 2)
+
+            sample_name = f"{audio_path.stem}_{fingerprint[:16]}_{len(entries):05d}.npz"
+            entries.append(write_sample(
+                samples_root / sample_name, audio, video, audio_path, config_path, start_time, window_seconds, fingerprint
+            ))
+    finally:
+        renderer.release()
+    return entries
+
+
+def synthesize_dataset(
+    audio_dir: str,
+    output_dir: str,
+    config_file: str = "config.json",
+    variants: int = 1,
+    randomize_strength: float = 1.0,
+    seed: int = 0,
+    window_seconds: float = WINDOW_SECONDS,
+    stride_seconds: float = WINDOW_SECONDS,
+    audio_features_per_second: float = AUDIO_FEATURES_PER_SECOND,
+    video_target_fps: float = VIDEO_TARGET_FPS,
+    video_resize: Tuple[int, int] = VIDEO_RESIZE,
+    supersample: int = DEFAULT_SUPERSAMPLE,
+    backend: str = "gl",
+    force: bool = False,
+) -> Path:
+    """
+    Builds training samples straight from the audio files, without rendering,
+    encoding and decoding full-size videos. The data_generator analysis and
+    simulation run in-process and the frames are rendered headless at the
+    training resolution. The output uses the same manifest, index and sample
+    format as `build_dataset`, and is updated incrementally the same way.
+    Args:
+        audio_dir: Directory containing audio files (.mp3).
+        output_dir: Directory to save the samples and manifest.
+        config_file: Visualizer config, as passed to `data_generator.generate`.
+        variants: Number of configs every track is rendered with. The first is
+            the config itself, the others are randomized versions of it.
+        randomize_strength: Size of the random config changes.
+        seed: Seed of the config randomization.
+        window_seconds: Duration of each sample window in seconds.
+        stride_seconds: Stride between consecutive windows in seconds.
+        audio_features_per_second: Number of audio features per second for spectrogram.
+        video_target_fps: Frames per second of the sampled video.
+        video_resize: Size (height, width) of the rendered frames.
+        supersample: Rendered pixels per output pixel along each axis.
+        backend: Render backend, one of RENDER_BACKENDS, e.g. "cpu" for machines without a GL driver.
+        force: Ignore previously synthesized samples and rebuild everything.
+    Returns:
+        Path to the manifest file listing all generated samples. The config of
+        every rendered variant is saved in `configs/` and referenced as the
+        source video of its samples.
+    """
+    audio_root = Path(audio_dir).resolve()
+    output_root = Path(output_dir).resolve()
+    samples_root = output_root / "samples"
+    configs_root = output_root / "configs"
+    samples_root.mkdir(parents=True, exist_ok=True)
+    configs_root.mkdir(parents=True, exist_ok=True)
+
+    manifest_path = output_root / "manifest.jsonl"
+    state_path = output_root / "build_state.json"
+    hash_cache_path = output_root / "hash_cache.json"
+    base_config = load_config(config_file)
+
+    params = {
+        "version": _SYNTHESIS_VERSION,
+        "window_seconds": window_seconds,
+        "stride_seconds": stride_seconds,
+        "audio_features_per_second": audio_features_per_second,
+        "video_target_fps": video_target_fps,
+        "video_resize": list(video_resize),
+        "freq_bins": FREQ_BINS,
+        "supersample": supersample,
+    }
+    if backend != "gl":
+        # Backends differ in edge pixels; GL samples keep their existing fingerprints.
+        params["backend"] = backend
+    hash_cache = load_json(hash_cache_path)
+    tracks = {}
+    for audio_path in sorted(audio_root.glob("*.mp3")):
+        audio_hash = hash_file(audio_path, hash_cache)
+        for config in _track_configs(base_config, audio_path.stem, variants, randomize_strength, seed):
+            tracks[_track_fingerprint(audio_hash, config, params)] = (audio_path, config)
+    write_json_atomic(hash_cache_path, hash_cache)
+
+    state = {} if force else load_json(state_path)
+    done_tracks: Dict[str, Dict[str, Any]] = state.get("pairs", {}) if state.get("version") == _STATE_VERSION else {}
+    entries = [] if force else load_existing_entries(manifest_path)
+    sample_counts = Counter(item["fingerprint"] for item, _ in entries)
+    done_tracks = {
+        fingerprint: info for fingerprint, info in done_tracks.items()
+        if fingerprint in tracks and sample_counts[fingerprint] == info["samples"]
+    }
+    entries = [(item, row) for item, row in entries if item["fingerprint"] in done_tracks]
+    commit_manifest(manifest_path, state_path, entries, done_tracks)
+
+    ctx = None
+    if backend.startswith("gl"):
+        from data_generator.renderer import create_headless_context
+        ctx = create_headless_context()
+    committer = ManifestCommitter(manifest_path, state_path)
+    try:
+        for fingerprint, (audio_path, config) in tracks.items():
+            if fingerprint in done_tracks:
+                continue
+            config_path = configs_root / f"{fingerprint[:16]}.json"
+            write_json_atomic(config_path, asdict(config))
+            new_entries = _synthesize_track(
+                audio_path,
+                config,
+                config_path,
+                fingerprint,
+                samples_root,
+                ctx,
+                window_seconds,
+                stride_seconds,
+                audio_features_per_second,
+                video_target_fps,
+                video_resize,
+                supersample,
+                backend,
+            )
+            entries.extend(new_entries)
+            done_tracks[fingerprint] = {
+                "source_audio": str(audio_path),
+                "source_video": str(config_path),
+                "samples": len(new_entries),
+            }
+            committer.update(entries, done_tracks)
+    finally:
+        # Completed tracks are kept even if the build is interrupted.
+        committer.flush(entries, done_tracks)
+        if ctx is not None:
+            ctx.release()
+
+    collect_garbage(samples_root, entries)
+    referenced_configs = {Path(info["source_video"]).name for info in done_tracks.values()}
+    for config_path in configs_root.glob("*.json"):
+        if config_path.name not in referenced_configs:
+            config_path.unlink()
+    return manifest_path
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Synthesize training clips directly from audio files.")
+    parser.add_argument("--audio-dir", default="../input")
+    parser.add_argument("--output-dir", default="video_prediction/data_synthetic")
+    parser.add_argument("--config", "-c", default="data_generator/config.json",
+                        help="Visualizer config file, as for data_generator.generate")
+    parser.add_argument("--variants", "-n", type=int, default=1,
+                        help="Render every track with the config and n - 1 randomized versions of it")
+    parser.add_argument("--randomize-strength", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--window-seconds", type=float, default=WINDOW_SECONDS)
+    parser.add_argument("--stride-seconds", type=float, default=WINDOW_SECONDS)
+    parser.add_argument("--supersample", type=int, default=DEFAULT_SUPERSAMPLE,
+                        help="Render at this multiple of the training resolution and average down")
+    parser.add_argument("--backend", choices=RENDER_BACKENDS, default="gl",
+                        help="Render with OpenGL or with the NumPy rasterizer (no GL driver needed)")
+    parser.add_argument("--force", action="store_true", help="Rebuild every sample instead of updating incrementally")
+    args = parser.parse_args()
+
+    manifest_path = synthesize_dataset(
+        audio_dir=args.audio_dir,
+        output_dir=args.output_dir,
+        config_file=args.config,
+        variants=args.variants,
+        randomize_strength=args.randomize_strength,
+        seed=args.seed,
+        window_seconds=args.window_seconds,
+        stride_seconds=args.stride_seconds,
+        supersample=args.supersample,
+        backend=args.backend,
+        force=args.force,
+    )
+    print(manifest_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+import contextlib
+import json
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
+import torch
+
+from video_prediction.cpu_perf import peak_rss_mb
+
+STAGES = ("data_wait", "forward", "backward", "optimizer")
+
+
+def parse_step_range(value: str) -> Tuple[int, int]:
+    """Parses a `START:END` range of global training steps, END exclusive."""
+    try:
+        start, end = (int(part) for part in value.split(":"))
+    except ValueError:
+        raise ValueError(f"Expected a step range like 10:15, got {value!r}")
+    if not 0 <= start < end:
+        raise ValueError(f"Step range {value!r} must satisfy 0 <= START < END")
+    return start, end
+
+
+class TrainingTelemetry:
+    """
+    Per-step instrumentation of the training loop. Every step records the time
+    spent waiting for the input pipeline, in the forward pass, in the backward
+    pass and in the optimizer step, together with samples/sec and the peak RSS
+    of the process. Records are appended to `log_path` as JSON lines when given.
+
+    Every `summary_every` steps `end_step` returns a summary of the steps since
+    the previous one, naming the stage that took the most time. With
+    `profile_steps=(start, end)` those global steps are recorded with
+    `torch.profiler` and exported as Chrome traces to `trace_dir`.
+    """
+    def __init__(
+        self,
+        log_path: Optional[str] = None,
+        summary_every: int = 100,
+        profile_steps: Optional[Tuple[int, int]] = None,
+        trace_dir: str = "traces",
+    ):
+        self.summary_every = max(1, summary_every)
+        self.global_step = 0
+        self._sync = torch.cuda.is_available()
+        self._log_file = None
+        if log_path:
+            Path(log_path).parent.mkdir(parents=True, exist_ok=True)
+            self._log_file = open(log_path, "a", buffering=1)
+
+        self._profiler: Optional[torch.profiler.profile] = None
+        if profile_steps is not None:
+            self._profiler = self._make_profiler(profile_steps, Path(trace_dir))
+            self._profiler.start()
+
+        self._current = dict.fromkeys(STAGES, 0.0)
+        self._step_start: Optional[float] = None
+        self._reset_window()
+
+    def _make_profiler(self, profile_steps: Tuple[int, int], trace_dir: Path) -> torch.profiler.profile:
+        start, end = profile_steps
+        trace_dir.mkdir(parents=True, exist_ok=True)
+
+        def export(profiler: torch.profiler.profile) -> None:
+            trace_path = trace_dir / f"steps_{start}-{end}.json"
+            profiler.export_chrome_trace(str(trace_path))
+            print(f"Wrote profiler trace to {trace_path}")
+
+        activities = [torch.profiler.ProfilerActivity.CPU]
+        if torch.cuda.is_available():
+            activities.append(torch.profiler.ProfilerActivity.CUDA)
+        # One warm-up step before the window when there is room for it.
+        warmup = 1 if start > 0 else 0
+        return torch.profiler.profile(
+            activities=activities,
+            schedule=torch.profiler.schedule(skip_first=start - warmup, wait=0, warmup=warmup,
+                                             active=end - start, repeat=1),
+            on_trace_ready=export,
+            record_shapes=True,
+        )
+
+    def _reset_window(self) -> None:
+        self._window = dict.fromkeys(STAGES, 0.0)
+        self._window_seconds = 0.0
+        self._window_samples = 0
+        self._window_steps = 0
+
+    def iterate(self, batches: Iterable[Any]) -> Iterator[Any]:
+        """Yields the batches of `batches`, timing how long every batch took to arrive."""
+        iterator = iter(batches)
+        while True:
+            self._step_start = time.perf_counter()
+            try:
+                batch = next(iterator)
+            except StopIteration:
+                return
+            self._current["data_wait"] += time.perf_counter() - self._step_start
+            yield batch
+
+    @contextlib.contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Times the enclosed block as stage `name` of the current step."""
+        if self._sync:
+            torch.cuda.synchronize()
+        start = time.perf_counter()
+        with torch.profiler.record_function(name) if self._profiler is not None else contextlib.nullcontext():
+            yield
+        if self._sync:
+            torch.cuda.synchronize()
+        self._current[name] += time.perf_counter() - start
+
+    def end_step(self, epoch: int, samples: int, loss: torch.Tensor) -> Optional[str]:
+        """
+        Closes the current step and logs it. Returns the rolling summary every
+        `summary_every` steps, None otherwise.
+        """
+        now = time.perf_counter()
+        step_seconds = now - self._step_start if self._step_start is not None else sum(self._current.values())
+        record: Dict[str, Any] = {
+            "epoch": epoch,
+            "step": self.global_step,
+            "samples": samples,
+            **{f"{stage}_s": self._current[stage] for stage in STAGES},
+            "step_s": step_seconds,
+            "samples_per_second": samples / step_seconds if step_seconds > 0 else 0.0,
+            "peak_rss_mb": peak_rss_mb(),
+            "loss": loss.item(),
+        }
+        if self._log_file is not None:
+            self._log_file.write(json.dumps(record) + "\n")
+
+        for stage in STAGES:
+            self._window[stage] += self._current[stage]
+        self._window_seconds += step_seconds
+        self._window_samples += samples
+        self._window_steps += 1
+        self._current = dict.fromkeys(STAGES, 0.0)
+        self._step_start = None
+        self.global_step += 1
+        if self._profiler is not None:
+            self._profiler.step()
+
+        if self.global_step % self.summary_every == 0:
+            return self.summary()
+        return None
+
+    def summary(self) -> str:
+        """Summarizes the steps since the last summary and starts a new window."""
+        if self._window_steps == 0:
+            return "no steps recorded"
+        total = self._window_seconds
+        shares = {stage: self._window[stage] / total if total > 0 else 0.0 for stage in STAGES}
+        bottleneck = max(shares, key=shares.get)
+        if bottleneck == "data_wait":
+            verdict = "input pipeline (I/O-bound)"
+        else:
+            verdict = f"{bottleneck} (compute-bound)"
+        breakdown = ", ".join(f"{stage} {100.0 * share:.0f}%" for stage, share in shares.items())
+        text = (
+            f"STEPS {self.global_step - self._window_steps}-{self.global_step - 1}: "
+            f"{self._window_samples / total if total > 0 else 0.0:.1f} samples/s, {breakdown}, "
+            f"peak RSS {peak_rss_mb():.0f} MB, bottleneck: {verdict}"
+        )
+        self._reset_window()
+        return text
+
+    def close(self) -> None:
+        if self._profiler is not None:
+            self._profiler.stop()
+            self._profiler = None
+        if self._log_file is not None:
+            self._log_file.close()
+            self._log_file = None
+
+    def __enter__(self) -> "TrainingTelemetry":
+        return self
+
+    def __exit__(self, *_: Any) -> None:
+        self.close()
@@ -1,10 +1,28 @@
 import torch
-from torch.utils.data import Dataset, DataLoader
+from torch.utils.data import Dataset
 from torch.nn import Module
 import argparse
+import contextlib
+import os
+from dataclasses import replace
+from typing import Optional
 from pathlib import Path
-from video_prediction.model import VideoPredictor
-from video_prediction.dataset import CachedClipDataset
+from video_prediction.model import MODEL_VARIANTS, build_model
+from video_prediction.dataset import SAMPLE_FEATURES, CachedClipDataset
+from video_prediction.input_pipeline import build_input_pipeline
+from video_prediction.cpu_perf import (
+    CpuPerfConfig,
+    apply_thread_settings,
+    autocast,
+    autotune,
+    compile_model,
+    default_candidates,
+    micro_batches,
+    prepare_model,
+)
+from video_prediction.telemetry import TrainingTelemetry, parse_step_range
+from video_prediction.distributed import cleanup, current_context, init_from_env, launch, wrap_model
+from video_prediction.spectrogram import build_frontend
 from video_prediction.constants import (
     WINDOW_SECONDS,
     AUDIO_FEATURES_PER_SECOND,
@@ -14,41 +32,120 @@ from video_prediction.constants import (
     DEFAULT_EPOCHS,
     DEFAULT_BATCH_SIZE,
     DEFAULT_MODEL_PATH,
+    DEFAULT_MODEL_VARIANT,
+    DEFAULT_NUM_WORKERS,
+    DEFAULT_PREFETCH_BATCHES,
+    DEFAULT_MASTER_PORT,
+    DEFAULT_SAMPLE_CACHE_MB,
+    DEFAULT_TOP_DB,
 )
 
-def train(model: Module, dataset: Dataset, epochs: int, batch_size: int, lr: float):
+def train(model: Module, dataset: Dataset, epochs: int, batch_size: int, lr: float,
+          num_workers: int = DEFAULT_NUM_WORKERS, prefetch_batches: int = DEFAULT_PREFETCH_BATCHES,
+          perf: Optional[CpuPerfConfig] = None, telemetry: Optional[TrainingTelemetry] = None,
+          frontend: Optional[Module] = None):
     """
     Starts a training loop for the video prediction model using the specified
-    model and dataset.
+    model and dataset. Batches are produced by `num_workers` worker processes
+    and up to `prefetch_batches` of them are kept ready ahead of the training step.
+    When called inside a process group (see `video_prediction.distributed`) the
+    model is trained data-parallel and only rank 0 logs. `perf` selects bf16
+    autocast, torch.compile and a channels_last decoder for CPU training.
+    `telemetry` times every step; by default it only feeds the periodic summary.
+    With a `frontend` (see `video_prediction.spectrogram`) the batches hold raw
+    PCM and the spectrograms are computed on the device as part of every step.
+    The memory settings of `perf` split every batch into micro-batches whose
+    gradients are accumulated before the optimizer step, so `batch_size` can
+    grow without growing the activation memory.
     """
-    if not torch.cuda.is_available():
+    perf = perf or CpuPerfConfig()
+    telemetry = telemetry or TrainingTelemetry()
+    context = current_context()
+    if not torch.cuda.is_available() and context.is_main:
         print("CUDA is not available. Training will be performed on CPU, which may be slow.")
     device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
-    dataloader = DataLoader(dataset, batch_size=batch_size, shuffle=True)
-    optimizer = torch.optim.Adam(model.parameters(), lr=lr)
+    dataloader = build_input_pipeline(dataset, batch_size, device, num_workers, prefetch_batches)
     loss_func = torch.nn.MSELoss()
     model.to(device)
     model.train()
+    if frontend is not None:
+        frontend.to(device)
+    prepare_model(model, perf)
+    parallel_model = compile_model(wrap_model(model, device), perf)
+    optimizer = torch.optim.Adam(model.parameters(), lr=lr)
     use_amp = device.type == "cuda"
     scaler = torch.cuda.amp.GradScaler(enabled=use_amp)
 
-    for epoch in range(epochs):
-        for i, batch in enumerate(dataloader):
-            audio = batch["audio"].to(device, non_blocking=use_amp)
-            video = batch["video"].to(device, non_blocking=use_amp)
+    with telemetry:
+        for epoch in range(epochs):
+            dataloader.set_epoch(epoch)
+            for i, batch in enumerate(telemetry.iterate(dataloader)):
+                # The input pipeline has already moved the batch to the device.
+                audio = batch["audio"]
+                video = batch["video"]
+
+                optimizer.zero_grad(set_to_none=True)
+                parts = list(micro_batches(len(audio), perf))
+                loss = 0.0
+                for index, (part, weight) in enumerate(parts):
+                    # Data-parallel gradients are only all-reduced after the last micro-batch.
+                    sync = index == len(parts) - 1 or not hasattr(parallel_model, "no_sync")
+                    with contextlib.nullcontext() if sync else parallel_model.no_sync():
+                        with telemetry.stage("forward"):
+                            micro_audio = audio[part]
+                            if frontend is not None:
+                                # The STFT runs in float32, outside of autocast.
+                                with torch.no_grad():
+                                    micro_audio = frontend(micro_audio)
+                            with torch.cuda.amp.autocast() if use_amp else autocast(device, perf):
+                                output = parallel_model(micro_audio)
+                                micro_loss = loss_func(output, video[part]) * weight
+                        with telemetry.stage("backward"):
+                            scaler.scale(micro_loss).backward()
+                    loss = loss + micro_loss.detach()
+                with telemetry.stage("optimizer"):
+                    scaler.step(optimizer)
+                    scaler.update()
+
+                summary = telemetry.end_step(epoch, len(audio), loss)
+                if i % 100 == 0 and context.is_main:
+                    print(f"EPOCH {epoch + 1}/{epochs}, BATCH {i}/{len(dataloader)}, LOSS: {loss.item()}")
+                if summary is not None and context.is_main:
+                    print(summary)
+
+            if context.is_main:
+                scope = f" (per process, {context.world_size} processes)" if context.enabled else ""
+                print(f"EPOCH {epoch + 1}/{epochs} THROUGHPUT{scope}: {dataloader.stats.summary()}")
+                cache = getattr(dataset, "cache", None)
+                if cache is not None:
+                    print(f"EPOCH {epoch + 1}/{epochs} SAMPLE CACHE: {cache.summary()}")
 
-            optimizer.zero_grad(set_to_none=True)
-            with torch.cuda.amp.autocast(enabled=use_amp):
-                output = model(audio)
-                loss = loss_func(output, video)
 
-            scaler.scale(loss).backward()
-            scaler.step(optimizer)
-            scaler.update()
+def _train_and_save(args: argparse.Namespace, dataset: Dataset, perf: CpuPerfConfig) -> None:
+    """
+    Trains a fresh model and saves it. Runs once per process in a
+    data-parallel run, where only rank 0 writes the checkpoint.
+    """
+    apply_thread_settings(perf)
+    # Only rank 0 writes the step log and profiler traces.
+    is_main = current_context().is_main
+    telemetry = TrainingTelemetry(
+        log_path=args.telemetry_log if is_main else None,
+        summary_every=args.summary_every,
+        profile_steps=args.profile_steps if is_main else None,
+        trace_dir=args.trace_dir,
+    )
+    model = build_model(args.model_variant)
+    frontend = build_frontend(args.audio_features_per_second, args.top_db) if args.features == "pcm" else None
+    train(model, dataset, args.epochs, args.batch_size, args.lr, args.num_workers, args.prefetch, perf, telemetry,
+          frontend)
 
-            if i % 100 == 0:
-                print(f"EPOCH {epoch + 1}/{epochs}, BATCH {i}/{len(dataloader)}, LOSS: {loss.item()}")
+    if current_context().is_main:
+        save_path = Path(args.output)
+        save_path.parent.mkdir(parents=True, exist_ok=True)
+        print(f"Saving model to {save_path}")
+        torch.save(model.state_dict(), str(save_path))
 
 
 def main():
@@ -58,19 +155,68 @@ def main():
     parser = argparse.ArgumentParser(description="Train the model")
     parser.add_argument("--output", "-o", type=str, default=DEFAULT_MODEL_PATH)
     parser.add_argument("--epochs", "-e", type=int, default=DEFAULT_EPOCHS)
-    parser.add_argument("--batch-size", "-b", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--batch-size", "-b", type=int, default=DEFAULT_BATCH_SIZE,
+                        help="Batch size per process")
     parser.add_argument("--lr", "-l", type=float, default=DEFAULT_LR)
+    parser.add_argument("--model-variant", choices=sorted(MODEL_VARIANTS), default=DEFAULT_MODEL_VARIANT,
+                        help="Model architecture, see video_prediction.model")
     parser.add_argument("--manifest-path", type=str, default="video_prediction/data/manifest.jsonl")
+    parser.add_argument("--num-workers", "-w", type=int, default=DEFAULT_NUM_WORKERS)
+    parser.add_argument("--prefetch", type=int, default=DEFAULT_PREFETCH_BATCHES)
+    parser.add_argument("--cache-mb", type=float, default=DEFAULT_SAMPLE_CACHE_MB,
+                        help="Keep up to this many MB of decoded samples in shared memory (0 disables the cache). "
+                             "The budget is per host: processes started with --nproc-per-node share one cache, "
+                             "ranks started by torchrun each build their own with an equal share of it")
+    parser.add_argument("--features", choices=SAMPLE_FEATURES, default="spectrogram",
+                        help="Train on the stored spectrograms, or compute them from the raw PCM of the source "
+                             "audio in every step (the spectrogram options below then apply)")
+    parser.add_argument("--audio-features-per-second", type=float, default=AUDIO_FEATURES_PER_SECOND,
+                        help="Spectrogram columns per second with --features pcm")
+    parser.add_argument("--top-db", type=float, default=DEFAULT_TOP_DB,
+                        help="Dynamic range of the spectrogram in dB with --features pcm")
+    parser.add_argument("--nproc-per-node", type=int, default=1,
+                        help="Number of data-parallel training processes on this host")
+    parser.add_argument("--nnodes", type=int, default=1, help="Number of hosts taking part in the run")
+    parser.add_argument("--node-rank", type=int, default=0, help="Index of this host, 0 to nnodes - 1")
+    parser.add_argument("--master-addr", type=str, default="127.0.0.1", help="Address of the host with node rank 0")
+    parser.add_argument("--master-port", type=int, default=DEFAULT_MASTER_PORT)
+    parser.add_argument("--bf16", action="store_true", help="Train on CPU with bf16 autocast")
+    parser.add_argument("--compile", action="store_true", help="Compile the model with torch.compile")
+    parser.add_argument("--channels-last", action="store_true", help="Run the decoder convolutions in channels_last")
+    parser.add_argument("--intra-op-threads", type=int, default=0, help="Threads per operation (default: torch default)")
+    parser.add_argument("--inter-op-threads", type=int, default=0, help="Threads running independent operations")
+    parser.add_argument("--micro-batch-size", type=int, default=0,
+                        help="Run every batch as micro-batches of this size and accumulate their gradients, so "
+                             "the batch size no longer bounds memory (default: whole batch)")
+    parser.add_argument("--decode-chunk-frames", type=int, default=0,
+                        help="Decode at most this many frames at once (default: all frames of the batch)")
+    parser.add_argument("--checkpoint-decoder", action="store_true",
+                        help="Recompute the decoder activations during backward instead of keeping them")
+    parser.add_argument("--autotune", action="store_true",
+                        help="Benchmark the CPU settings above on this machine and train with the fastest")
+    parser.add_argument("--telemetry-log", type=str, default=None,
+                        help="Append per-step timings, throughput and peak memory to this JSONL file")
+    parser.add_argument("--summary-every", type=int, default=100,
+                        help="Print a throughput and bottleneck summary every N steps")
+    parser.add_argument("--profile-steps", type=parse_step_range, default=None, metavar="START:END",
+                        help="Record global steps START to END-1 with torch.profiler")
+    parser.add_argument("--trace-dir", type=str, default="traces", help="Where the Chrome traces are written")
     args = parser.parse_args()
 
+    # Started by torchrun (or a similar launcher) that already set up the environment.
+    context = init_from_env()
+
     manifest_path = Path(args.manifest_path)
     if not manifest_path.is_absolute():
         manifest_path = manifest_path.resolve()
 
-    model = VideoPredictor()
-    dataset = CachedClipDataset(manifest_path=str(manifest_path))
-    if len(dataset) == 0:
-        print("No cached samples matched the current config. Rebuilding the dataset cache...")
+    cache_mb = args.cache_mb
+    if context.enabled:
+        # Ranks started by torchrun do not share a dataset, so split the host budget between them.
+        cache_mb /= int(os.environ.get("LOCAL_WORLD_SIZE", context.world_size))
+    dataset = CachedClipDataset(manifest_path=str(manifest_path), cache_mb=cache_mb, features=args.features)
+    if len(dataset) == 0 and not context.enabled:
+        print("No cached samples matched the current config. Updating the dataset cache...")
         from video_prediction.preprocess_dataset import build_dataset
 
         project_root = Path(__file__).resolve().parents[2]
@@ -84,7 +230,7 @@ def main():
             video_target_fps=VIDEO_TARGET_FPS,
             video_resize=VIDEO_RESIZE,
         )
-        dataset = CachedClipDataset(manifest_path=str(manifest_path))
+        dataset = CachedClipDataset(manifest_path=str(manifest_path), cache_mb=cache_mb, features=args.features)
 
     if len(dataset) == 0:
         raise RuntimeError(
@@ -92,16 +238,52 @@ def main():
             "Check the input/output media folders and preprocessing settings."
         )
 
-    print(f"Starting training loop:",
-          f"\n\t- Epochs: {args.epochs}",
-          f"\n\t- Batches: {len(dataset)//args.batch_size}",
-          f"\n\t- Learning Rate: {args.lr}")
-    train(model, dataset, args.epochs, args.batch_size, args.lr)
+    world_size = context.world_size if context.enabled else args.nproc_per_node * args.nnodes
+    perf = CpuPerfConfig(
+        bf16=args.bf16,
+        compile=args.compile,
+        channels_last=args.channels_last,
+        intra_op_threads=args.intra_op_threads,
+        inter_op_threads=args.inter_op_threads,
+        micro_batch_size=args.micro_batch_size,
+        decode_chunk_frames=args.decode_chunk_frames,
+        checkpoint_decoder=args.checkpoint_decoder,
+    )
+    if args.autotune:
+        if context.enabled:
+            print("Ignoring --autotune inside an already running process group.")
+        else:
+            cores_per_process = max(1, (os.cpu_count() or 1) // args.nproc_per_node)
+            print("Benchmarking CPU training configurations...")
+            tuned, _ = autotune(default_candidates(cores_per_process), args.batch_size)
+            perf = replace(tuned, micro_batch_size=perf.micro_batch_size,
+                           decode_chunk_frames=perf.decode_chunk_frames, checkpoint_decoder=perf.checkpoint_decoder)
+            print(f"Using {perf.describe()}")
+
+    if context.is_main:
+        print(f"Starting training loop:",
+              f"\n\t- Epochs: {args.epochs}",
+              f"\n\t- Batches: {len(dataset)//(args.batch_size * world_size)}",
+              f"\n\t- Processes: {world_size}",
+              f"\n\t- Model: {args.model_variant}",
+              f"\n\t- Learning Rate: {args.lr}",
+              f"\n\t- CPU settings: {perf.describe()}")
 
-    save_path = Path(args.output)
-    save_path.parent.mkdir(parents=True, exist_ok=True)
-    print(f"Saving model to {save_path}")
-    torch.save(model.state_dict(), str(save_path))
+    if context.enabled or world_size == 1:
+        try:
+            _train_and_save(args, dataset, perf)
+        finally:
+            cleanup()
+    else:
+        launch(
+            _train_and_save,
+            (args, dataset, perf),
+            nproc_per_node=args.nproc_per_node,
+            nnodes=args.nnodes,
+            node_rank=args.node_rank,
+            master_addr=args.master_addr,
+            master_port=args.master_port,
+        )
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
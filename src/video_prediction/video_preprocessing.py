@@ -14,11 +14,13 @@ def read_video_frames(
     to_grayscale: bool = False,
     start_time: float = 0.0,
     duration: Optional[float] = None,
+    as_uint8: bool = False,
 ) -> np.ndarray:
     """
     Read a fixed time window from a video and return it as a tensor.
 
-    Returns a NumPy array with shape (T, C, H, W) and float32 values in [0, 1].
+    Returns a NumPy array with shape (T, C, H, W) and float32 values in [0, 1],
+    or the raw uint8 pixel values when `as_uint8` is set.
     """
     if not os.path.exists(video_path):
         raise FileNotFoundError(video_path)
@@ -64,7 +66,9 @@ def read_video_frames(
             # resize is (height, width)
             img = img.resize((resize[1], resize[0]), Image.BILINEAR)
 
-        arr = np.asarray(img).astype(np.float32) / 255.0
+        arr = np.asarray(img)
+        if not as_uint8:
+            arr = arr.astype(np.float32) / 255.0
         if to_grayscale:
             arr = arr[:, :, None]
 
@@ -77,7 +81,7 @@ def read_video_frames(
 
     if len(frames) == 0:
         channels = 1 if to_grayscale else 3
-        return np.zeros((0, channels, 0, 0), dtype=np.float32)
+        return np.zeros((0, channels, 0, 0), dtype=np.uint8 if as_uint8 else np.float32)
 
     return np.stack(frames, axis=0)
 